@@ -0,0 +1,11 @@
+"""
+
+DESCRIPTION
+----------------
+
+Audio tools shared by the Multisample Sequencer and the Rössler Attractor Sonification.
+
+The scripts add the einopdracht folder to their path, so modules are imported as e.g. "from audio_engine.offline_render import renderEvents".
+
+
+"""
@@ -0,0 +1,175 @@
+import numpy as np
+import itertools
+import math
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Compact event tables.
+
+An event table is a numpy structured array with one 14-byte record per note, instead of one dict per note:
+
+    'timestamp'   float64   time in seconds
+    'instrument'  uint8     index into the samples dict
+    'velocity'    uint8     MIDI velocity (0 - 127)
+    'loop'        uint32    index of the loop the note belongs to
+
+Records are accessed like the former dicts (event['timestamp'], event['instrument']), while whole tables are sorted,
+merged and converted in bulk.
+
+A Pattern stores a looped sequence as one cycle plus a repeat count, generating the events of each loop only when needed.
+
+
+"""
+
+
+EVENT_DTYPE = np.dtype([('timestamp', np.float64), ('instrument', np.uint8), ('velocity', np.uint8), ('loop', np.uint32)])
+
+
+def makeEventTable(timestamps, instruments, velocities = 70, loops = 0):
+
+    """
+    Creates an event table from corresponding timestamps (arg1) and instruments (arg2), sorted by timestamp.
+    Velocities (arg3) and loop indexes (arg4) can be single values or one per event.
+
+    """
+
+    table = np.empty(len(timestamps), dtype=EVENT_DTYPE)
+    table['timestamp'] = timestamps
+    table['instrument'] = instruments
+    table['velocity'] = velocities
+    table['loop'] = loops
+
+    # Stable sort: events with equal timestamps keep their order
+    return table[np.argsort(table['timestamp'], kind='stable')]
+
+def mergeEventTables(tables):
+
+    """
+    Merges several event tables (arg1) into one, sorted by timestamp.
+
+    """
+
+    merged = np.concatenate([np.asarray(table, dtype=EVENT_DTYPE) for table in tables]) if len(tables) > 0 else np.empty(0, dtype=EVENT_DTYPE)
+    return merged[np.argsort(merged['timestamp'], kind='stable')]
+
+TICKS_PER_QUARTER = 960
+
+class Pattern:
+
+    """
+    A looped sequence stored as one cycle plus a repeat count, instead of the whole expanded sequence.
+    Memory and setup time therefore don't depend on the number of loops; loop_times = None loops endlessly.
+
+    Note durations are given in quarter notes (0.25 = 16th, 1 = Quarter, ...) and stored as integer ticks
+    (TICKS_PER_QUARTER per quarter note). Event times are generated lazily as (loop * cycle_ticks + offset) * seconds_per_tick,
+    so float errors never build up, no matter how many loops.
+
+    """
+
+    __slots__ = ("offsets", "instruments", "velocities", "cycle_ticks", "loop_times", "bpm")
+
+    def __init__(self, noteDurations, instrumentationList, loop_times = 4, bpm = 60, velocity = 70):
+
+        if len(noteDurations) != len(instrumentationList):
+            raise ValueError("noteDurations and instrumentationList must have the same length")
+
+        ticks = np.rint(np.asarray(noteDurations, dtype=np.float64) * TICKS_PER_QUARTER).astype(np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(ticks)[:-1]]).astype(np.int64)
+        self.cycle_ticks = int(ticks.sum())
+        self.instruments = np.asarray(instrumentationList, dtype=np.uint8)
+        self.velocities = np.full(len(ticks), velocity, dtype=np.uint8)
+        self.loop_times = loop_times
+        self.bpm = bpm
+
+    def __len__(self):
+
+        """
+        Number of notes in one cycle.
+
+        """
+
+        return len(self.offsets)
+
+    def secondsPerTick(self):
+        return 60 / (self.bpm * TICKS_PER_QUARTER)
+
+    def cycleDuration(self):
+        return self.cycle_ticks * self.secondsPerTick()
+
+    def numEvents(self):
+
+        """
+        Total number of events over all loops (infinite for an endless pattern).
+
+        """
+
+        return math.inf if self.loop_times is None else len(self) * self.loop_times
+
+    def cycle(self, loop):
+
+        """
+        Event table of a single loop (arg1, starting at 0).
+
+        """
+
+        timestamps = (loop * self.cycle_ticks + self.offsets) * self.secondsPerTick()
+        return makeEventTable(timestamps, self.instruments, self.velocities, loop)
+
+    def iterCycles(self):
+
+        """
+        Lazily yields the event table of one loop after the other.
+
+        """
+
+        loops = itertools.count() if self.loop_times is None else range(self.loop_times)
+        for loop in loops:
+            yield self.cycle(loop)
+
+    def iterEvents(self):
+
+        """
+        Lazily yields the events (records with keys 'timestamp', 'instrument', 'velocity' and 'loop') of all loops.
+
+        """
+
+        for cycle in self.iterCycles():
+            yield from cycle
+
+    def expand(self):
+
+        """
+        Event table of all loops at once, e.g. for rendering or MIDI export. Not possible for endless patterns.
+
+        """
+
+        if self.loop_times is None:
+            raise ValueError("An endless pattern can't be expanded.")
+
+        loops = np.repeat(np.arange(self.loop_times), len(self))
+        ticks = loops * self.cycle_ticks + np.tile(self.offsets, self.loop_times)
+        return makeEventTable(ticks * self.secondsPerTick(), np.tile(self.instruments, self.loop_times), np.tile(self.velocities, self.loop_times), loops)
+
+def toEventTable(sequence):
+
+    """
+    Returns the event table of a sequence, which is either an event table already or a (finite) Pattern.
+
+    """
+
+    if isinstance(sequence, Pattern):
+        return sequence.expand()
+    return np.asarray(sequence, dtype=EVENT_DTYPE)
+
+def numEvents(sequence):
+
+    """
+    Number of events of a sequence: an event table or a Pattern (infinite for an endless one).
+
+    """
+
+    return sequence.numEvents() if isinstance(sequence, Pattern) else len(sequence)
@@ -0,0 +1,251 @@
+import numpy as np
+import collections
+import hashlib
+import simpleaudio as sa
+from audio_engine.offline_render import decodeSamples, mixEvents
+
+LOOP_CACHE_ENTRIES = 32
+LOOP_BUFFER_MAX_SECONDS = 120    # Longer playback is scheduled instead (about 140 MB of float and int16 buffers at 96 kHz stereo)
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Pre-rendered loop buffers for Patterns (see events.py).
+
+A Pattern is one cycle of notes repeated loop_times times, so instead of triggering every sample of every loop,
+one cycle is mixed into a PCM buffer once: its "body", which runs on past the cycle's end for as long as the last samples ring.
+Playing n loops is then an overlap-add of n copies of the body, one cycle apart: the tails of each loop sound on
+into the next one, and after the last loop the sound rings out. The result is one gapless buffer, played with a single
+play_buffer() call.
+
+As the whole buffer is rendered before playback, its length is capped (LOOP_BUFFER_MAX_SECONDS, see LoopCache.fits()):
+longer playback is left to the scheduler, whose memory does not grow with the loop times.
+
+Bodies are cached (LoopCache), keyed by the pattern's notes and cycle, its BPM and the sample set. When a pattern is edited,
+e.g. one note changed, the body is not rendered again: the cached body of the most similar pattern is taken, and only the
+spans of the changed notes (from their start until their sample has finished) are mixed again. This gives the very same buffer
+as a full render.
+
+Note start frames within a cycle and the cycle length are rounded to whole frames: over many loops, the loop grid can drift
+from the exact BPM grid by at most half a frame per loop (about 5 µs at 96 kHz).
+
+
+"""
+
+
+
+def sampleSetKey(samples_dict, sample_rate, channels):
+
+    """
+    Hash of the audio and format of all samples of a samples dict (arg1), rendered at sample_rate (arg2) and channels (arg3).
+
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+    for key in sorted(samples_dict, key=str):
+        sample = samples_dict[key]
+        digest.update(repr((key, sample.sample_rate, sample.num_channels, sample.bytes_per_sample)).encode())
+        digest.update(np.frombuffer(sample.audio_data, dtype=np.uint8))
+    digest.update(repr((sample_rate, channels)).encode())
+    return digest.hexdigest()
+
+def patternFrames(pattern, sample_rate):
+
+    """
+    Start frames of the notes of one cycle of a pattern (arg1), their instruments, and the cycle length in frames.
+
+    """
+
+    frames_per_tick = pattern.secondsPerTick() * sample_rate
+    frames = np.rint(pattern.offsets * frames_per_tick).astype(np.int64)
+    cycle_frames = max(1, int(round(pattern.cycle_ticks * frames_per_tick)))
+    return frames, pattern.instruments.tolist(), cycle_frames
+
+def loopPcm(body, cycle_frames, loops):
+
+    """
+    Overlap-adds loops (arg3) copies of a body (arg1), each cycle_frames (arg2) after the previous one.
+    Returns the whole gapless buffer, including the ring-out after the last loop.
+
+    """
+
+    buffer = np.zeros((loopLength(len(body), cycle_frames, loops), body.shape[1]), dtype=np.float32)
+    addLoops(buffer, body, cycle_frames, loops)
+    return buffer
+
+def addLoops(buffer, body, cycle_frames, loops):
+
+    """
+    Adds loops (arg4) copies of a body (arg2), each cycle_frames (arg3) after the previous one, into a buffer (arg1) starting
+    at its first frame. The buffer has to be at least loopLength() frames long.
+
+    """
+
+    frame_stride, channel_stride = buffer.strides
+
+    # The body in segments of one cycle: segment j of every loop lands j cycles after that loop's start.
+    # A strided view of the buffer holds those places of all loops as rows, so each segment is added in one go, without copies.
+    for start in range(0, len(body), cycle_frames):
+        segment = body[start:start + cycle_frames]
+        loop_rows = np.lib.stride_tricks.as_strided(buffer[start:], shape=(loops, len(segment), body.shape[1]),
+                                                    strides=(cycle_frames * frame_stride, frame_stride, channel_stride))
+        loop_rows += segment
+
+def loopLength(body_frames, cycle_frames, loops):
+
+    """
+    Length in frames of loops (arg3) overlap-added bodies of body_frames (arg1), cycle_frames (arg2) apart.
+
+    """
+
+    return (loops - 1) * cycle_frames + body_frames
+
+def changedSpans(old_notes, new_notes, samples, length):
+
+    """
+    Merged frame spans [start, end) covering every note (frame, key) that is in only one of old_notes (arg1) and new_notes (arg2),
+    from its start until its sample (arg3) has finished, clipped to length (arg4).
+
+    """
+
+    old_counts = collections.Counter(old_notes)
+    new_counts = collections.Counter(new_notes)
+    changed = (old_counts - new_counts) + (new_counts - old_counts)
+
+    spans = sorted((frame, min(frame + len(samples[key]), length)) for frame, key in changed if frame < length)
+    merged = []
+    for start, end in spans:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+class LoopCache:
+
+    """
+    Renders and caches the loop bodies of Patterns with the samples of samples_dict (arg1), converted to sample_rate (arg2,
+    default: the highest of the samples) and channels (arg3). Keeps the max_entries (arg4) most recently used bodies.
+
+    """
+
+    def __init__(self, samples_dict, sample_rate = None, channels = 2, max_entries = LOOP_CACHE_ENTRIES):
+        self.samples, self.sample_rate = decodeSamples(samples_dict, sample_rate, channels)
+        self.channels = channels
+        self.sample_set = sampleSetKey(samples_dict, self.sample_rate, channels)
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.rendered_frames = 0
+
+    def key(self, pattern):
+
+        """
+        Cache key of a pattern: its notes, cycle and BPM, and the sample set. Velocities and loop times don't change the body.
+
+        """
+
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(pattern.offsets.tobytes())
+        digest.update(pattern.instruments.tobytes())
+        digest.update(repr((pattern.cycle_ticks, float(pattern.bpm), self.sample_set)).encode())
+        return digest.hexdigest()
+
+    def body(self, pattern):
+
+        """
+        Returns the rendered body of a pattern (arg1) and its cycle length in frames, from the cache, by re-rendering
+        the changed spans of a similar cached body, or by a full render.
+
+        """
+
+        key = self.key(pattern)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            _, body, cycle_frames = self.entries[key]
+            return body, cycle_frames
+
+        frames, keys, cycle_frames = patternFrames(pattern, self.sample_rate)
+        notes = list(zip(frames.tolist(), keys))
+        length = max([cycle_frames] + [frame + len(self.samples[key]) for frame, key in notes])
+
+        # The cached body of the same cycle length needing the fewest frames re-rendered
+        base = None
+        base_spans = None
+        for cached_notes, cached_body, cached_cycle in self.entries.values():
+            if cached_cycle != cycle_frames:
+                continue
+            spans = changedSpans(cached_notes, notes, self.samples, length)
+            if base_spans is None or sum(end - start for start, end in spans) < sum(end - start for start, end in base_spans):
+                base, base_spans = cached_body, spans
+
+        if base is None or sum(end - start for start, end in base_spans) >= length:
+            body = mixEvents(frames, keys, self.samples, 0, length, self.channels)
+            self.rendered_frames += length
+        else:
+            body = np.zeros((length, self.channels), dtype=np.float32)
+            body[:min(length, len(base))] = base[:length]
+            for start, end in base_spans:
+                body[start:end] = mixEvents(frames, keys, self.samples, start, end - start, self.channels)
+                self.rendered_frames += end - start
+
+        self.entries[key] = (notes, body, cycle_frames)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+        return body, cycle_frames
+
+    def length(self, patterns):
+
+        """
+        Length in frames of the buffer of all loops of the (finite) patterns (arg1). Only renders (or looks up) one cycle each.
+
+        """
+
+        lengths = [0]
+        for pattern in patterns:
+            if pattern.loop_times is None:
+                raise ValueError("An endless pattern can't be pre-rendered.")
+            body, cycle_frames = self.body(pattern)
+            lengths.append(loopLength(len(body), cycle_frames, pattern.loop_times))
+        return max(lengths)
+
+    def fits(self, patterns, max_seconds = LOOP_BUFFER_MAX_SECONDS):
+
+        """
+        Whether the patterns (arg1) are all finite and their buffer lasts at most max_seconds (arg2).
+
+        """
+
+        if any(pattern.loop_times is None for pattern in patterns):
+            return False
+        return self.length(patterns) <= max_seconds * self.sample_rate
+
+    def render(self, patterns):
+
+        """
+        Mixes all loops of the (finite) patterns (arg1), all starting together, into one float buffer.
+
+        """
+
+        mix = np.zeros((self.length(patterns), self.channels), dtype=np.float32)
+        for pattern in patterns:
+            body, cycle_frames = self.body(pattern)
+            addLoops(mix, body, cycle_frames, pattern.loop_times)
+        return mix
+
+    def play(self, patterns, gain = 0.5):
+
+        """
+        Plays all loops of the patterns (arg1) gaplessly, as one buffer. Returns the PlayObject.
+        Check fits() first: the whole buffer is rendered before playback starts.
+
+        """
+
+        # Scaled and clipped in place (as pcmToBytes() would), so only the int16 buffer is allocated besides the mix
+        mix = self.render(patterns)
+        mix *= gain * (2**15 - 1)
+        np.clip(mix, -(2**15 - 1), 2**15 - 1, out=mix)
+        return sa.play_buffer(mix.astype('<i2'), self.channels, 2, self.sample_rate)
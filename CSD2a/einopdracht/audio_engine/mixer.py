@@ -0,0 +1,185 @@
+import numpy as np
+import heapq
+import itertools
+import threading
+import time
+from audio_engine.offline_render import decodeSamples
+from audio_engine.voice_pool import VoicePool
+
+try:
+    import sounddevice as sd
+except ImportError:
+    sd = None
+
+MIXER_AVAILABLE = sd is not None
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Single-process callback mixer.
+
+Instead of opening a new playback stream for every event (simpleaudio's play()), the mixer owns one output stream
+(sounddevice) and mixes all sounding sample voices inside its buffer callback. Events are submitted with a time on the
+mixer's clock (seconds of audio rendered since the stream started), and start at exactly that sample frame.
+
+Submitting events slightly ahead of time (a lookahead of a few buffers) therefore gives sample-accurate timing,
+independent of thread scheduling and sleep jitter.
+
+Polyphony is bounded by a VoicePool (see voice_pool.py): beyond its limits, voices are stolen and faded out over fade_time seconds.
+
+Requires the sounddevice package (pip install sounddevice). MIXER_AVAILABLE tells whether it is installed.
+
+
+"""
+
+
+
+class Mixer:
+
+    """
+    Mixes scheduled voices of the samples in samples_dict (simpleaudio WaveObjects) into one output stream.
+    At most max_voices voices sound at once, and max_per_instrument of each sample (None: no limit); see VoicePool for stealing.
+
+    """
+
+    def __init__(self, samples_dict, sample_rate = None, channels = 2, blocksize = 256, gain = 0.5,
+                 max_voices = 32, max_per_instrument = 8, stealing = "oldest", fade_time = 0.005):
+        self.samples, self.sample_rate = decodeSamples(samples_dict, sample_rate, channels)
+        self.channels = channels
+        self.blocksize = blocksize
+        self.gain = gain
+
+        self.pool = VoicePool(max_voices, max_per_instrument, stealing)
+        self.fade_frames = max(1, int(round(fade_time * self.sample_rate)))
+        if stealing == "quietest":
+            for key, sample in self.samples.items():
+                self.pool.setEnvelope(key, sample, self.sample_rate)
+
+        self.schedule = []
+        self.voices = []
+        self.order = itertools.count()
+        self.lock = threading.Lock()
+        self.frame = 0
+        self.stream = None
+
+    def time(self):
+
+        """
+        Current time of the mixer clock in seconds: the amount of audio rendered so far.
+
+        """
+
+        return self.frame / self.sample_rate
+
+    def submit(self, key, at_time = None):
+
+        """
+        Schedules the sample of key (arg1) to start at at_time (arg2, seconds on the mixer clock).
+        Without at_time, or if at_time has already passed, it starts at the beginning of the next buffer.
+
+        """
+
+        frame = self.frame if at_time is None else int(round(at_time * self.sample_rate))
+        with self.lock:
+            heapq.heappush(self.schedule, (frame, next(self.order), key))
+
+    def isIdle(self):
+
+        """
+        True if no voice is sounding and no event is waiting.
+
+        """
+
+        with self.lock:
+            return not self.schedule and not self.voices
+
+    def render(self, num_frames):
+
+        """
+        Renders the next num_frames (arg1) frames: starts all voices due within them and mixes every sounding voice.
+        Called by the stream callback, but also usable without an audio device.
+
+        """
+
+        start_frame = self.frame
+        end_frame = start_frame + num_frames
+        buffer = np.zeros((num_frames, self.channels), dtype=np.float32)
+
+        with self.lock:
+            while self.schedule and self.schedule[0][0] < end_frame:
+                frame, _, key = heapq.heappop(self.schedule)
+                frame = max(frame, start_frame)
+
+                stolen = self.pool.admit(key, frame / self.sample_rate)
+                if stolen is None:
+                    continue
+                # Stolen voices fade out from the frame the new voice starts at
+                for stolen_voice in stolen:
+                    stolen_voice[2] = frame - start_frame
+
+                # A voice is [sample, position, fade start]: its position is the sample index at the start of the buffer
+                # (negative means it starts within the buffer); fade start is the buffer frame its fade-out began at, or None
+                voice = [self.samples[key], start_frame - frame, None]
+                self.voices.append(voice)
+                self.pool.add(key, frame / self.sample_rate, voice)
+
+            for voice in self.voices:
+                sample, position, fade_start = voice
+                begin = max(-position, 0)
+                sample_start = max(position, 0)
+                length = min(num_frames - begin, len(sample) - sample_start)
+                segment = sample[sample_start:sample_start + length]
+
+                if fade_start is not None:
+                    gains = 1 - (np.arange(begin, begin + length) - fade_start) / self.fade_frames
+                    segment = segment * np.clip(gains, 0, 1)[:, np.newaxis]
+                    voice[2] = fade_start - num_frames
+
+                buffer[begin:begin + length] += segment
+                voice[1] = position + num_frames
+
+            finished = [voice for voice in self.voices if voice[1] >= len(voice[0]) or (voice[2] is not None and voice[2] + self.fade_frames <= 0)]
+            for voice in finished:
+                self.pool.release(voice)
+            finished_ids = {id(voice) for voice in finished}
+            self.voices = [voice for voice in self.voices if id(voice) not in finished_ids]
+
+        self.frame = end_frame
+        buffer *= self.gain
+        return buffer
+
+    def callback(self, outdata, frames, time_info, status):
+        outdata[:] = self.render(frames)
+
+    def start(self):
+
+        """
+        Opens and starts the output stream.
+
+        """
+
+        if sd is None:
+            raise ImportError("The mixer needs the sounddevice package (pip install sounddevice).")
+
+        self.stream = sd.OutputStream(samplerate=self.sample_rate, channels=self.channels, dtype='float32',
+                                      blocksize=self.blocksize, callback=self.callback)
+        self.stream.start()
+
+    def waitDone(self, poll_interval = 0.05):
+
+        """
+        Blocks until all submitted events have been played and every voice has finished.
+
+        """
+
+        while not self.isIdle():
+            time.sleep(poll_interval)
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
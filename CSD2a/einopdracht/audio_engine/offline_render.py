@@ -0,0 +1,200 @@
+import numpy as np
+import multiprocessing
+import wave
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Offline (faster than realtime) rendering of events to a WAV file, without any audio device.
+
+The samples (simpleaudio WaveObjects, as in SAMPLES_DICT) are decoded into float32 numpy buffers at one common sample rate,
+and every event is mixed in at its sample-accurate offset. Long pieces are split into chunks that are rendered in parallel
+on a process pool and written to the WAV file in order, so memory stays bounded by the chunk size.
+
+Events are (time in seconds, sample key) pairs, e.g. (0.5, "X") or (1.25, 2).
+
+
+"""
+
+
+
+def decodeWaveObject(wave_object):
+
+    """
+    Decodes the PCM data of a simpleaudio WaveObject into a float32 array of shape (frames, channels) in the range -1 to 1.
+
+    """
+
+    return decodePcm(wave_object.audio_data, wave_object.bytes_per_sample, wave_object.num_channels)
+
+def decodePcm(audio_data, bytes_per_sample, num_channels):
+
+    """
+    Decodes little-endian integer WAV data (arg1) into a float32 array of shape (frames, channels) in the range -1 to 1.
+
+    """
+
+    data = np.frombuffer(audio_data, dtype=np.uint8)
+
+    if bytes_per_sample == 1:
+        # 8 bit WAV data is unsigned
+        pcm = (data.astype(np.float32) - 128) / 128
+    elif bytes_per_sample == 2:
+        pcm = data.view('<i2').astype(np.float32) / 2**15
+    elif bytes_per_sample == 3:
+        data = data.reshape(-1, 3).astype(np.int32)
+        pcm = ((data[:, 0] | (data[:, 1] << 8) | (data[:, 2] << 16)) << 8 >> 8).astype(np.float32) / 2**23
+    elif bytes_per_sample == 4:
+        pcm = data.view('<i4').astype(np.float32) / 2**31
+    else:
+        raise ValueError(f"Unsupported sample width: {bytes_per_sample} bytes")
+
+    return pcm.reshape(-1, num_channels)
+
+def convertPcm(pcm, from_rate, to_rate, channels = 2):
+
+    """
+    Converts decoded PCM (arg1) to another sample rate (linear interpolation) and number of channels.
+
+    """
+
+    if from_rate != to_rate:
+        num_frames = int(round(len(pcm) * to_rate / from_rate))
+        positions = np.arange(num_frames) * (from_rate / to_rate)
+        pcm = np.stack([np.interp(positions, np.arange(len(pcm)), pcm[:, channel]) for channel in range(pcm.shape[1])], axis=1)
+
+    if pcm.shape[1] != channels:
+        # Mix down to mono, then spread over the requested channels
+        pcm = np.repeat(pcm.mean(axis=1, keepdims=True), channels, axis=1)
+
+    return pcm.astype(np.float32)
+
+def decodeSamples(samples_dict, sample_rate = None, channels = 2):
+
+    """
+    Decodes all WaveObjects of a samples dict (arg1) to float32 buffers with one common sample rate and channel count.
+    Without a given sample_rate (arg2), the highest rate of the samples is used.
+
+    Returns the dict of decoded samples and the sample rate.
+
+    """
+
+    if sample_rate is None:
+        sample_rate = max(wave_object.sample_rate for wave_object in samples_dict.values())
+
+    decoded = {key: convertPcm(decodeWaveObject(wave_object), wave_object.sample_rate, sample_rate, channels)
+               for key, wave_object in samples_dict.items()}
+
+    return decoded, sample_rate
+
+def mixEvents(frames, keys, decoded_samples, start_frame, num_frames, channels = 2):
+
+    """
+    Mixes the decoded samples (arg3) of the given keys (arg2), starting at the given frames (arg1), into a buffer of
+    num_frames (arg5) frames beginning at start_frame (arg4). Samples reaching over the buffer's borders are cut.
+
+    """
+
+    buffer = np.zeros((num_frames, channels), dtype=np.float32)
+
+    for frame, key in zip(frames, keys):
+        sample = decoded_samples[key]
+        offset = frame - start_frame
+
+        begin = max(offset, 0)
+        end = min(offset + len(sample), num_frames)
+        if begin < end:
+            buffer[begin:end] += sample[begin - offset:end - offset]
+
+    return buffer
+
+def pcmToBytes(buffer, bytes_per_sample = 2):
+
+    """
+    Converts a float buffer (clipped to -1 .. 1) into little-endian integer WAV data of 2 or 3 bytes per sample.
+
+    """
+
+    buffer = np.clip(buffer, -1, 1)
+
+    if bytes_per_sample == 2:
+        return (buffer * (2**15 - 1)).astype('<i2').tobytes()
+    if bytes_per_sample == 3:
+        data = (buffer * (2**23 - 1)).astype('<i4').reshape(-1, 1).view(np.uint8)
+        return data[:, :3].tobytes()
+
+    raise ValueError("bytes_per_sample has to be 2 or 3")
+
+def eventsToFrames(events, sample_rate):
+
+    """
+    Sorts (time, key) events and converts their times to sample-accurate frame offsets.
+
+    """
+
+    events = sorted(events, key=lambda event: event[0])
+    frames = np.array([int(round(time * sample_rate)) for time, _ in events], dtype=np.int64)
+    keys = [key for _, key in events]
+    return frames, keys
+
+# Per worker process: decoded samples, only sent once per worker
+WORKER_SAMPLES = {}
+
+def initRenderWorker(decoded_samples):
+    WORKER_SAMPLES.update(decoded_samples)
+
+def renderChunk(task):
+    frames, keys, start_frame, num_frames, channels, gain, bytes_per_sample = task
+    return pcmToBytes(mixEvents(frames, keys, WORKER_SAMPLES, start_frame, num_frames, channels) * gain, bytes_per_sample)
+
+def renderEvents(events, samples_dict, filepath, duration = None, sample_rate = None, channels = 2, gain = 0.5,
+                 bytes_per_sample = 2, chunk_seconds = 10, processes = None):
+
+    """
+    Renders a list of (time, key) events (arg1) with the samples of samples_dict (arg2) into a WAV file (arg3).
+
+    The file lasts at least duration (arg4, seconds) and in any case until the last sample has finished.
+    Chunks of chunk_seconds are rendered in parallel on a process pool (default: all cores).
+    With processes = 1, they are rendered in this process instead, e.g. when it is a pool worker itself.
+
+    Returns the length of the rendered file in seconds.
+
+    """
+
+    decoded_samples, sample_rate = decodeSamples(samples_dict, sample_rate, channels)
+    frames, keys = eventsToFrames(events, sample_rate)
+
+    total_frames = max((frame + len(decoded_samples[key]) for frame, key in zip(frames, keys)), default=0)
+    if duration is not None:
+        total_frames = max(total_frames, int(round(duration * sample_rate)))
+
+    # Each chunk gets every event that starts within it or still sounds at its beginning
+    longest_sample = max((len(sample) for sample in decoded_samples.values()), default=0)
+    chunk_frames = int(chunk_seconds * sample_rate)
+    tasks = []
+
+    for start_frame in range(0, total_frames, chunk_frames):
+        num_frames = min(chunk_frames, total_frames - start_frame)
+        first = np.searchsorted(frames, start_frame - longest_sample, side='right')
+        last = np.searchsorted(frames, start_frame + num_frames, side='left')
+        tasks.append((frames[first:last], keys[first:last], start_frame, num_frames, channels, gain, bytes_per_sample))
+
+    with wave.open(str(filepath), "wb") as wave_file:
+        wave_file.setnchannels(channels)
+        wave_file.setsampwidth(bytes_per_sample)
+        wave_file.setframerate(sample_rate)
+
+        if processes == 1:
+            initRenderWorker(decoded_samples)
+            for task in tasks:
+                wave_file.writeframes(renderChunk(task))
+            WORKER_SAMPLES.clear()
+        else:
+            with multiprocessing.Pool(processes, initializer=initRenderWorker, initargs=(decoded_samples,)) as pool:
+                for chunk in pool.imap(renderChunk, tasks):
+                    wave_file.writeframes(chunk)
+
+    return total_frames / sample_rate
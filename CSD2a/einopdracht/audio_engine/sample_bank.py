@@ -0,0 +1,153 @@
+import numpy as np
+import collections.abc
+import hashlib
+import os
+import pathlib
+import wave
+import simpleaudio as sa
+from audio_engine.offline_render import decodePcm, convertPcm
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Lazy, pre-decoded sample bank.
+
+A SampleBank indexes the WAV files of a samples directory (only a directory listing, no file is read) and maps keys
+(e.g. "X" or 1) to file names. A sample is decoded and converted to the bank's common format (sample rate, channels,
+16 bit integer PCM) only the first time it is used.
+
+The converted PCM is cached as a .npy file next to the samples directory and loaded memory-mapped. A cache entry is named
+after a hash of the WAV file's path, size and modification time and of the target format, so editing a WAV invalidates it.
+Playback processes receive the bank without any loaded data, and memory-map the same cache files instead of reading the WAVs.
+
+Bank samples stand in for simpleaudio WaveObjects (play(), audio_data, num_channels, bytes_per_sample, sample_rate),
+so a bank can be used wherever a SAMPLES_DICT is expected.
+
+
+"""
+
+
+
+def readWaveFile(filepath):
+
+    """
+    Reads a WAV file and returns its PCM as float32 array of shape (frames, channels), and its sample rate.
+
+    """
+
+    with wave.open(str(filepath), "rb") as wave_file:
+        audio_data = wave_file.readframes(wave_file.getnframes())
+        return decodePcm(audio_data, wave_file.getsampwidth(), wave_file.getnchannels()), wave_file.getframerate()
+
+class BankSample:
+
+    """
+    A decoded sample of a bank: 16 bit PCM (arg1) of shape (frames, channels) at sample_rate (arg2). Plays like a WaveObject.
+
+    """
+
+    bytes_per_sample = 2
+
+    def __init__(self, pcm, sample_rate):
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+        self.num_channels = pcm.shape[1]
+
+    @property
+    def audio_data(self):
+        return self.pcm
+
+    def play(self):
+        return sa.play_buffer(self.pcm, self.num_channels, self.bytes_per_sample, self.sample_rate)
+
+class SampleBank(collections.abc.Mapping):
+
+    """
+    Maps keys to the WAV files of directory (arg1), following names (arg2, e.g. {"X": "kick"}; default: every file by its name).
+    Samples are converted to sample_rate (arg3) and channels (arg4) on first use, and cached in cache_dir (arg5).
+
+    """
+
+    def __init__(self, directory, names = None, sample_rate = 48000, channels = 2, cache_dir = None):
+        self.directory = pathlib.Path(directory)
+        self.index = {path.stem: path for path in sorted(self.directory.glob("*.wav"))}
+        self.names = dict(names) if names is not None else {name: name for name in self.index}
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.cache_dir = pathlib.Path(cache_dir) if cache_dir is not None else self.directory.parent / "sample_cache"
+        self.loaded = {}
+
+        missing = [name for name in self.names.values() if name not in self.index]
+        if missing:
+            raise FileNotFoundError(f"No WAV file for {missing} in {self.directory}")
+
+    # Only the index is sent to playback processes; they load the samples from the cache themselves
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['loaded'] = {}
+        return state
+
+    def __getitem__(self, key):
+        if key not in self.loaded:
+            self.loaded[key] = BankSample(self.loadPcm(self.names[key]), self.sample_rate)
+        return self.loaded[key]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def formatTag(self):
+        return f"{self.sample_rate}Hz-{self.channels}ch"
+
+    def cachePath(self, name):
+
+        """
+        Cache file of the sample name (arg1), for the current version of its WAV file and the bank's format.
+
+        """
+
+        path = self.index[name]
+        status = path.stat()
+        inputs = f"{path.resolve()}|{status.st_size}|{status.st_mtime_ns}|{self.sample_rate}|{self.channels}|{BankSample.bytes_per_sample}"
+        return self.cache_dir / f"{name}.{self.formatTag()}.{hashlib.sha256(inputs.encode()).hexdigest()[:16]}.npy"
+
+    def loadPcm(self, name):
+
+        """
+        Returns the converted PCM of sample name (arg1), memory-mapped from the cache. Decodes and caches it first, if needed.
+
+        """
+
+        path = self.cachePath(name)
+
+        try:
+            return np.load(path, mmap_mode='r')
+        except FileNotFoundError:
+            pass
+
+        pcm, rate = readWaveFile(self.index[name])
+        pcm = convertPcm(pcm, rate, self.sample_rate, self.channels)
+        pcm = (np.clip(pcm, -1, 1) * (2**15 - 1)).astype('<i2')
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        # Atomic write: other processes either see no entry or the complete one
+        temporary_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+        with open(temporary_path, "wb") as cache_file:
+            np.save(cache_file, pcm)
+        os.replace(temporary_path, path)
+
+        # Entries of older versions of the WAV file are outdated
+        for outdated in self.cache_dir.glob(f"{name}.{self.formatTag()}.*.npy"):
+            if outdated != path:
+                try:
+                    outdated.unlink()
+                except OSError:
+                    pass
+
+        return np.load(path, mmap_mode='r')
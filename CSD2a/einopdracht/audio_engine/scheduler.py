@@ -0,0 +1,74 @@
+import heapq
+import itertools
+import operator
+from audio_engine.transport import Transport
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Single-thread event scheduler for any number of sequences.
+
+Instead of one process (or thread) per sequence, each sleeping for its own events, the sorted event streams of all
+sequences are merged lazily with a heap: only the next pending event of every stream is kept, so Patterns can be
+generated loop by loop, and endless ones work as well. One timing thread walks through the merged stream and waits once
+per due time (on a Transport, see transport.py), then dispatches every event due at that time.
+
+The cost per event is a heap operation (logarithmic in the number of streams) and a dispatch, and there is only one
+timing thread, so 256 sequences take about as much CPU per event as 3.
+
+
+"""
+
+
+
+def indexedStream(stream, index):
+    for event in stream:
+        yield float(event['timestamp']), index, event
+
+def mergeEventStreams(streams):
+
+    """
+    Lazily merges sorted event streams (arg1: event tables, Pattern.iterEvents() or any iterables of records with a 'timestamp')
+    into one stream of (timestamp, stream index, event) tuples. Events with the same timestamp keep the order of their streams.
+
+    """
+
+    return heapq.merge(*[indexedStream(stream, index) for index, stream in enumerate(streams)], key=operator.itemgetter(0))
+
+def scheduleEvents(streams, dispatch, transport = None, lookahead = 0, recorder = None):
+
+    """
+    Plays back event streams (arg1) from one thread: for every due time, waits once (until lookahead (arg4) seconds before it,
+    on a Transport (arg3), or an own one starting right away), then calls dispatch(stream index, event) (arg2) for each event due.
+
+    With a recorder (arg5, a LatencyRecorder with one label per stream), the timing of every event is recorded.
+    Returns the drift at the last due time and the maximum drift, in seconds.
+
+    """
+
+    if transport is None:
+        transport = Transport(lead_in = 0)
+
+    last_drift = 0
+    max_drift = 0
+
+    for due_time, due_events in itertools.groupby(mergeEventStreams(streams), key=operator.itemgetter(0)):
+
+        if transport.now() < due_time - lookahead:
+            transport.waitUntil(due_time - lookahead)
+
+        # Dispatched ahead of time (to a mixer), events start exactly at their due time, unless even that has passed
+        last_drift = transport.now() - due_time
+        if lookahead > 0:
+            last_drift = max(last_drift, 0)
+        max_drift = max(max_drift, abs(last_drift))
+
+        for _, index, event in due_events:
+            dispatch(index, event)
+            if recorder is not None:
+                recorder.record(index, due_time, due_time + last_drift)
+
+    return last_drift, max_drift
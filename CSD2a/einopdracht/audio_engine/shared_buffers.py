@@ -0,0 +1,138 @@
+import numpy as np
+import simpleaudio as sa
+from multiprocessing import shared_memory
+from audio_engine.events import EVENT_DTYPE
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Shared-memory transport of events and sample PCM for playback processes.
+
+Instead of pickling every event list and every WaveObject into every playback process, the parent places them once in
+multiprocessing.shared_memory blocks, as compact numpy arrays. Processes only receive small descriptors (block name,
+shape, dtype) and attach to the blocks by name, without copying. Spawn time and memory per process therefore stay flat,
+no matter how many sequences there are.
+
+The parent owns the blocks: it keeps the SharedBuffers object alive during playback and calls release() afterwards.
+
+
+"""
+
+
+def attachArray(descriptor):
+
+    """
+    Attaches to a shared array by its descriptor (name, shape, dtype). Returns the shared memory block and the array view on it;
+    the block has to be kept alive as long as the view is used.
+
+    """
+
+    name, shape, dtype = descriptor
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+class SharedBuffers:
+
+    """
+    Owner of the shared memory blocks created in the parent process.
+
+    """
+
+    def __init__(self):
+        self.blocks = []
+
+    def share(self, array):
+
+        """
+        Copies an array (arg1) into a new shared memory block, once. Returns the descriptor to attach to it.
+
+        """
+
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        self.blocks.append(block)
+        return (block.name, array.shape, array.dtype)
+
+    def shareEventList(self, event_list):
+
+        """
+        Shares an event table (see audio_engine/events.py). Its records are accessed like dicts, e.g. event['timestamp'].
+
+        """
+
+        return self.share(np.asarray(event_list, dtype=EVENT_DTYPE))
+
+    def shareSamples(self, samples_dict):
+
+        """
+        Shares the PCM data of all WaveObjects in a samples dict. Returns a dict of descriptors, including the audio format.
+
+        """
+
+        return {key: (self.share(np.frombuffer(wave_object.audio_data, dtype=np.uint8)),
+                      wave_object.num_channels, wave_object.bytes_per_sample, wave_object.sample_rate)
+                for key, wave_object in samples_dict.items()}
+
+    def release(self):
+
+        """
+        Closes and frees all blocks. Only call after every process using them has finished.
+
+        """
+
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+class SharedSample:
+
+    """
+    Plays the PCM of a shared sample; stands in for a simpleaudio WaveObject in a playback process.
+
+    """
+
+    def __init__(self, descriptor):
+        array_descriptor, self.num_channels, self.bytes_per_sample, self.sample_rate = descriptor
+        self.block, self.pcm = attachArray(array_descriptor)
+
+    @property
+    def audio_data(self):
+        return self.pcm
+
+    def play(self):
+        return sa.play_buffer(self.pcm, self.num_channels, self.bytes_per_sample, self.sample_rate)
+
+def attachEventLists(descriptors):
+
+    """
+    Attaches to all shared event lists. Returns the blocks (keep them alive) and the event arrays.
+    Entries that are not descriptors (e.g. Patterns, which are small enough to be sent as they are) are passed on unchanged.
+
+    """
+
+    blocks = []
+    event_lists = []
+
+    for descriptor in descriptors:
+        if isinstance(descriptor, tuple):
+            block, events = attachArray(descriptor)
+            blocks.append(block)
+            event_lists.append(events)
+        else:
+            event_lists.append(descriptor)
+
+    return blocks, event_lists
+
+def attachSamples(descriptors):
+
+    """
+    Attaches to all shared samples, returning a samples dict of SharedSamples.
+
+    """
+
+    return {key: SharedSample(descriptor) for key, descriptor in descriptors.items()}
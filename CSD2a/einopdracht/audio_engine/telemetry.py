@@ -0,0 +1,232 @@
+import numpy as np
+import contextlib
+import csv
+import http.server
+import json
+import multiprocessing
+import threading
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Playback latency and jitter telemetry.
+
+A LatencyRecorder records the scheduled time, actual time and lateness of every played event into preallocated arrays,
+one row of slots per label (e.g. per axis or per sequence). Recording is only a few array writes, no printing,
+so it can stay inside the timing loop.
+
+The arrays live in shared memory (multiprocessing.RawArray): a recorder passed to playback processes collects the events
+of all of them. Every label is written by one process only, so no locks are needed.
+
+Afterwards, the recorder summarizes p50 / p95 / p99 / max lateness per label, builds histograms and exports to CSV or JSON.
+Optionally, serve() offers live counters (events, late, dropped) as JSON on a local HTTP endpoint; serving(port) does so
+for the duration of a with block (e.g. AudioMain(Telemetry = <port>), or TELEMETRY_PORT of the sequencer).
+
+
+"""
+
+
+
+class LatencyRecorder:
+
+    """
+    Records scheduled and actual times of up to capacity (arg2) events for each of the labels (arg1).
+    Events later than late_threshold (arg3, seconds) count as late; dropped events are only counted.
+
+    """
+
+    def __init__(self, labels, capacity = 100000, late_threshold = 0.005):
+        self.labels = [str(label) for label in labels]
+        self.capacity = capacity
+        self.late_threshold = late_threshold
+
+        num_labels = len(self.labels)
+        self.shared = {
+            'scheduled': multiprocessing.RawArray('d', num_labels * capacity),
+            'actual': multiprocessing.RawArray('d', num_labels * capacity),
+            'events': multiprocessing.RawArray('q', num_labels),
+            'late': multiprocessing.RawArray('q', num_labels),
+            'dropped': multiprocessing.RawArray('q', num_labels)
+        }
+        self.attachArrays()
+
+    def attachArrays(self):
+        self.scheduled = np.frombuffer(self.shared['scheduled'], dtype=np.float64).reshape(len(self.labels), self.capacity)
+        self.actual = np.frombuffer(self.shared['actual'], dtype=np.float64).reshape(len(self.labels), self.capacity)
+        self.events = np.frombuffer(self.shared['events'], dtype=np.int64)
+        self.late = np.frombuffer(self.shared['late'], dtype=np.int64)
+        self.dropped = np.frombuffer(self.shared['dropped'], dtype=np.int64)
+
+    # Only the shared arrays are sent to playback processes; the numpy views are rebuilt there
+    def __getstate__(self):
+        return {'labels': self.labels, 'capacity': self.capacity, 'late_threshold': self.late_threshold, 'shared': self.shared}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.attachArrays()
+
+    def record(self, label_index, scheduled_time, actual_time):
+
+        """
+        Records one played event of the label at label_index (arg1). Events beyond capacity are only counted.
+
+        """
+
+        n = self.events[label_index]
+        if n < self.capacity:
+            self.scheduled[label_index, n] = scheduled_time
+            self.actual[label_index, n] = actual_time
+        self.events[label_index] = n + 1
+
+        if actual_time - scheduled_time > self.late_threshold:
+            self.late[label_index] += 1
+
+    def drop(self, label_index):
+
+        """
+        Counts an event of the label at label_index (arg1), that was skipped because it was already too late.
+
+        """
+
+        self.dropped[label_index] += 1
+
+    def lateness(self, label_index):
+
+        """
+        Returns the lateness (actual minus scheduled time, seconds) of all recorded events of a label.
+
+        """
+
+        n = min(self.events[label_index], self.capacity)
+        return self.actual[label_index, :n] - self.scheduled[label_index, :n]
+
+    def counters(self):
+
+        """
+        Live counters per label: number of played, late and dropped events.
+
+        """
+
+        return {label: {'events': int(self.events[i]), 'late': int(self.late[i]), 'dropped': int(self.dropped[i])}
+                for i, label in enumerate(self.labels)}
+
+    def summary(self):
+
+        """
+        Counters plus p50, p95, p99 and max lateness (milliseconds) per label.
+
+        """
+
+        summary = self.counters()
+
+        for i, label in enumerate(self.labels):
+            lateness_ms = self.lateness(i) * 1000
+            if len(lateness_ms) == 0:
+                summary[label].update({'p50': None, 'p95': None, 'p99': None, 'max': None})
+                continue
+
+            p50, p95, p99 = np.percentile(lateness_ms, [50, 95, 99])
+            summary[label].update({'p50': float(p50), 'p95': float(p95), 'p99': float(p99), 'max': float(lateness_ms.max())})
+
+        return summary
+
+    def histogram(self, label_index, bin_width_ms = 0.5):
+
+        """
+        Histogram of the lateness of a label, in bins of bin_width_ms (arg2). Returns counts and bin edges (milliseconds).
+
+        """
+
+        lateness_ms = self.lateness(label_index) * 1000
+        if len(lateness_ms) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(1)
+
+        first = np.floor(lateness_ms.min() / bin_width_ms) * bin_width_ms
+        last = np.ceil(lateness_ms.max() / bin_width_ms) * bin_width_ms + bin_width_ms
+        return np.histogram(lateness_ms, bins=np.arange(first, last + bin_width_ms / 2, bin_width_ms))
+
+    def printSummary(self):
+        print(f"\n{'Label':<14}{'Events':>8}{'Late':>8}{'Dropped':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for label, values in self.summary().items():
+            percentiles = "".join(f"{values[key]:>10.3f}" if values[key] is not None else f"{'-':>10}" for key in ('p50', 'p95', 'p99', 'max'))
+            print(f"{label:<14}{values['events']:>8}{values['late']:>8}{values['dropped']:>9}{percentiles}")
+        print()
+
+    def toCSV(self, filepath):
+
+        """
+        Exports every recorded event (label, scheduled time, actual time, lateness in ms) to a CSV file.
+
+        """
+
+        with open(filepath, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["label", "scheduled", "actual", "lateness_ms"])
+            for i, label in enumerate(self.labels):
+                n = min(self.events[i], self.capacity)
+                for scheduled, actual in zip(self.scheduled[i, :n], self.actual[i, :n]):
+                    writer.writerow([label, f"{scheduled:.6f}", f"{actual:.6f}", f"{(actual - scheduled) * 1000:.3f}"])
+
+    def toJSON(self, filepath, bin_width_ms = 0.5):
+
+        """
+        Exports the summary and the lateness histogram of every label to a JSON file.
+
+        """
+
+        export = {'summary': self.summary(), 'histograms': {}}
+        for i, label in enumerate(self.labels):
+            counts, edges = self.histogram(i, bin_width_ms)
+            export['histograms'][label] = {'counts': counts.tolist(), 'edges_ms': edges.tolist()}
+
+        with open(filepath, "w") as json_file:
+            json.dump(export, json_file, indent=2)
+
+    def serve(self, port = 8000):
+
+        """
+        Serves the live counters as JSON on http://localhost:port (arg1) from a background thread. Returns the server (call shutdown() to stop).
+
+        """
+
+        recorder = self
+
+        class CounterHandler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(recorder.counters()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", port), CounterHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    @contextlib.contextmanager
+    def serving(self, port = None):
+
+        """
+        Context manager serving the live counters on port (arg1) while the code inside it runs (e.g. playback), then shutting the server down.
+        Without a port, nothing is served.
+
+        """
+
+        if port is None:
+            yield None
+            return
+
+        server = self.serve(port)
+        print(f"\nLive telemetry counters on http://localhost:{server.server_address[1]}\n")
+        try:
+            yield server
+        finally:
+            server.shutdown()
+            server.server_close()
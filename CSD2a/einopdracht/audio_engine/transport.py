@@ -0,0 +1,123 @@
+import math
+import multiprocessing
+import time
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Shared transport clock and drift-free, high-precision waiting.
+
+A Transport holds one start time on time.perf_counter(), which is a monotonic, system-wide clock (CLOCK_MONOTONIC on Linux,
+mach_absolute_time on macOS, QueryPerformanceCounter on Windows). It is created once in the parent process, shortly in the future
+(lead_in), and passed to all playback processes, so that every sequence starts at exactly the same moment,
+no matter how long each process takes to start up.
+
+Every event is waited for on its absolute transport time (start + timestamp), never by adding up sleeps, so timing errors
+don't accumulate: sequences with different BPMs stay phase-locked over any number of loops.
+
+Processes can take long to start (with the spawn start method, the default on macOS and Windows, each one imports the whole
+module again, often for more than a second). A Transport for parties (arg4) processes therefore only fixes its start once
+all of them are ready: each process calls ready() before its first event, the parent calls start(), and the start time,
+lead_in seconds from then on, is shared with all of them. Before that, the start time is infinitely far away.
+
+Waiting is a hybrid: time.sleep() until spin_window seconds before the target (sleep can overshoot by milliseconds),
+then busy-waiting on perf_counter for the rest.
+
+
+"""
+
+
+
+def waitUntil(target, spin_window = 0.002):
+
+    """
+    Waits until perf_counter reaches target (arg1): sleeps until spin_window (arg2, seconds) before it, then spins.
+
+    """
+
+    remaining = target - time.perf_counter()
+    if remaining > spin_window:
+        time.sleep(remaining - spin_window)
+
+    while time.perf_counter() < target:
+        pass
+
+class Transport:
+
+    """
+    Shared start time for playback processes, lead_in (arg1) seconds from now, or at an explicit perf_counter start_time (arg3).
+    With parties (arg4), the start time lives in shared memory and is only fixed by start(), lead_in seconds after
+    all parties have called ready().
+
+    """
+
+    def __init__(self, lead_in = 0.5, spin_window = 0.002, start_time = None, parties = None):
+        self.lead_in = lead_in
+        self.spin_window = spin_window
+        self.barrier = None
+        self.shared_start = None
+
+        if parties is not None:
+            # The parent process takes part in the barrier as well
+            self.barrier = multiprocessing.Barrier(parties + 1)
+            self.shared_start = multiprocessing.RawValue('d', math.inf)
+        else:
+            self.local_start = time.perf_counter() + lead_in if start_time is None else start_time
+
+    @property
+    def start_time(self):
+        return self.shared_start.value if self.shared_start is not None else self.local_start
+
+    @start_time.setter
+    def start_time(self, start_time):
+        if self.shared_start is not None:
+            self.shared_start.value = start_time
+        else:
+            self.local_start = start_time
+
+    def ready(self, timeout = 60):
+
+        """
+        Called by every party when it is ready to play: waits until all parties are, and the start time has been fixed by start().
+        Without parties, returns right away.
+
+        """
+
+        if self.barrier is not None:
+            self.barrier.wait(timeout)
+            self.barrier.wait(timeout)
+
+    def start(self, timeout = 60):
+
+        """
+        Called by the parent process after starting the parties: waits until all of them are ready (raises threading.BrokenBarrierError
+        if they aren't within timeout (arg1) seconds), then fixes the start time lead_in seconds from now.
+        Without parties, returns right away.
+
+        """
+
+        if self.barrier is not None:
+            self.barrier.wait(timeout)
+            self.start_time = time.perf_counter() + self.lead_in
+            self.barrier.wait(timeout)
+
+    def now(self):
+
+        """
+        Current transport time in seconds (negative before the start).
+
+        """
+
+        return time.perf_counter() - self.start_time
+
+    def waitUntil(self, transport_time):
+
+        """
+        Waits until the given transport time (seconds after the start).
+
+        """
+
+        waitUntil(self.start_time + transport_time, self.spin_window)
@@ -0,0 +1,233 @@
+import numpy as np
+from audio_engine.offline_render import decodeWaveObject
+
+STEALING = ("oldest", "quietest", None)
+ENVELOPE_BLOCK = 0.01    # Seconds per value of a sample's level envelope
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Bounded voice pool: limits the number of simultaneously sounding sample voices, in total and per instrument.
+
+Dense bursts of events (e.g. many treshold crossings in a row) would otherwise start voice after voice, until the audio device
+can't keep up. When a new voice would exceed a limit, a sounding voice is stolen to make room for it:
+
+    "oldest"    -> the voice that started first
+    "quietest"  -> the voice whose sample is currently quietest (RMS envelope of the sample at the voice's position)
+    None        -> nothing is stolen, the new voice is dropped instead
+
+The Mixer (mixer.py) fades stolen voices out over a few milliseconds, which avoids clicks. Voices played with simpleaudio's play()
+(see playVoice()) can only be stopped.
+
+The pool counts started, stolen and dropped voices and the peak polyphony per instrument, to size the limits for peak load.
+
+A pool only sees the voices of its own process. When playback is spread over several processes, each with its own pool,
+splitVoiceLimits() divides the overall limit among them, so that together they stay within it; the per-instrument limit
+then applies per process.
+
+
+"""
+
+
+
+def sampleEnvelope(pcm, sample_rate, block = ENVELOPE_BLOCK):
+
+    """
+    RMS level of a decoded sample (arg1, (frames, channels) array) per block (arg3) seconds.
+
+    """
+
+    block_frames = max(1, int(round(block * sample_rate)))
+    num_blocks = -(-len(pcm) // block_frames)
+    power = np.mean(np.square(pcm, dtype=np.float64), axis=1)
+    power = np.concatenate([power, np.zeros(num_blocks * block_frames - len(power))])
+    return np.sqrt(power.reshape(num_blocks, block_frames).mean(axis=1))
+
+class VoicePool:
+
+    """
+    Keeps track of the sounding voices and enforces max_voices (arg1) overall and max_per_instrument (arg2) per key
+    (None: no limit), stealing voices as chosen by stealing (arg3, see STEALING).
+
+    Voices are [key, start time, handle] lists, oldest first; the handle is whatever plays the voice (a mixer voice, a PlayObject).
+
+    """
+
+    def __init__(self, max_voices = 32, max_per_instrument = 8, stealing = "oldest"):
+        if stealing not in STEALING:
+            raise ValueError(f"Unknown stealing method '{stealing}'. Choose from {list(STEALING)}.")
+
+        self.max_voices = max_voices
+        self.max_per_instrument = max_per_instrument
+        self.stealing = stealing
+        self.voices = []
+        self.envelopes = {}
+        self.counts = {}
+        self.peak = 0
+
+    def setEnvelope(self, key, pcm, sample_rate):
+
+        """
+        Stores the level envelope of the sample of key (arg1), used for quietest-first stealing.
+
+        """
+
+        self.envelopes[key] = sampleEnvelope(pcm, sample_rate)
+
+    def level(self, voice, now):
+
+        """
+        Current level of a voice at time now (arg2), from its sample's envelope (0 past its end, or without an envelope).
+
+        """
+
+        envelope = self.envelopes.get(voice[0])
+        if envelope is None:
+            return 0.0
+        block = int((now - voice[1]) / ENVELOPE_BLOCK)
+        return float(envelope[block]) if 0 <= block < len(envelope) else 0.0
+
+    def choose(self, candidates, now):
+        if self.stealing is None or len(candidates) == 0:
+            return None
+        if self.stealing == "oldest":
+            return candidates[0]
+        return min(candidates, key=lambda voice: (self.level(voice, now), voice[1]))
+
+    def count(self, key, field):
+        counts = self.counts.setdefault(key, {'started': 0, 'stolen': 0, 'dropped': 0, 'peak': 0})
+        counts[field] += 1
+        return counts
+
+    def admit(self, key, now):
+
+        """
+        Makes room for a new voice of key (arg1) starting at now (arg2, seconds).
+        Returns the handles of the voices stolen for it (removed from the pool), or None if the new voice has to be dropped.
+
+        """
+
+        stolen = []
+
+        if self.max_per_instrument is not None:
+            same_key = [voice for voice in self.voices if voice[0] == key]
+            if len(same_key) >= self.max_per_instrument:
+                victim = self.choose(same_key, now)
+                if victim is None:
+                    self.count(key, 'dropped')
+                    return None
+                stolen.append(victim)
+
+        if self.max_voices is not None and len(self.voices) - len(stolen) >= self.max_voices:
+            victim = self.choose([voice for voice in self.voices if all(voice is not other for other in stolen)], now)
+            if victim is None:
+                self.count(key, 'dropped')
+                return None
+            stolen.append(victim)
+
+        for victim in stolen:
+            self.count(victim[0], 'stolen')
+        stolen_ids = {id(victim) for victim in stolen}
+        self.voices = [voice for voice in self.voices if id(voice) not in stolen_ids]
+
+        return [victim[2] for victim in stolen]
+
+    def add(self, key, now, handle):
+
+        """
+        Adds an admitted voice of key (arg1), started at now (arg2), played by handle (arg3).
+
+        """
+
+        self.voices.append([key, now, handle])
+        counts = self.count(key, 'started')
+        counts['peak'] = max(counts['peak'], sum(voice[0] == key for voice in self.voices))
+        self.peak = max(self.peak, len(self.voices))
+
+    def release(self, handle):
+
+        """
+        Removes the voice played by handle (arg1) once it has ended.
+
+        """
+
+        self.voices = [voice for voice in self.voices if voice[2] is not handle]
+
+    def prune(self, is_active):
+
+        """
+        Removes all voices whose handle is no longer active (arg1: function of a handle, e.g. PlayObject.is_playing).
+
+        """
+
+        self.voices = [voice for voice in self.voices if is_active(voice[2])]
+
+    def summary(self):
+
+        """
+        Started, stolen and dropped voices and peak polyphony per key, plus the overall totals.
+
+        """
+
+        summary = {key: dict(counts) for key, counts in self.counts.items()}
+        summary['total'] = {field: sum(counts[field] for counts in self.counts.values()) for field in ('started', 'stolen', 'dropped')}
+        summary['total']['peak'] = self.peak
+        return summary
+
+    def printSummary(self):
+        print(f"\n{'Voices':<14}{'Started':>9}{'Stolen':>9}{'Dropped':>9}{'Peak':>7}"
+              f"      (limits: {self.max_voices} overall, {self.max_per_instrument} per instrument, stealing {self.stealing})")
+        for key, counts in self.summary().items():
+            print(f"{str(key):<14}{counts['started']:>9}{counts['stolen']:>9}{counts['dropped']:>9}{counts['peak']:>7}")
+        print()
+
+def splitVoiceLimits(voice_limits, parts):
+
+    """
+    Voice limits (arg1, VoicePool arguments) for each of parts (arg2) processes with their own pools: max_voices is divided evenly
+    (at least 1 voice each), max_per_instrument and stealing stay as they are.
+
+    """
+
+    limits = dict(voice_limits)
+    if limits.get('max_voices') is not None:
+        limits['max_voices'] = max(1, limits['max_voices'] // max(1, parts))
+    return limits
+
+def playVoice(pool, samples_dict, key, now):
+
+    """
+    Plays the sample of key (arg3) with its play() (simpleaudio), within the limits of the pool (arg1), at time now (arg4, seconds).
+    Stolen voices are stopped at once, as simpleaudio can't fade out a playing buffer.
+    Returns the PlayObject, or None if the voice was dropped.
+
+    """
+
+    pool.prune(lambda play_object: play_object.is_playing())
+
+    if pool.stealing == "quietest" and key not in pool.envelopes:
+        pool.setEnvelope(key, decodeWaveObject(samples_dict[key]), samples_dict[key].sample_rate)
+
+    stolen = pool.admit(key, now)
+    if stolen is None:
+        return None
+
+    for play_object in stolen:
+        play_object.stop()
+
+    play_object = samples_dict[key].play()
+    pool.add(key, now, play_object)
+    return play_object
+
+def waitVoices(pool):
+
+    """
+    Waits until every PlayObject of the pool (arg1) has finished.
+
+    """
+
+    for voice in list(pool.voices):
+        voice[2].wait_done()
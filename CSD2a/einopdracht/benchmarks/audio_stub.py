@@ -0,0 +1,59 @@
+import sys
+import wave
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Stub audio backend for headless benchmarks.
+
+Stands in for the simpleaudio module (WaveObject, play_buffer and PlayObject) without opening any audio device:
+playing returns at once and nothing is heard. install() puts it in place of simpleaudio and disables sounddevice,
+so the mixer is not used either. It has to be called before the sonifier or sequencer modules are imported.
+
+
+"""
+
+
+
+class PlayObject:
+
+    def wait_done(self):
+        pass
+
+    def is_playing(self):
+        return False
+
+    def stop(self):
+        pass
+
+class WaveObject:
+
+    def __init__(self, audio_data, num_channels = 2, bytes_per_sample = 2, sample_rate = 44100):
+        self.audio_data = audio_data
+        self.num_channels = num_channels
+        self.bytes_per_sample = bytes_per_sample
+        self.sample_rate = sample_rate
+
+    @classmethod
+    def from_wave_file(cls, path):
+        with wave.open(str(path), "rb") as wave_file:
+            return cls(wave_file.readframes(wave_file.getnframes()), wave_file.getnchannels(), wave_file.getsampwidth(), wave_file.getframerate())
+
+    def play(self):
+        return PlayObject()
+
+def play_buffer(audio_data, num_channels, bytes_per_sample, sample_rate):
+    return PlayObject()
+
+def install():
+
+    """
+    Replaces simpleaudio by this stub and makes sounddevice unavailable.
+
+    """
+
+    sys.modules["simpleaudio"] = sys.modules[__name__]
+    sys.modules["sounddevice"] = None
@@ -0,0 +1,284 @@
+import numpy as np
+import argparse
+import contextlib
+import io
+import json
+import pathlib
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+DIR_PATH = pathlib.Path(__file__).parent.resolve()
+sys.path += [str(DIR_PATH.parent), str(DIR_PATH.parent / "rossler_attractor"), str(DIR_PATH.parent / "multi_sample_sequencer")]
+
+import audio_stub
+audio_stub.install()
+
+from rossler_attractor import (rossler_attractor, calculation, normalizeData, normalizeDataChunked, DataTresholdConditioning, DataGradientConditioning,
+                               BinaryNotesToTimestamps, tresholdCrossingIndices, gradientCrossingIndices, crossingIndicesToTimestamps)
+from integrators import ensembleCalculation, rosslerSystem
+from MultiSampleSequencer import durationsToSixteenthTimestamps, sixteenthTimestampsToSecondTimestamps, makeEventList
+from midi_files import writeMidiFile
+from audio_engine.events import Pattern
+from audio_engine.scheduler import scheduleEvents
+from audio_engine.transport import Transport
+
+STEP_SIZES = [10**4, 10**5, 10**6, 10**7]
+EVENT_SIZES = [10, 10**2, 10**3, 10**4, 10**5, 10**6]
+THRESHOLD = 0.25    # Allowed slowdown against the baseline (0.25 = 25 %)
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Benchmark suite of every pipeline stage of the sonifier and the sequencer.
+
+Each stage is timed (best of several runs) and memory-profiled (peak traced allocation, tracemalloc) for step counts
+from 10^4 to 10^7 and sequence sizes from 10 to 10^6 events. The original pure-Python stages are only run up to the size
+at which they still finish in reasonable time. Audio goes through a stub backend (audio_stub.py), so everything runs headless.
+
+Results are saved as JSON and can be compared with a stored baseline: any stage more than THRESHOLD slower
+counts as a regression (exit code 1).
+
+baseline.json is such a baseline, made with --quick --save-baseline (on the stub backend, the machine is in its "meta").
+Timings only compare on the same machine: run the same command once to store a baseline of your own, before changing anything.
+
+Usage:
+    python benchmark_pipeline.py [--quick] [--stages NAME ...] [--output results.json]
+                                 [--baseline baseline.json] [--threshold 0.25] [--save-baseline]
+
+
+"""
+
+
+
+"""
+
+Inputs
+-------------------------------------------------
+
+"""
+
+TRAJECTORIES = {}
+
+def trajectory(steps):
+
+    """
+    Normalized (3, steps + 1) trajectory of the default Rössler Attractor, calculated once per step count.
+
+    """
+
+    if steps not in TRAJECTORIES:
+        data = ensembleCalculation(rosslerSystem, [0.1, 0.1, 0.1], {'a': 0.3, 'b': 0.21, 'c': 5}, steps, 0.01)[:, 0]
+        with contextlib.redirect_stdout(io.StringIO()):
+            TRAJECTORIES[steps] = normalizeDataChunked(data).T.copy()
+    return TRAJECTORIES[steps]
+
+def randomSequences(num_events, num_sequences = 8, max_notes = 16, num_instruments = 3, seed = 0):
+
+    """
+    Generates random sequence specs (durations, instrumentation, loop_times, bpm, as in batch_mode.py) with about
+    num_events (arg1) events in total, spread over num_sequences (arg2) sequences of up to max_notes notes per loop.
+
+    """
+
+    rng = np.random.default_rng(seed)
+    specs = []
+
+    for sequence in range(num_sequences):
+        num_notes = int(rng.integers(1, max_notes + 1))
+        loop_times = max(1, int(np.ceil(num_events / num_sequences / num_notes)))
+        specs.append({
+            'durations': rng.choice([0.25, 0.5, 0.75, 1, 1.5, 2], num_notes).tolist(),
+            'instrumentation': rng.integers(1, num_instruments + 1, num_notes).tolist(),
+            'loop_times': loop_times,
+            'bpm': float(rng.choice([60, 90, 120, 140]))
+        })
+
+    return specs
+
+def specPatterns(specs):
+    return [Pattern(spec['durations'], spec['instrumentation'], spec['loop_times'], spec['bpm']) for spec in specs]
+
+def legacyEventLists(specs):
+
+    """
+    The sequencer's event lists, created the way createSequences() used to: loops replicated, then converted.
+
+    """
+
+    event_lists = []
+    for spec in specs:
+        durations = spec['durations'] * spec['loop_times']
+        instrumentation = spec['instrumentation'] * spec['loop_times']
+        timestamps = sixteenthTimestampsToSecondTimestamps(durationsToSixteenthTimestamps(durations), spec['bpm'])
+        event_lists.append(makeEventList(timestamps, instrumentation, len(spec['durations'])))
+    return event_lists
+
+def stubPlayback(patterns):
+
+    """
+    Dispatches every event of the sequences to the stub backend, through the scheduler, without waiting:
+    measures the scheduling and dispatch overhead only.
+
+    """
+
+    samples = {key: audio_stub.WaveObject(b"") for key in range(256)}
+    transport = Transport(start_time = -1e9)
+    scheduleEvents([pattern.iterEvents() for pattern in patterns], lambda index, event: samples[event['instrument']].play(), transport)
+
+def midiExport(patterns):
+    with tempfile.TemporaryDirectory() as directory:
+        writeMidiFile(patterns, pathlib.Path(directory) / "benchmark.mid")
+
+
+"""
+
+Stages
+-------------------------------------------------
+
+Name: (size kind, largest size, setup(size) -> arguments, stage function)
+
+"""
+
+STAGES = {
+    "calculation (original loop)": ("steps", 10**6, lambda n: (n,),
+                                    lambda n: calculation(rossler_attractor, steps = n)),
+    "ensembleCalculation euler": ("steps", 10**7, lambda n: (n,),
+                                  lambda n: ensembleCalculation(rosslerSystem, steps = n)),
+    "normalizeData": ("steps", 10**6, lambda n: tuple(trajectory(n)),
+                      normalizeData),
+    "normalizeDataChunked": ("steps", 10**7, lambda n: (trajectory(n).T.copy(),),
+                             normalizeDataChunked),
+    "DataTresholdConditioning": ("steps", 10**6, lambda n: (list(trajectory(n)), [0.1, 0.1, 0.1]),
+                                 DataTresholdConditioning),
+    "tresholdCrossingIndices": ("steps", 10**7, lambda n: (trajectory(n), [0.1, 0.1, 0.1]),
+                                tresholdCrossingIndices),
+    "DataGradientConditioning": ("steps", 10**6, lambda n: (list(trajectory(n)), [0.0, 0.0, 0.0]),
+                                 DataGradientConditioning),
+    "gradientCrossingIndices": ("steps", 10**7, lambda n: (trajectory(n), [0.0, 0.0, 0.0]),
+                                gradientCrossingIndices),
+    "BinaryNotesToTimestamps": ("steps", 10**6, lambda n: (DataTresholdConditioning(list(trajectory(n)), [0.1, 0.1, 0.1]), 2000),
+                                BinaryNotesToTimestamps),
+    "crossingIndicesToTimestamps": ("steps", 10**7, lambda n: (tresholdCrossingIndices(trajectory(n), [0.1, 0.1, 0.1]), n + 1, 2000),
+                                    crossingIndicesToTimestamps),
+    "makeEventList (replicated loops)": ("events", 10**6, lambda n: (randomSequences(n),),
+                                         legacyEventLists),
+    "Pattern.expand": ("events", 10**6, lambda n: (specPatterns(randomSequences(n)),),
+                       lambda patterns: [pattern.expand() for pattern in patterns]),
+    "MIDI export": ("events", 10**6, lambda n: (specPatterns(randomSequences(n)),),
+                    midiExport),
+    "scheduled playback (stub audio)": ("events", 10**5, lambda n: (specPatterns(randomSequences(n)),),
+                                        stubPlayback)
+}
+
+def measure(setup, function, size, repeats):
+
+    """
+    Runs function (arg2) on fresh arguments from setup(size) (arg1, arg3): the best time of repeats (arg4) runs,
+    then one more run under tracemalloc for the peak memory.
+
+    """
+
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeats):
+            arguments = setup(size)
+            start_time = time.perf_counter()
+            function(*arguments)
+            times.append(time.perf_counter() - start_time)
+
+        arguments = setup(size)
+        tracemalloc.start()
+        function(*arguments)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {'seconds': min(times), 'peak_bytes': peak}
+
+def runBenchmarks(stages = None, max_steps = STEP_SIZES[-1], max_events = EVENT_SIZES[-1]):
+
+    """
+    Benchmarks the given stages (arg1, names of STAGES; default: all) for every size up to max_steps / max_events.
+    Returns the results, keyed by "stage @ size".
+
+    """
+
+    results = {}
+
+    for name in stages or STAGES:
+        kind, largest, setup, function = STAGES[name]
+        sizes = [size for size in (STEP_SIZES if kind == "steps" else EVENT_SIZES)
+                 if size <= min(largest, max_steps if kind == "steps" else max_events)]
+
+        for size in sizes:
+            repeats = 3 if size <= 10**5 else 1
+            result = measure(setup, function, size, repeats)
+            results[f"{name} @ {size}"] = result
+            print(f"{name:<36}{size:>10} {kind:<7}{result['seconds']*1000:>12.3f} ms{result['peak_bytes']/1024**2:>12.2f} MB")
+
+    return results
+
+def saveResults(results, filepath):
+    export = {
+        'meta': {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                 'system': platform.system(), 'date': time.strftime("%Y-%m-%d %H:%M:%S")},
+        'results': results
+    }
+    with open(filepath, "w") as json_file:
+        json.dump(export, json_file, indent=2, sort_keys=True)
+
+def compareResults(results, baseline_path, threshold = THRESHOLD):
+
+    """
+    Compares results (arg1) with those of a baseline JSON file (arg2). Returns the regressions: every benchmark
+    more than threshold (arg3, 0.25 = 25 %) slower than in the baseline.
+
+    """
+
+    with open(baseline_path) as json_file:
+        baseline = json.load(json_file)['results']
+
+    regressions = {}
+    print(f"\n{'Benchmark':<50}{'Baseline ms':>14}{'Now ms':>12}{'Change':>10}")
+
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        before = baseline[key]['seconds']
+        change = result['seconds'] / before - 1 if before > 0 else 0
+        flag = "   REGRESSION" if change > threshold else ""
+        print(f"{key:<50}{before*1000:>14.3f}{result['seconds']*1000:>12.3f}{change*100:>9.1f}%{flag}")
+        if change > threshold:
+            regressions[key] = change
+
+    print(f"\n{len(regressions)} regressions (threshold {threshold*100:.0f} %).\n")
+    return regressions
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmarks every stage of the sonifier and sequencer pipelines.")
+    parser.add_argument("--quick", action="store_true", help="only sizes up to 10^5")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=None, metavar="NAME", help="stages to run (default: all)")
+    parser.add_argument("--output", default=DIR_PATH / "results.json", help="JSON file for the results")
+    parser.add_argument("--baseline", default=DIR_PATH / "baseline.json", help="baseline JSON file to compare with")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="allowed slowdown against the baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    arguments = parser.parse_args()
+
+    max_size = 10**5 if arguments.quick else None
+    results = runBenchmarks(arguments.stages, max_size or STEP_SIZES[-1], max_size or EVENT_SIZES[-1])
+    saveResults(results, arguments.output)
+
+    if arguments.save_baseline:
+        saveResults(results, arguments.baseline)
+        print(f"\nSaved baseline: {arguments.baseline}\n")
+    elif pathlib.Path(arguments.baseline).exists():
+        if compareResults(results, arguments.baseline, arguments.threshold):
+            sys.exit(1)
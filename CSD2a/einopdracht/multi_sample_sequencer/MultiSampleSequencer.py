@@ -1,54 +1,122 @@
-import simpleaudio as sa
+import numpy as np
+import contextlib
 import pathlib
+import sys
 import time
 import datetime
+import threading
 import multiprocessing
-from midi_writer import MIDIFile
+sys.path.append(str(pathlib.Path(__file__).parent.parent.resolve()))
+from audio_engine.offline_render import renderEvents
+from audio_engine.mixer import Mixer, MIXER_AVAILABLE
+from audio_engine.telemetry import LatencyRecorder
+from audio_engine.transport import Transport
+from audio_engine.scheduler import scheduleEvents
+from audio_engine.sample_bank import SampleBank
+from audio_engine.voice_pool import VoicePool, playVoice, waitVoices, splitVoiceLimits
+from audio_engine.loop_buffers import LoopCache
+from audio_engine.shared_buffers import SharedBuffers, attachEventLists, attachSamples
+from audio_engine.events import makeEventTable, mergeEventTables, toEventTable, numEvents, Pattern
+from midi_files import writeMidiFile, MidiIndex
 
 ##    Global Variables
 DIR_PATH = pathlib.Path(__file__).parent.resolve()
-SAMPLES_DICT = {
-   1: sa.WaveObject.from_wave_file(f"{DIR_PATH}/samples/toyhit.wav"),
-   2: sa.WaveObject.from_wave_file(f"{DIR_PATH}/samples/toycar.wav"),
-   3: sa.WaveObject.from_wave_file(f"{DIR_PATH}/samples/toytrain.wav")
+TELEMETRY = False     # Record the timing of every event instead of printing it, summarized after playback
+TELEMETRY_PORT = None # Port to serve the live telemetry counters on during playback (e.g. 8000), implies TELEMETRY
+SAMPLES_DICT = SampleBank(DIR_PATH / "samples", {1: "toyhit", 2: "toycar", 3: "toytrain"}, sample_rate = 96000)
+# Polyphony limits of playback (see audio_engine/voice_pool.py). With one process per sequence, each has its own pool, with an equal share of max_voices.
+VOICE_LIMITS = {'max_voices': 32, 'max_per_instrument': 8, 'stealing': "oldest"}
+NUMBER_ERRORS = {
+   1: "Invalid input. Please enter a valid number.",
+   2: "Number has to be positive",
+   3: "Number has to be an integer"
 }
 
 """
 DESCRIPTION
 -----------------------
 
-Prompts the user (terminal) to create multiple rhythmical sequences, to be played back simultaneously through multiprocessing.
+Prompts the user (terminal) to create multiple rhythmical sequences, to be played back simultaneously by one scheduler thread
+(or, alternatively, through multiprocessing).
 
-The created sequences be saved as individual one-track MIDI Files.
+Finite sequences created in the terminal are pre-rendered instead: one cycle of each is mixed into a buffer once (and cached, see
+audio_engine/loop_buffers.py), and all their loops are played gaplessly as one buffer. Replayed sessions, telemetry runs
+and sequences lasting longer than LOOP_BUFFER_MAX_SECONDS (audio_engine/loop_buffers.py) use the scheduler.
+
+The created sequences can be saved as the tracks of one MIDI File.
+
+Sessions saved as MIDI Files can be replayed right away, instead of entering them again.
+
+To create, render and export many sequences without prompts, see batch_mode.py.
 
 
 """
 
 
 
+def numberErrors(numbers, checkPositive=False, checkInt=False):
+
+    """
+    The rules of errorFunction(), applied to a whole list of numbers (arg1) at once.
+    Returns an array with an error code per number: 0 = valid, else a key of NUMBER_ERRORS (the first rule that fails).
+
+    Unlike errorFunction(), which raises a TypeError for them (as float() does), values of a wrong type (e.g. None)
+    are reported as invalid numbers (code 1), so that one bad value of a batch doesn't stop the validation of the others.
+    Like errorFunction(), 'nan' passes checkPositive (it is not <= 0), but not checkInt.
+
+    """
+
+    # Attempt to convert all inputs to floats at once; only for mixed or invalid inputs one by one
+    try:
+        values = np.asarray(numbers, dtype=np.float64)
+        if values.ndim != 1:
+            raise ValueError("Expected a flat list of numbers")
+        valid = np.ones(len(values), dtype=bool)
+
+        # numpy converts None to nan, float() doesn't: check the nan values one by one
+        for i in np.flatnonzero(np.isnan(values)):
+            try:
+                float(numbers[i])
+            except (TypeError, ValueError):
+                valid[i] = False
+    except (TypeError, ValueError):
+        values = np.zeros(len(numbers))
+        valid = np.zeros(len(numbers), dtype=bool)
+        for i, number in enumerate(numbers):
+            try:
+                values[i] = float(number)
+                valid[i] = True
+            except (TypeError, ValueError):
+                continue
+
+    codes = np.where(valid, 0, 1).astype(np.uint8)
+
+    if checkPositive:
+        codes[(codes == 0) & (values <= 0)] = 2
+
+    if checkInt:
+        codes[(codes == 0) & ~(np.isfinite(values) & (values == np.floor(values)))] = 3
+
+    return codes
+
 def errorFunction(number, checkPositive=False, checkInt=False):
     
     """
     Checks whether a given number is a valid number, positive and / or integer and returns an "Error" message if not.
+    A value of a wrong type (e.g. None) raises a TypeError, as float() does.
 
     """
 
-    # Attempt to convert the input to a float
-    try:
-        number = float(number)
-    except ValueError:
-        print("\nERROR: Invalid input. Please enter a valid number.\n")
-        return "Error"
+    if not isinstance(number, (str, bytes)):
+        float(number)
 
-    if checkPositive and number <= 0:
-        print("\nERROR: Number has to be positive\n")
-        return "Error"
+    code = numberErrors([number], checkPositive, checkInt)[0]
 
-    if checkInt and not number.is_integer():
-        print("\nERROR: Number has to be an integer\n")
+    if code != 0:
+        print(f"\nERROR: {NUMBER_ERRORS[code]}\n")
         return "Error"
 
-    return number
+    return float(number)
 
 def inputNumSequences(default_num = 3):
   
@@ -179,18 +247,16 @@ def inputInstrumentation(sequence, samples_dict):
 def durationsToSixteenthTimestamps(noteDurations):
   
   """
-  Formats a list of single note durations into a list of sequential timestamps.
+  Formats a list of single note durations into an array of sequential timestamps (cumulative sum).
 
   Note durations (arg1): 0.25 = 16th, 0.5 = 8th, 1 = Quarter, ...
   Example input: [0.25, 1, 0.5. 0.75, ...]
   
   """
   
-  timestamps = [0]
-  for note_length in noteDurations:
-    sixteenth = note_length * 4
-    timestamps.append(sixteenth + timestamps[-1])
-  timestamps.pop()
+  sixteenths = np.asarray(noteDurations, dtype=np.float64) * 4
+  timestamps = np.zeros(len(sixteenths))
+  np.cumsum(sixteenths[:-1], out=timestamps[1:])
 
   return timestamps
 
@@ -198,50 +264,49 @@ def sixteenthTimestampsToSecondTimestamps(sixteenthTimestamps, bpm):
   
   """
   Converts a given list of note duration timestamps (arg1) into a seconds, based on the provided BPM (arg2).
+  Returns an array.
 
   Note durations (arg1): 0.25 = 16th, 0.5 = 8th, 1 = Quarter, ...
   Example input: [0.25, 0.75, 1, 1.75, 2, ...]
   
   """
   
-  timestamps = []
-  for timestamp in sixteenthTimestamps:
-    timestamp = timestamp/4*(60/bpm)
-    timestamps.append(timestamp)
-  return timestamps
+  return np.asarray(sixteenthTimestamps, dtype=np.float64)/4*(60/bpm)
 
-def makeEventList(timestampsSeconds, instrumentationList):
+def makeEventList(timestampsSeconds, instrumentationList, notesPerLoop = None, velocity = 70):
    
    """
-   Format corresponding lists of timestamps and instruments into a list of events (dicts).
+   Format corresponding lists of timestamps and instruments into an event table (see audio_engine/events.py),
+   sorted by timestamp. Its records are accessed like dicts, with keys 'timestamp', 'instrument', 'velocity' and 'loop'.
+
+   With notesPerLoop (arg3), every event gets the index of the loop it belongs to.
    
    """
 
    if len(timestampsSeconds) != len(instrumentationList):
       print("The two lists do not have the same length")
       raise ValueError("Lists must have the same length")
-   
-   event_list = []
 
-   for n in range(len(timestampsSeconds)):
-      event = {}
-      event['timestamp'] = timestampsSeconds[n]
-      event['instrument'] = instrumentationList[n]
-      event_list.append(event)
-    
-   def getTimestamp(event):
-      return event['timestamp']
-   
-   event_list.sort(key=getTimestamp)
-   
-   return event_list
+   loops = 0
+   if notesPerLoop is not None:
+      loops = np.arange(len(timestampsSeconds)) // notesPerLoop
+
+   return makeEventTable(timestampsSeconds, instrumentationList, velocity, loops)
 
-def multiprocessEventHandler(event_lists, loop_times_lists, samples_dict, sequenceIndex = 1):
+def multiprocessEventHandler(event_lists, loop_times_lists, samples_dict, sequenceIndex = 1, mixer = None, mixer_start = None, lookahead = 0.05, recorder = None, transport = None, voice_limits = VOICE_LIMITS):
     
     """
     Takes a list of event_lists (arg1) and loop_times (arg2) as input and plays back the one indicated by sequenceIndex (arg4, starts at 1)
     with event_list keys 'timestamp' and 'instrument'. Suited for Multiprocessing application.
+    An event list is either an event table or a Pattern (see audio_engine/events.py), whose loops are generated lazily while playing;
+    a Pattern with loop_times None plays endlessly.
     Samples_dict provides simpleaudio-based WaveObjects (indeced from 0 to number of instruments).
+    With a mixer (arg5), events are instead submitted to it lookahead (arg7) seconds early, timed on the mixer clock
+    from mixer_start (arg6) on, so that they start sample-accurately (see mixerSequencePlayback()).
+    With a recorder (arg8, a LatencyRecorder), the timing of every event is recorded instead of printed.
+    Without a mixer, events are timed on the shared start of a Transport (arg9, see audio_engine/transport.py),
+    or on an own one starting right away, and played within the polyphony limits of voice_limits (arg10).
+    The drift of the events (and, without a mixer, the voice counts) are reported at the end.
 
     """
 
@@ -258,35 +323,133 @@ def multiprocessEventHandler(event_lists, loop_times_lists, samples_dict, sequen
        raise ValueError("event_lists and loop_times_lists must have the same length.")
     
 
-    event_list = event_lists[sequenceIndex]
-    num_loops = loop_times_lists[sequenceIndex]
-    length_loop = len(event_list)/num_loops
-    start_time = time.time()
+    sequence = event_lists[sequenceIndex]
+
+    if isinstance(sequence, Pattern):
+        length_loop = len(sequence)
+        num_events = sequence.numEvents()
+        event_list = sequence.iterEvents()
+    else:
+        num_loops = loop_times_lists[sequenceIndex]
+        length_loop = len(sequence)/num_loops
+        num_events = len(sequence)
+        event_list = sequence
+
+    if mixer is not None:
+        clock = mixer.time
+        start_time = mixer.time() if mixer_start is None else mixer_start
+    else:
+        if transport is None:
+            transport = Transport(lead_in = 0)
+        clock = time.perf_counter
+        lookahead = 0
+        pool = VoicePool(**voice_limits)
+        # A transport shared between processes only starts once every process has got here
+        transport.ready()
+        start_time = transport.start_time
+
+    last_drift = 0
+    max_drift = 0
 
     for n, event in enumerate(event_list):
 
       current_event = int((n%length_loop)+1)
-      elapsed_time = time.time() - start_time
+      elapsed_time = clock() - start_time
+
+      if elapsed_time < event['timestamp'] - lookahead:
+          if mixer is not None:
+              time.sleep(event['timestamp'] - elapsed_time - lookahead)
+          else:
+              transport.waitUntil(event['timestamp'])
+          elapsed_time = clock() - start_time
+
+      # A mixer event submitted in time starts exactly at its timestamp
+      last_drift = max(elapsed_time, event['timestamp']) - event['timestamp'] if mixer is not None else elapsed_time - event['timestamp']
+      max_drift = max(max_drift, abs(last_drift))
+
+      if recorder is not None:
+          recorder.record(sequenceIndex, event['timestamp'], event['timestamp'] + last_drift)
+      else:
+          print(f"Sequence {sequenceIndex+1}    Playing Event: {current_event:03}.      Instrument: {event['instrument']:02}.      Elapsed time: {elapsed_time:.3f}")
+
+      if mixer is not None:
+          mixer.submit(event['instrument'], start_time + event['timestamp'])
+          continue
+
+      playVoice(pool, samples_dict, event['instrument'], event['timestamp'])
+
+      if n+1 == num_events:
+          waitVoices(pool)
+
+    print(f"\nSequence {sequenceIndex+1}:   Playback finished.   Drift at last event: {last_drift*1000:.3f} ms (max {max_drift*1000:.3f} ms).\n")
+    if mixer is None:
+        pool.printSummary()
+
+def sharedMemoryEventHandler(shared_event_lists, loop_times_lists, shared_samples, sequenceIndex = 1, **kwargs):
+
+    """
+    Runs multiprocessEventHandler() on event lists and samples placed in shared memory by multiprocessingSequencePlayback().
+    Attaches to them by name, without copying; keyword arguments are passed on.
+
+    """
+
+    blocks, event_lists = attachEventLists(shared_event_lists)
+    samples_dict = attachSamples(shared_samples)
+
+    multiprocessEventHandler(event_lists, loop_times_lists, samples_dict, sequenceIndex, **kwargs)
+
+def inputSavedSession(midi_index, samples_dict):
+
+  """
+  Lists the sessions saved in the MIDI_sequences directory (arg1, a MidiIndex) and asks the user to pick one to replay.
+  Returns its event lists and loop-times, or None if the user wants to create new sequences.
+
+  """
+
+  midi_index.refresh()
+  sessions = midi_index.sessions()
+  if len(sessions) == 0:
+     return None
+
+  print("\nSaved sessions:")
+  for i, (session, files) in enumerate(sessions.items()):
+     tracks = sum(midi_index.entries[name]['tracks'] for name in files)
+     duration = max(midi_index.entries[name]['duration'] for name in files)
+     print(f"{i+1:>4}.   {session}   ({tracks} tracks, {duration:.2f} seconds)")
+
+  while True:
+
+    session_input = input(f"\nEnter the number of a session to replay it, or press Enter to create new sequences:   \n")
+    if session_input == "":
+       return None
 
-      if elapsed_time < event['timestamp']:
-          time.sleep(event['timestamp'] - elapsed_time)
-          elapsed_time = time.time() - start_time
+    if errorFunction(session_input, checkPositive=True, checkInt=True) == "Error":
+       continue
 
-      print(f"Sequence {sequenceIndex+1}    Playing Event: {current_event:03}.      Instrument: {event['instrument']:02}.      Elapsed time: {elapsed_time:.3f}")
-      play_obj = samples_dict[event['instrument']].play()
+    if int(session_input) > len(sessions):
+       print(f"ERROR: Maximum Input Number is {len(sessions)}.")
+       continue
 
-      if n+1 == len(event_list):
-          play_obj.wait_done()
+    break
 
-    print(f"\nSequence {sequenceIndex+1}:   Playback finished.\n")
+  event_lists = midi_index.loadSession(list(sessions)[int(session_input) - 1])
+
+  # Notes of pitches without a sample can't be played
+  known = [table[np.isin(table['instrument'], list(samples_dict))] for table in event_lists]
+  skipped = sum(len(table) for table in event_lists) - sum(len(table) for table in known)
+  if skipped > 0:
+     print(f"\nSkipped {skipped} notes without a matching instrument.")
+
+  event_lists = [table for table in known if len(table) > 0]
+  return event_lists, [1] * len(event_lists)
 
 def createSequences():
 
   """
   Calls several input functions, that prompt user to design rhythmical sequences.
-  Processes noteDurations into timestamps based on bpm.
-  Creates event lists with keys for 'timestamp' and 'instrument'.
-  Returns list of event-lists and loop-times.
+  Stores every sequence as a Pattern (see audio_engine/events.py): one cycle of notes in integer ticks, plus loop times and bpm.
+  The loops are not replicated; their events (keys 'timestamp', 'instrument', 'velocity' and 'loop') are generated when needed.
+  Returns list of patterns and loop-times.
 
   """
 
@@ -302,34 +465,42 @@ def createSequences():
     instrumentationList = inputInstrumentation(noteDurations, SAMPLES_DICT)
 
     loopTimes = inputLooptimes(default_times = 4)
-    noteDurations *= loopTimes
-    instrumentationList *= loopTimes
-
     bpm = inputBpm(default_bpm=60)
 
-    timestamps16th = durationsToSixteenthTimestamps(noteDurations)
-    timestampsSeconds = sixteenthTimestampsToSecondTimestamps(timestamps16th, bpm)
-
-    eventList = makeEventList(timestampsSeconds, instrumentationList)
-    sequencesEventLists.append(eventList)
+    pattern = Pattern(noteDurations, instrumentationList, loopTimes, bpm)
+    sequencesEventLists.append(pattern)
     sequencesLoopTimes.append(loopTimes)
 
     print(f"\nFinished creating {sequence+1}. of {numSequences} Sequences.\n")
   
   return sequencesEventLists, sequencesLoopTimes
 
-def multiprocessingSequencePlayback(sequencesEventLists, sequencesLoopTimes, samples_dict):
+def multiprocessingSequencePlayback(sequencesEventLists, sequencesLoopTimes, samples_dict, recorder = None, lead_in = 0.5, spin_window = 0.002):
 
   """
   Initializes multiprocessEventHandler() processes based on the number of input sequences.
+  All processes share one Transport, starting lead_in (arg5) seconds after all of them are ready to play, so that the sequences
+  stay phase-locked and no events are lost to slow process startup (see audio_engine/transport.py).
+
+  Events and sample PCM are placed in shared memory once; each process only receives their names and attaches without copying.
+  Patterns only hold one cycle and are passed as they are.
   
   """
 
   numSequences = len(sequencesLoopTimes)
   processes = []
 
+  shared_buffers = SharedBuffers()
+  shared_event_lists = [event_list if isinstance(event_list, Pattern) else shared_buffers.shareEventList(event_list) for event_list in sequencesEventLists]
+  shared_samples = shared_buffers.shareSamples(samples_dict)
+
+  transport = Transport(lead_in, spin_window, parties = numSequences)
+  # Every process has its own voice pool: together, they stay within the overall limit
+  voice_limits = splitVoiceLimits(VOICE_LIMITS, numSequences)
+
   for process_num in range(numSequences):
-      process = multiprocessing.Process(target=multiprocessEventHandler, args=(sequencesEventLists, sequencesLoopTimes, samples_dict, process_num))
+      process = multiprocessing.Process(target=sharedMemoryEventHandler, args=(shared_event_lists, sequencesLoopTimes, shared_samples, process_num),
+                                        kwargs={'recorder': recorder, 'transport': transport, 'voice_limits': voice_limits})
       processes.append(process)
 
   print(f"\nMultiprocessing Playback started.\n")
@@ -337,13 +508,136 @@ def multiprocessingSequencePlayback(sequencesEventLists, sequencesLoopTimes, sam
   for process in processes:
       process.start()
 
+  transport.start()
+
   for process in processes:
       process.join()
 
+  shared_buffers.release()
+
+def mixerSequencePlayback(sequencesEventLists, sequencesLoopTimes, samples_dict, recorder = None):
+
+  """
+  Plays back all sequences through one Mixer, owning a single output stream, instead of one process per sequence.
+  Each sequence runs multiprocessEventHandler() in a thread, which only submits its events to the mixer.
+
+  """
+
+  mixer = Mixer(samples_dict, **VOICE_LIMITS)
+  mixer.start()
+
+  # Common start on the mixer clock, shortly ahead so that every sequence can submit its first events in time
+  start_time = mixer.time() + 0.1
+  threads = []
+
+  for sequence_num in range(len(sequencesLoopTimes)):
+      thread = threading.Thread(target=multiprocessEventHandler, args=(sequencesEventLists, sequencesLoopTimes, samples_dict, sequence_num),
+                                kwargs={'mixer': mixer, 'mixer_start': start_time, 'recorder': recorder})
+      threads.append(thread)
+
+  print(f"\nMixer Playback started.\n")
+
+  for thread in threads:
+      thread.start()
+
+  for thread in threads:
+      thread.join()
+
+  mixer.waitDone()
+  mixer.close()
+  mixer.pool.printSummary()
+
+def schedulerSequencePlayback(sequencesEventLists, sequencesLoopTimes, samples_dict, recorder = None, use_mixer = MIXER_AVAILABLE, lead_in = 0.1, spin_window = 0.002):
+
+  """
+  Plays back any number of sequences from one thread: their event streams are merged lazily with a heap
+  (see audio_engine/scheduler.py), and every due time is waited for only once, on a Transport starting lead_in (arg6) seconds from now.
+  Events are submitted to a Mixer if use_mixer (arg5), else played with their sample's play().
+  Either way, polyphony is bounded by VOICE_LIMITS.
+
+  """
+
+  streams = [sequence.iterEvents() if isinstance(sequence, Pattern) else sequence for sequence in sequencesEventLists]
+  transport = Transport(lead_in, spin_window)
+
+  if use_mixer:
+     mixer = Mixer(samples_dict, **VOICE_LIMITS)
+     pool = mixer.pool
+     mixer.start()
+     # The transport starts at this point of the mixer clock
+     mixer_start = mixer.time() + (transport.start_time - time.perf_counter())
+     dispatch = lambda index, event: mixer.submit(event['instrument'], mixer_start + event['timestamp'])
+     lookahead = 0.05
+  else:
+     pool = VoicePool(**VOICE_LIMITS)
+     dispatch = lambda index, event: playVoice(pool, samples_dict, event['instrument'], event['timestamp'])
+     lookahead = 0
+
+  print(f"\nScheduler Playback of {len(streams)} sequences started.\n")
+
+  last_drift, max_drift = scheduleEvents(streams, dispatch, transport, lookahead, recorder)
+
+  if use_mixer:
+     mixer.waitDone()
+     mixer.close()
+  else:
+     waitVoices(pool)
+
+  print(f"\nPlayback finished.   Drift at last event: {last_drift*1000:.3f} ms (max {max_drift*1000:.3f} ms).\n")
+  pool.printSummary()
+
+def loopSequencePlayback(sequencesEventLists, loop_cache, gain = 0.5):
+
+  """
+  Plays back finite Patterns (arg1) as pre-rendered loop buffers of the loop cache (arg2, see audio_engine/loop_buffers.py):
+  all loops of all sequences are mixed into one buffer, played with a single play_buffer() call, so that no loop boundary can gap or drift.
+  The buffer is rendered completely before playback, so check loop_cache.fits() first; longer sessions go to schedulerSequencePlayback().
+  Patterns played before (also with other loop times) are taken from the cache; edited ones only re-render their changed notes.
+
+  """
+
+  play_object = loop_cache.play(sequencesEventLists, gain)
+
+  print(f"\nLoop Playback of {len(sequencesEventLists)} sequences started "
+        f"({loop_cache.length(sequencesEventLists) / loop_cache.sample_rate:.2f} seconds).\n")
+
+  play_object.wait_done()
+
+def renderSequences(sequencesEventLists, samples_dict, filepath, processes = None, verbose = True):
+
+   """
+   Renders all sequences (arg1) offline into one WAV file (arg3), many times faster than realtime and without an audio device.
+   Patterns are expanded first, so they have to be finite. Processes (arg4) is passed on to renderEvents().
+
+   """
+
+   merged = mergeEventTables([toEventTable(sequence) for sequence in sequencesEventLists])
+   events = list(zip(merged['timestamp'].tolist(), merged['instrument'].tolist()))
+   length = renderEvents(events, samples_dict, filepath, processes=processes)
+   if verbose:
+      print(f"\nRendered {len(events)} events ({length:.2f} seconds) to {filepath}\n")
+
+def WAV_Writer(sequencesEventLists):
+
+   """
+   Asks the user whether to render the sequences into a WAV file, and saves it in the WAV_renders directory.
+
+   """
+
+   prompt = input("\nDo you want to render these sequences as a WAV file? [Y / N]\n")
+
+   if prompt in "Yy":
+      current_time = datetime.datetime.now()
+      filetag = current_time.strftime("%Y-%m-%d %H:%M:%S")
+      wav_directory = pathlib.Path(f"{DIR_PATH}/WAV_renders/")
+      wav_directory.mkdir(exist_ok=True)
+
+      renderSequences(sequencesEventLists, SAMPLES_DICT, wav_directory / f"sequence_{filetag}.wav")
+
 def MIDI_Writer(sequencesEventLists):
 
    """
-   Creates MIDI Files out of a list of sequences. Saves them as individual tracks / files.
+   Creates a MIDI File out of a list of sequences, one track per sequence (see midi_files.py).
    Returns True / False message, conditioning the continuation of the loop of further sequence creation.
    
    """
@@ -365,21 +659,9 @@ def MIDI_Writer(sequencesEventLists):
       filetag = current_time.strftime("%Y-%m-%d %H:%M:%S")
       midi_directory = f"{DIR_PATH}/MIDI_sequences/"
 
-      for i, sequence in enumerate(sequencesEventLists):
-
-         midiFile = MIDIFile(1)
-         midiFile.add_tempo(track = 0, tempo = 60, time = 0)
-         midi_filepath = midi_directory + f"sequence_{filetag}_track{i}.mid"
-         
-         for event in sequence:
-            time = event['timestamp']
-            note = event['instrument'] + 52
-            midiFile.add_note(track = 0, channel = 9, pitch = note, time = time, duration = 0.5, volume = 70)
-         
-         with open(midi_filepath, "wb") as output_file:
-            midiFile.write_file(output_file)
+      writeMidiFile(sequencesEventLists, f"{midi_directory}sequence_{filetag}_master.mid")
 
-      print(f"\nSaved {len(sequencesEventLists)} MIDI Files successfully!\nDirectory: {midi_directory}")
+      print(f"\nSaved MIDI File with {len(sequencesEventLists)} tracks successfully!\nDirectory: {midi_directory}")
 
       prompt = input("\nDo you want to create more sequences? [Y / N]\n")
       if prompt in "Nn":
@@ -391,9 +673,37 @@ def MIDI_Writer(sequencesEventLists):
 
 if __name__ == "__main__":
   
+   loop_cache = None
+
    while True: 
-      sequencesEventLists, sequencesLoopTimes = createSequences()
-      multiprocessingSequencePlayback(sequencesEventLists, sequencesLoopTimes, SAMPLES_DICT)
+      saved_session = inputSavedSession(MidiIndex(), SAMPLES_DICT)
+      if saved_session is not None:
+         sequencesEventLists, sequencesLoopTimes = saved_session
+      else:
+         sequencesEventLists, sequencesLoopTimes = createSequences()
+
+      recorder = None
+      if TELEMETRY or TELEMETRY_PORT is not None:
+         recorder = LatencyRecorder([f"Sequence {i+1}" for i in range(len(sequencesEventLists))], capacity=int(max(min(numEvents(sequence), 100000) for sequence in sequencesEventLists)))
+
+      # Pre-rendered loops only for finite Patterns whose whole buffer stays within LOOP_BUFFER_MAX_SECONDS
+      if recorder is None and all(isinstance(sequence, Pattern) for sequence in sequencesEventLists):
+         if loop_cache is None:
+            loop_cache = LoopCache(SAMPLES_DICT)
+         use_loop_buffer = loop_cache.fits(sequencesEventLists)
+      else:
+         use_loop_buffer = False
+
+      if use_loop_buffer:
+         loopSequencePlayback(sequencesEventLists, loop_cache)
+      else:
+         with recorder.serving(TELEMETRY_PORT) if recorder is not None else contextlib.nullcontext():
+            schedulerSequencePlayback(sequencesEventLists, sequencesLoopTimes, SAMPLES_DICT, recorder)
+
+      if recorder is not None:
+         recorder.printSummary()
+
+      WAV_Writer(sequencesEventLists)
       continue_feedback = MIDI_Writer(sequencesEventLists)
       
       if continue_feedback:
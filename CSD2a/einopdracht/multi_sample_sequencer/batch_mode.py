@@ -0,0 +1,211 @@
+import numpy as np
+import argparse
+import json
+import multiprocessing
+import pathlib
+import time
+from MultiSampleSequencer import SAMPLES_DICT, NUMBER_ERRORS, numberErrors, renderSequences
+from midi_files import writeMidiFile
+from audio_engine.events import Pattern
+
+
+DIR_PATH = pathlib.Path(__file__).parent.resolve()
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Non-interactive batch mode of the multi-sample sequencer.
+
+Instead of typing every sequence into the prompts of createSequences(), sessions are read from a JSON file and rendered
+to WAV and / or exported to MIDI in bulk, on a process pool. A JSON file holds a list of sessions; a session is a list
+of sequences (played simultaneously), or a dict with a "name" and its "sequences":
+
+    [
+        {"name": "groove", "sequences": [
+            {"durations": [0.25, 0.25, 0.5], "instrumentation": [1, 2, 3], "loop_times": 8, "bpm": 120},
+            {"durations": [1], "instrumentation": [3]}
+        ]},
+        [{"durations": [0.5, 0.5], "instrumentation": [2, 1], "bpm": 90}]
+    ]
+
+loop_times and bpm are optional (defaults: 4 loops, 60 BPM). All specs are validated at once before anything is rendered,
+following the same rules as errorFunction(); sessions with invalid specs are reported and skipped.
+
+Usage: python batch_mode.py specs.json [--no-wav] [--no-midi] [--output DIRECTORY] [--processes N]
+
+
+"""
+
+
+
+def loadSessions(filepath):
+
+    """
+    Reads a JSON file of sessions. Returns a list of (name, sequence specs) tuples.
+
+    """
+
+    with open(filepath) as json_file:
+        sessions = json.load(json_file)
+
+    if type(sessions) != list:
+        raise ValueError("A batch file has to contain a list of sessions.")
+
+    loaded = []
+    for i, session in enumerate(sessions):
+        if type(session) == dict:
+            loaded.append((str(session.get("name", f"session_{i:05}")), session.get("sequences", [])))
+        else:
+            loaded.append((f"session_{i:05}", session))
+
+    return loaded
+
+def validateSessions(sessions, num_instruments):
+
+    """
+    Validates the sequence specs of all sessions (arg1) at once. Instrument numbers run from 1 to num_instruments (arg2).
+    Returns a list with the error messages of each session (empty if it is valid).
+
+    """
+
+    errors = [[] for _ in sessions]
+    specs = []
+    owners = []
+
+    for i, (name, sequences) in enumerate(sessions):
+        if type(sequences) != list or len(sequences) == 0:
+            errors[i].append("A session needs a list of at least one sequence.")
+            continue
+
+        for j, spec in enumerate(sequences):
+            if type(spec) != dict or type(spec.get("durations")) != list or type(spec.get("instrumentation")) != list:
+                errors[i].append(f"Sequence {j+1}: needs lists of 'durations' and 'instrumentation'.")
+                continue
+            if len(spec["durations"]) == 0 or len(spec["durations"]) != len(spec["instrumentation"]):
+                errors[i].append(f"Sequence {j+1}: 'durations' and 'instrumentation' must have the same, non-zero length.")
+                continue
+            specs.append(spec)
+            owners.append((i, j))
+
+    if len(specs) == 0:
+        return errors
+
+    # Every field of every spec is checked in one vectorized pass; each value remembers the spec it belongs to
+    lengths = [len(spec["durations"]) for spec in specs]
+    note_owner = np.repeat(np.arange(len(specs)), lengths)
+    durations = [duration for spec in specs for duration in spec["durations"]]
+    instruments = [instrument for spec in specs for instrument in spec["instrumentation"]]
+    loop_times = [spec.get("loop_times", 4) for spec in specs]
+    bpms = [spec.get("bpm", 60) for spec in specs]
+
+    instrument_codes = numberErrors(instruments, checkPositive=True, checkInt=True)
+    valid_instruments = instrument_codes == 0
+    too_high = np.zeros(len(instruments), dtype=bool)
+    too_high[valid_instruments] = np.asarray(instruments, dtype=object)[valid_instruments].astype(np.float64) > num_instruments
+
+    checks = [
+        ("durations", note_owner, numberErrors(durations, checkPositive=True)),
+        ("instrumentation", note_owner, instrument_codes),
+        ("loop_times", np.arange(len(specs)), numberErrors(loop_times, checkPositive=True, checkInt=True)),
+        ("bpm", np.arange(len(specs)), numberErrors(bpms, checkPositive=True))
+    ]
+
+    for field, owner, codes in checks:
+        # First failing value of each spec
+        failing = np.flatnonzero(codes)
+        spec_indexes, first = np.unique(owner[failing], return_index=True)
+        for spec_index, position in zip(spec_indexes, failing[first]):
+            i, j = owners[spec_index]
+            errors[i].append(f"Sequence {j+1}, {field}: {NUMBER_ERRORS[codes[position]]}")
+
+    for spec_index in np.unique(note_owner[too_high]):
+        i, j = owners[spec_index]
+        errors[i].append(f"Sequence {j+1}, instrumentation: Maximum Input Number is {num_instruments}.")
+
+    return errors
+
+def specsToPatterns(sequences):
+
+    """
+    Creates the Patterns (see audio_engine/events.py) of a validated list of sequence specs.
+
+    """
+
+    return [Pattern([float(duration) for duration in spec["durations"]], [int(float(instrument)) for instrument in spec["instrumentation"]],
+                    int(float(spec.get("loop_times", 4))), float(spec.get("bpm", 60)))
+            for spec in sequences]
+
+def exportSession(task):
+
+    """
+    Pool worker: renders and / or exports one session. The samples are loaded from the sample bank's cache once per worker.
+
+    """
+
+    name, sequences, output_directory, render, midi = task
+    patterns = specsToPatterns(sequences)
+
+    if render:
+        renderSequences(patterns, SAMPLES_DICT, pathlib.Path(output_directory) / f"{name}.wav", processes=1, verbose=False)
+    if midi:
+        writeMidiFile(patterns, pathlib.Path(output_directory) / f"{name}.mid")
+
+    return name, len(patterns)
+
+def batchMode(specs_path, output_directory = DIR_PATH / "batch_exports", render = True, midi = True, processes = None):
+
+    """
+    Validates all sessions of a JSON file (arg1) and exports the valid ones to output_directory (arg2),
+    as WAV (arg3) and / or MIDI files (arg4), spread across a process pool (default: all cores).
+    Returns the names of the exported sessions and the errors of the skipped ones.
+
+    """
+
+    sessions = loadSessions(specs_path)
+    errors = validateSessions(sessions, len(SAMPLES_DICT))
+
+    skipped = {sessions[i][0]: session_errors for i, session_errors in enumerate(errors) if session_errors}
+    for name, session_errors in skipped.items():
+        print(f"Skipping {name}:\n    " + "\n    ".join(session_errors))
+
+    output_directory = pathlib.Path(output_directory)
+    output_directory.mkdir(parents=True, exist_ok=True)
+
+    # Decode and cache the samples once, before the workers memory-map them
+    if render:
+        for key in SAMPLES_DICT:
+            SAMPLES_DICT[key]
+
+    tasks = [(name, sequences, output_directory, render, midi) for (name, sequences), session_errors in zip(sessions, errors) if not session_errors]
+    exported = []
+    num_sequences = 0
+    start_time = time.perf_counter()
+
+    with multiprocessing.Pool(processes) as pool:
+        for name, count in pool.imap_unordered(exportSession, tasks, chunksize=8):
+            exported.append(name)
+            num_sequences += count
+
+    elapsed_time = time.perf_counter() - start_time
+    rate = num_sequences / elapsed_time * 60 if elapsed_time > 0 else 0
+    print(f"\nExported {len(exported)} sessions ({num_sequences} sequences) in {elapsed_time:.2f} seconds ({rate:.0f} sequences per minute), "
+          f"skipped {len(skipped)}.\nDirectory: {output_directory}\n")
+
+    return exported, skipped
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Renders / exports the sequence sessions of a JSON file, without prompts.")
+    parser.add_argument("specs", help="JSON file with a list of sessions")
+    parser.add_argument("--output", default=DIR_PATH / "batch_exports", help="output directory")
+    parser.add_argument("--no-wav", action="store_true", help="don't render WAV files")
+    parser.add_argument("--no-midi", action="store_true", help="don't export MIDI files")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes (default: all cores)")
+    arguments = parser.parse_args()
+
+    batchMode(arguments.specs, arguments.output, render = not arguments.no_wav, midi = not arguments.no_midi, processes = arguments.processes)
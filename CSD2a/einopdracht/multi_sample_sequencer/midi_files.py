@@ -0,0 +1,489 @@
+import numpy as np
+import hashlib
+import json
+import multiprocessing
+import os
+import pathlib
+import re
+import struct
+import sys
+sys.path.append(str(pathlib.Path(__file__).parent.parent.resolve()))
+from audio_engine.events import Pattern, TICKS_PER_QUARTER, EVENT_DTYPE, makeEventTable
+
+
+DIR_PATH = pathlib.Path(__file__).parent.resolve()
+PPQ = TICKS_PER_QUARTER     # Ticks per quarter note, the same as a Pattern's ticks
+NOTE_OFFSET = 52            # MIDI pitch = instrument number + NOTE_OFFSET
+DRUM_CHANNEL = 9
+NOTE_TICKS = PPQ // 2       # Notes last an eighth, or until the next note of their track
+CHUNK_NOTES = 65536         # Notes encoded at once while streaming a track
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Standard MIDI File (type 1) export of sequencer sessions.
+
+All sequences of a session are written as the tracks of one file, after a tempo track, in a single pass: each track is
+streamed in chunks of whole loops (Patterns are never expanded at once), the events of a chunk are encoded in bulk with numpy,
+and the track's length is filled in afterwards. Nothing depends on the time of writing, so the same session always gives
+the same bytes.
+
+Times are integer ticks (PPQ per quarter note) at the file's tempo, which is the BPM of the first sequence. Sequences
+with another BPM are converted to that tempo (rounded to the nearest tick), so they keep their real timing.
+
+exportMidiFiles() writes many sessions concurrently, on a process pool.
+
+readMidiFile() parses a MIDI file (type 0 or 1, any tempo map) back into event tables, one per track, mapping the pitches
+back to instrument numbers. A MidiIndex keeps track of the files in MIDI_sequences/: their size and modification time,
+plus the parsed event tables cached as .npz files, so that only new or changed files are ever parsed again.
+
+
+"""
+
+
+
+def varLen(values):
+
+    """
+    Encodes an array of integers (arg1, below 2**28) as MIDI variable-length quantities.
+    Returns an (n, 4) array of bytes and a mask of the bytes that are used (the leading ones are not).
+
+    """
+
+    values = np.asarray(values, dtype=np.int64)
+    if np.any(values < 0) or np.any(values >= 2**28):
+        raise ValueError("MIDI delta times have to be between 0 and 2**28")
+
+    groups = ((values[:, None] >> np.array([21, 14, 7, 0])) & 0x7F).astype(np.uint8)
+    groups[:, :3] |= 0x80
+    lengths = 1 + (values >= 2**7) + (values >= 2**14) + (values >= 2**21)
+
+    return groups, np.arange(4) >= (4 - lengths[:, None])
+
+def encodeEvents(deltas, statuses, data1, data2):
+
+    """
+    Encodes channel events, each a delta time (arg1) followed by a status byte (arg2) and two data bytes, into track data.
+
+    """
+
+    groups, mask = varLen(deltas)
+
+    rows = np.zeros((len(groups), 7), dtype=np.uint8)
+    rows[:, :4] = groups
+    rows[:, 4] = statuses
+    rows[:, 5] = data1
+    rows[:, 6] = data2
+
+    used = np.ones(rows.shape, dtype=bool)
+    used[:, :4] = mask
+
+    return rows[used].tobytes()
+
+def metaEvent(meta_type, data):
+
+    """
+    Encodes a meta event at delta time 0.
+
+    """
+
+    groups, mask = varLen([len(data)])
+    return bytes([0, 0xFF, meta_type]) + groups[mask].tobytes() + data
+
+def onsetChunks(sequence, bpm):
+
+    """
+    Yields the onsets of a sequence as (ticks, instruments, velocities) arrays at the file's bpm (arg2):
+    chunks of whole loops (about CHUNK_NOTES notes) for a Pattern, one chunk for an event table.
+
+    """
+
+    if isinstance(sequence, Pattern):
+        if sequence.loop_times is None:
+            raise ValueError("An endless pattern can't be exported to MIDI.")
+
+        scale = bpm / sequence.bpm
+        loops_per_chunk = max(1, CHUNK_NOTES // max(len(sequence), 1))
+
+        for first_loop in range(0, sequence.loop_times, loops_per_chunk):
+            loops = np.arange(first_loop, min(first_loop + loops_per_chunk, sequence.loop_times))
+            ticks = (loops[:, None] * sequence.cycle_ticks + sequence.offsets).ravel()
+            if scale != 1:
+                ticks = np.rint(ticks * scale).astype(np.int64)
+            yield ticks, np.tile(sequence.instruments, len(loops)), np.tile(sequence.velocities, len(loops))
+
+    else:
+        ticks = np.rint(np.asarray(sequence['timestamp']) * (bpm / 60) * PPQ).astype(np.int64)
+        yield ticks, sequence['instrument'], sequence['velocity']
+
+def chunkEvents(ticks, instruments, velocities, next_onset, previous_tick):
+
+    """
+    Encodes the note on / off events of one chunk of onsets. Notes are cut at next_onset (arg4, the first onset
+    of the next chunk, or None). Returns the track data and the tick of its last event.
+
+    """
+
+    following = np.append(ticks[1:], ticks[-1] + NOTE_TICKS if next_onset is None else next_onset)
+    offs = ticks + np.clip(following - ticks, 1, NOTE_TICKS)
+
+    all_ticks = np.concatenate([ticks, offs])
+    is_on = np.concatenate([np.ones(len(ticks), dtype=bool), np.zeros(len(ticks), dtype=bool)])
+    pitches = np.tile(np.asarray(instruments, dtype=np.int64) + NOTE_OFFSET, 2)
+    note_velocities = np.concatenate([velocities, np.zeros(len(ticks), dtype=np.uint8)])
+
+    # By tick, note offs before note ons at the same tick
+    order = np.lexsort((is_on, all_ticks))
+    all_ticks = all_ticks[order]
+
+    deltas = np.diff(all_ticks, prepend=previous_tick)
+    statuses = np.where(is_on[order], 0x90 | DRUM_CHANNEL, 0x80 | DRUM_CHANNEL)
+
+    return encodeEvents(deltas, statuses, pitches[order], note_velocities[order]), int(all_ticks[-1])
+
+def writeTrack(midi_file, chunks, name):
+
+    """
+    Streams one track (MTrk chunk) of onset chunks (arg2) into an open, seekable file (arg1),
+    then fills in the track's length.
+
+    """
+
+    midi_file.write(b"MTrk")
+    length_position = midi_file.tell()
+    midi_file.write(b"\0\0\0\0")
+    midi_file.write(metaEvent(0x03, name.encode()))
+
+    previous_tick = 0
+    pending = None
+
+    # Every chunk is written once the next one is known, to cut its last note in time
+    for chunk in chunks:
+        if len(chunk[0]) == 0:
+            continue
+        if pending is not None:
+            data, previous_tick = chunkEvents(*pending, chunk[0][0], previous_tick)
+            midi_file.write(data)
+        pending = chunk
+
+    if pending is not None:
+        data, previous_tick = chunkEvents(*pending, None, previous_tick)
+        midi_file.write(data)
+
+    midi_file.write(metaEvent(0x2F, b""))
+
+    end_position = midi_file.tell()
+    midi_file.seek(length_position)
+    midi_file.write(struct.pack(">I", end_position - length_position - 4))
+    midi_file.seek(end_position)
+
+def writeMidiFile(sequences, filepath, bpm = None):
+
+    """
+    Writes all sequences (arg1, Patterns or event tables) as tracks of one type 1 MIDI file (arg2).
+    The tempo (arg3) defaults to the BPM of the first Pattern, or 60 BPM.
+
+    """
+
+    if bpm is None:
+        bpm = next((sequence.bpm for sequence in sequences if isinstance(sequence, Pattern)), 60)
+
+    with open(filepath, "wb") as midi_file:
+        midi_file.write(b"MThd" + struct.pack(">IHHH", 6, 1, len(sequences) + 1, PPQ))
+
+        # Tempo track
+        midi_file.write(b"MTrk")
+        tempo_track = metaEvent(0x03, b"Tempo") + metaEvent(0x51, int(round(60000000 / bpm)).to_bytes(3, "big")) + metaEvent(0x2F, b"")
+        midi_file.write(struct.pack(">I", len(tempo_track)) + tempo_track)
+
+        for i, sequence in enumerate(sequences):
+            writeTrack(midi_file, onsetChunks(sequence, bpm), f"Sequence {i+1}")
+
+def exportMidiTask(task):
+    writeMidiFile(*task)
+    return task[1]
+
+def exportMidiFiles(sessions, processes = None):
+
+    """
+    Writes many sessions concurrently, on a process pool (default: all cores).
+    Sessions (arg1) are (sequences, filepath) or (sequences, filepath, bpm) tuples. Returns the written filepaths.
+
+    """
+
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(exportMidiTask, sessions)
+
+def readVarLen(data, position):
+
+    """
+    Reads a variable-length quantity from data (arg1) at position (arg2). Returns its value and the position after it.
+    Raises ValueError if the data ends within it.
+
+    """
+
+    value = 0
+    while True:
+        if position >= len(data):
+            raise ValueError("MIDI track ends within a variable-length quantity")
+        byte = data[position]
+        position += 1
+        value = (value << 7) | (byte & 0x7F)
+        if byte < 0x80:
+            return value, position
+
+def parseTrack(data):
+
+    """
+    Parses the data of one MTrk chunk. Returns its note ons as (ticks, pitches, velocities) lists, and its tempo changes
+    as (tick, microseconds per quarter note) tuples. Raises ValueError on truncated or malformed data.
+
+    """
+
+    ticks, pitches, velocities, tempos = [], [], [], []
+    position = 0
+    tick = 0
+    status = 0
+
+    while position < len(data):
+        delta, position = readVarLen(data, position)
+        tick += delta
+
+        if position >= len(data):
+            raise ValueError("MIDI track ends after a delta time")
+
+        # Without a new status byte, the previous one is repeated (running status)
+        if data[position] >= 0x80:
+            status = data[position]
+            position += 1
+        elif status == 0:
+            raise ValueError("MIDI data byte without a status")
+
+        if status == 0xFF:
+            if position >= len(data):
+                raise ValueError("MIDI track ends within a meta event")
+            meta_type = data[position]
+            length, position = readVarLen(data, position + 1)
+            if position + length > len(data):
+                raise ValueError("MIDI track ends within a meta event")
+            if meta_type == 0x51:
+                tempos.append((tick, int.from_bytes(data[position:position + length], "big")))
+            elif meta_type == 0x2F:
+                break
+            position += length
+            # Meta and sysex events cancel running status
+            status = 0
+
+        elif status == 0xF0 or status == 0xF7:
+            length, position = readVarLen(data, position)
+            if position + length > len(data):
+                raise ValueError("MIDI track ends within a sysex event")
+            position += length
+            status = 0
+
+        elif status & 0xF0 == 0xC0 or status & 0xF0 == 0xD0:
+            if position + 1 > len(data):
+                raise ValueError("MIDI track ends within a channel event")
+            position += 1
+
+        else:
+            if position + 2 > len(data):
+                raise ValueError("MIDI track ends within a channel event")
+            # A note on with velocity 0 is a note off
+            if status & 0xF0 == 0x90 and data[position + 1] > 0:
+                ticks.append(tick)
+                pitches.append(data[position])
+                velocities.append(data[position + 1])
+            position += 2
+
+    return (ticks, pitches, velocities), tempos
+
+def ticksToSeconds(ticks, tempos, division):
+
+    """
+    Converts ticks (arg1) to seconds, following a tempo map (arg2: sorted (tick, microseconds per quarter) changes).
+
+    """
+
+    if not tempos or tempos[0][0] > 0:
+        tempos = [(0, 500000)] + list(tempos)
+
+    change_ticks = np.array([tick for tick, _ in tempos], dtype=np.int64)
+    seconds_per_tick = np.array([tempo for _, tempo in tempos], dtype=np.float64) / 1000000 / division
+    change_seconds = np.concatenate([[0], np.cumsum(np.diff(change_ticks) * seconds_per_tick[:-1])])
+
+    segment = np.searchsorted(change_ticks, ticks, side='right') - 1
+    return change_seconds[segment] + (np.asarray(ticks) - change_ticks[segment]) * seconds_per_tick[segment]
+
+def readMidiFile(filepath):
+
+    """
+    Reads a MIDI file into one event table per track with notes (timestamps in seconds, instrument = pitch - NOTE_OFFSET).
+    Returns the event tables and the file's (first) BPM.
+
+    """
+
+    data = pathlib.Path(filepath).read_bytes()
+
+    if data[:4] != b"MThd":
+        raise ValueError(f"{filepath} is not a MIDI file")
+    if len(data) < 14:
+        raise ValueError(f"{filepath} ends within its header")
+
+    header_length, midi_format, num_tracks, division = struct.unpack(">IHHH", data[4:14])
+    if division & 0x8000:
+        raise ValueError("MIDI files with SMPTE timing are not supported")
+
+    position = 8 + header_length
+    tracks = []
+    tempos = []
+
+    while position + 8 <= len(data):
+        chunk_type = data[position:position + 4]
+        chunk_length = struct.unpack(">I", data[position + 4:position + 8])[0]
+        if position + 8 + chunk_length > len(data):
+            raise ValueError(f"{filepath} ends within a chunk")
+        if chunk_type == b"MTrk":
+            notes, track_tempos = parseTrack(data[position + 8:position + 8 + chunk_length])
+            tracks.append(notes)
+            tempos += track_tempos
+        position += 8 + chunk_length
+
+    tempos.sort(key=lambda change: change[0])
+    tables = []
+
+    for ticks, pitches, velocities in tracks:
+        if len(ticks) == 0:
+            continue
+        instruments = np.clip(np.asarray(pitches) - NOTE_OFFSET, 0, 255)
+        tables.append(makeEventTable(ticksToSeconds(ticks, tempos, division), instruments, velocities))
+
+    bpm = 60000000 / tempos[0][1] if tempos else 120
+    return tables, bpm
+
+class MidiIndex:
+
+    """
+    Index of the MIDI files in directory (arg1), with their parsed event tables cached in cache_dir (arg2).
+
+    """
+
+    def __init__(self, directory = DIR_PATH / "MIDI_sequences", cache_dir = DIR_PATH / "midi_index"):
+        self.directory = pathlib.Path(directory)
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.index_path = self.cache_dir / "index.json"
+
+        try:
+            with open(self.index_path) as index_file:
+                self.entries = json.load(index_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+
+    def refresh(self):
+
+        """
+        Parses and caches every new or changed file and forgets deleted ones (and ones that can't be parsed).
+        Returns the index entries, by file name.
+
+        """
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        found = {}
+
+        for path in sorted(self.directory.glob("*.mid")):
+            status = path.stat()
+            entry = self.entries.get(path.name)
+
+            if entry is None or entry['mtime_ns'] != status.st_mtime_ns or entry['size'] != status.st_size \
+               or not (self.cache_dir / entry['cache']).exists():
+                # A truncated or corrupt file is left out, instead of ending the session
+                try:
+                    entry = self.parse(path, status)
+                except (ValueError, IndexError, struct.error) as error:
+                    print(f"Skipping {path.name}: {error}")
+                    continue
+
+            found[path.name] = entry
+
+        # Cached tables of deleted or changed files
+        for name, entry in self.entries.items():
+            if found.get(name, {}).get('cache') != entry['cache']:
+                (self.cache_dir / entry['cache']).unlink(missing_ok=True)
+
+        self.entries = found
+
+        temporary_path = self.index_path.with_name(f"index.{os.getpid()}.tmp")
+        with open(temporary_path, "w") as index_file:
+            json.dump(self.entries, index_file, indent=2, sort_keys=True)
+        os.replace(temporary_path, self.index_path)
+
+        return self.entries
+
+    def parse(self, path, status):
+
+        """
+        Parses a MIDI file and caches its event tables. Returns its index entry.
+
+        """
+
+        tables, bpm = readMidiFile(path)
+        cache_name = f"{hashlib.sha256(f'{path.name}|{status.st_mtime_ns}|{status.st_size}'.encode()).hexdigest()[:16]}.npz"
+        np.savez(self.cache_dir / cache_name, *tables)
+
+        return {
+            'mtime_ns': status.st_mtime_ns,
+            'size': status.st_size,
+            'cache': cache_name,
+            'bpm': bpm,
+            'tracks': len(tables),
+            'events': sum(len(table) for table in tables),
+            'duration': max((float(table['timestamp'][-1]) for table in tables), default=0)
+        }
+
+    def load(self, name):
+
+        """
+        Returns the event tables of the file name (arg1), from the cache.
+
+        """
+
+        entry = self.entries.get(name)
+        if entry is None:
+            raise KeyError(f"{name} is not in the index of {self.directory}")
+
+        with np.load(self.cache_dir / entry['cache']) as cached:
+            return [np.asarray(cached[f"arr_{i}"], dtype=EVENT_DTYPE) for i in range(entry['tracks'])]
+
+    def sessions(self):
+
+        """
+        Groups the indexed files into sessions: one multi-track _master file, or several one-track _track<i> files.
+        Returns a dict of session names and their files (in track order).
+
+        """
+
+        sessions = {}
+        for name in self.entries:
+            match = re.fullmatch(r"(.*)_(master|track(\d+))\.mid", name)
+            session, track = (match.group(1), match.group(3)) if match else (name[:-4], None)
+            sessions.setdefault(session, {'master': [], 'tracks': []})
+            if track is None:
+                sessions[session]['master'].append(name)
+            else:
+                sessions[session]['tracks'].append((int(track), name))
+
+        # Older sessions were saved as one file per track, their _master file may be incomplete
+        return {session: [name for _, name in sorted(parts['tracks'])] if parts['tracks'] else parts['master']
+                for session, parts in sorted(sessions.items())}
+
+    def loadSession(self, session):
+
+        """
+        Returns the event tables of all tracks of a session (arg1, see sessions()).
+
+        """
+
+        return [table for name in self.sessions()[session] for table in self.load(name)]
@@ -0,0 +1,155 @@
+import numpy as np
+import inspect
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Registry of chaotic systems, selectable by name (e.g. DataMain(system = "lorenz")).
+
+Every right-hand side has the signature system(x, y, z, *constants) and only uses arithmetic, abs() and numpy ufuncs,
+so the very same function works on plain floats (single trajectory), on whole numpy arrays (ensembles, see integrators.py)
+and inside a JIT-compiled integration loop (numba, if installed).
+
+Each entry of SYSTEMS holds the function, its default parameters (names as in the function signature) and start values.
+
+Further systems are added by writing such a function and registering it with registerSystem().
+
+
+"""
+
+
+
+def rosslerSystem(x, y, z, a, b, c):
+
+    """
+    Equations of the Rössler Attractor, working on floats as well as on whole arrays of x, y and z values.
+
+    """
+
+    x_dot = -y - z
+    y_dot = x + a * y
+    z_dot = b + z * (x - c)
+    return x_dot, y_dot, z_dot
+
+def lorenzSystem(x, y, z, sigma, rho, beta):
+
+    """
+    Equations of the Lorenz Attractor.
+
+    """
+
+    x_dot = sigma * (y - x)
+    y_dot = x * (rho - z) - y
+    z_dot = x * y - beta * z
+    return x_dot, y_dot, z_dot
+
+def chuaSystem(x, y, z, alpha, beta, m0, m1):
+
+    """
+    Equations of Chua's circuit (dimensionless), with its piecewise-linear diode characteristic.
+
+    """
+
+    diode = m1 * x + 0.5 * (m0 - m1) * (abs(x + 1) - abs(x - 1))
+    x_dot = alpha * (y - x - diode)
+    y_dot = x - y + z
+    z_dot = -beta * y
+    return x_dot, y_dot, z_dot
+
+def thomasSystem(x, y, z, b):
+
+    """
+    Equations of Thomas' cyclically symmetric attractor.
+
+    """
+
+    x_dot = np.sin(y) - b * x
+    y_dot = np.sin(z) - b * y
+    z_dot = np.sin(x) - b * z
+    return x_dot, y_dot, z_dot
+
+def halvorsenSystem(x, y, z, a):
+
+    """
+    Equations of the Halvorsen Attractor.
+
+    """
+
+    x_dot = -a * x - 4 * y - 4 * z - y * y
+    y_dot = -a * y - 4 * z - 4 * x - z * z
+    z_dot = -a * z - 4 * x - 4 * y - x * x
+    return x_dot, y_dot, z_dot
+
+SYSTEMS = {
+    "rossler": {'function': rosslerSystem, 'parameters': {'a': 0.3, 'b': 0.21, 'c': 5}, 'start_values': [0.1, 0.1, 0.1]},
+    "lorenz": {'function': lorenzSystem, 'parameters': {'sigma': 10, 'rho': 28, 'beta': 8/3}, 'start_values': [1.0, 1.0, 1.0]},
+    "chua": {'function': chuaSystem, 'parameters': {'alpha': 15.6, 'beta': 28, 'm0': -1.143, 'm1': -0.714}, 'start_values': [0.7, 0.0, 0.0]},
+    "thomas": {'function': thomasSystem, 'parameters': {'b': 0.208186}, 'start_values': [0.1, 0.0, 0.0]},
+    "halvorsen": {'function': halvorsenSystem, 'parameters': {'a': 1.89}, 'start_values': [-1.48, -1.51, 2.04]}
+}
+
+def registerSystem(name, function, parameters, start_values = [0.1, 0.1, 0.1]):
+
+    """
+    Adds a system (arg2, function(x, y, z, *constants)) to SYSTEMS under name (arg1), with its default parameters (arg3) and start values (arg4).
+
+    """
+
+    missing = set(parameterNames(function)) - set(parameters)
+    if missing:
+        raise ValueError(f"Default parameters of '{name}' are missing {sorted(missing)}.")
+
+    SYSTEMS[name] = {'function': function, 'parameters': dict(parameters), 'start_values': list(start_values)}
+
+def parameterNames(function):
+
+    """
+    Names of the constants of a right-hand-side function: every argument after x, y and z.
+
+    """
+
+    return list(inspect.signature(function).parameters)[3:]
+
+def systemName(system):
+
+    """
+    Registered name of a system (arg1: name or function). Unregistered functions are named after themselves.
+
+    """
+
+    if isinstance(system, str):
+        if system not in SYSTEMS:
+            raise ValueError(f"Unknown system '{system}'. Choose from {list(SYSTEMS)}.")
+        return system
+
+    for name, entry in SYSTEMS.items():
+        if entry['function'] is system:
+            return name
+    return f"{system.__module__}.{system.__qualname__}"
+
+def resolveSystem(system, parameters = None):
+
+    """
+    Returns the right-hand-side function of a system (arg1: name or function) and its constants as a tuple,
+    in the order of the function signature. Parameters (arg2) missing from the dict fall back to the system's defaults.
+
+    """
+
+    function = SYSTEMS[system]['function'] if isinstance(system, str) else system
+    name = systemName(system)
+    defaults = SYSTEMS[name]['parameters'] if name in SYSTEMS else {}
+    parameters = {**defaults, **(parameters or {})}
+
+    names = parameterNames(function)
+    missing = [key for key in names if key not in parameters]
+    if missing:
+        raise ValueError(f"Missing parameters {missing} of system '{name}'.")
+
+    return function, tuple(parameters[key] for key in names)
+
+def defaultStartValues(system):
+    name = systemName(system)
+    return list(SYSTEMS[name]['start_values']) if name in SYSTEMS else [0.1, 0.1, 0.1]
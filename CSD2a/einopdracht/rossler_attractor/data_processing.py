@@ -0,0 +1,137 @@
+import numpy as np
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Data processing steps of the sonification that need neither audio nor a GUI: normalization of the axes
+and the vectorized, sparse conditioning methods.
+
+Kept apart from rossler_attractor.py (which imports them from here), so that worker processes, e.g. of parameter_sweep.py,
+can use them without loading matplotlib's GUI backend and the audio samples.
+
+
+"""
+
+
+
+def normalizeData(xx, yy, zz):
+    
+    """
+    Normalizes each axis according to its (!) individual (!) min and max value.
+    
+    """
+
+    data = [xx, yy, zz]
+    normalized_data = []
+
+    # Normalize and scale each axis
+    for axis in data:
+        min_val = min(axis)
+        max_val = max(axis)
+
+        if max_val != min_val:  # Check if max and min are not equal to avoid division by zero
+            scaled_axis = [((x - min_val) / (max_val - min_val)) for x in axis]
+        else:
+            scaled_axis = [0] * len(axis)  # If max and min are equal, set all values to 0
+        normalized_data.append(scaled_axis)
+
+    print("\nFinished Normalizing\n")
+    return normalized_data[0], normalized_data[1], normalized_data[2]
+
+def normalizeDataChunked(data, mode = "axis", chunk_size = 1000000):
+
+    """
+    Out-of-core version of normalizeData(): normalizes a (steps, 3) float32 / float64 array in place, chunk by chunk,
+    so that peak memory only depends on chunk_size (arg3), not on the number of steps.
+    Meant for memory-mapped arrays (np.memmap, np.load(..., mmap_mode='r+')), but works on any array.
+
+    Mode (arg2):
+        "axis"   -> each axis according to its individual min and max value (like normalizeData())
+        "shared" -> all axes according to one common min and max value, keeping the attractor's shape
+
+    """
+
+    if mode not in ("axis", "shared"):
+        raise ValueError("mode (arg2) has to be 'axis' or 'shared'")
+
+    # Pass 1: min / max reduction
+    min_vals = np.full(data.shape[1], np.inf)
+    max_vals = np.full(data.shape[1], -np.inf)
+
+    for start in range(0, len(data), chunk_size):
+        chunk = data[start:start + chunk_size]
+        min_vals = np.minimum(min_vals, chunk.min(axis=0))
+        max_vals = np.maximum(max_vals, chunk.max(axis=0))
+
+    if mode == "shared":
+        min_vals[:] = min_vals.min()
+        max_vals[:] = max_vals.max()
+
+    span = max_vals - min_vals
+    zero_span = span == 0
+    span[zero_span] = 1
+
+    # Pass 2: in-place scaling. If max and min are equal, the axis is set to 0
+    for start in range(0, len(data), chunk_size):
+        chunk = data[start:start + chunk_size]
+        chunk -= min_vals
+        chunk /= span
+        chunk[:, zero_span] = 0
+
+    if isinstance(data, np.memmap):
+        data.flush()
+
+    print("\nFinished Normalizing\n")
+    return data
+
+def tresholdCrossingIndices(AxisData, tresholds = [0.5, 0.5, 0.2]):
+
+    """
+    Vectorized, sparse version of DataTresholdConditioning() (rossler_attractor.py): returns one array of note positions per axis
+    instead of binary lists. Handles all axes in one call.
+
+    The positions are those at which the binary list of DataTresholdConditioning() holds a 1
+    (which starts with an extra 0, so a crossing at step i sits at position i + 1).
+
+    """
+
+    data = np.asarray(AxisData, dtype=np.float64)
+    tresholds = np.asarray(tresholds[:len(data)], dtype=np.float64)[:, np.newaxis]
+
+    crossings = (data[:, :-1] < tresholds) & (data[:, 1:] >= tresholds)
+    return [np.flatnonzero(axis) + 2 for axis in crossings]
+
+def gradientCrossingIndices(AxisData, gradient_tresholds = [0.0, 0.0, 0.0]):
+
+    """
+    Vectorized, sparse version of DataGradientConditioning() (rossler_attractor.py): returns one array of note positions per axis
+    instead of binary lists. Handles all axes in one call.
+
+    Like the original, the gradient of the first step is taken against 0 (and so is the gradient before it).
+
+    """
+
+    data = np.asarray(AxisData, dtype=np.float64)
+    tresholds = np.asarray(gradient_tresholds[:len(data)], dtype=np.float64)[:, np.newaxis]
+
+    gradients = np.diff(data, axis=1, prepend=0)
+    last_gradients = np.hstack([np.zeros((len(data), 1)), gradients[:, :-1]])
+
+    crossings = (last_gradients < tresholds) & (gradients >= tresholds)
+    return [np.flatnonzero(axis) + 1 for axis in crossings]
+
+def crossingIndicesToTimestamps(crossingIndices, num_steps, steps_per_second = 3000):
+
+    """
+    Vectorized version of BinaryNotesToTimestamps() (rossler_attractor.py), taking note positions from the sparse conditioning functions (arg1)
+    and the number of data points per axis (arg2).
+
+    Like the original, the timestamp of the last step is appended to every axis, to keep looping axes synchronized.
+
+    """
+
+    last_timestamp = num_steps*(1/steps_per_second)
+    return [np.append(indices*(1/steps_per_second), last_timestamp) for indices in crossingIndices]
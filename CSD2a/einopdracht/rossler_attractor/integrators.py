@@ -0,0 +1,240 @@
+import numpy as np
+from chaotic_systems import rosslerSystem, resolveSystem, defaultStartValues
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+JIT_AVAILABLE = numba is not None
+JIT_MIN_STEPS = 100000    # Below this many steps (times trajectories), compiling takes longer than it saves
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Integrator engine for ensembles of trajectories.
+
+Instead of stepping one (x, y, z) point at a time, N trajectories are advanced together as a single (N, 3) state array.
+Offers forward Euler (identical to calculation() in rossler_attractor.py), classic RK4 and a fixed-step RK45 (Dormand-Prince).
+
+Right-hand-side functions only use arithmetic on their arguments, so the very same function works on plain floats
+(single trajectory) as well as on numpy arrays (whole ensemble). The systems themselves (Rössler, Lorenz, Chua, Thomas,
+Halvorsen, ...) are registered by name in chaotic_systems.py.
+
+If numba is installed, long integrations run as one JIT-compiled loop over all steps (compiled once per system and method),
+performing the very same floating point operations as the numpy steps below. Without numba, the numpy steps are used.
+
+
+"""
+
+
+
+def eulerStep(system, x, y, z, constants, step_size):
+
+    """
+    One forward Euler step. Written exactly like calculation(), so that results are bit-identical.
+
+    """
+
+    x_dot, y_dot, z_dot = system(x, y, z, *constants)
+    return x + (x_dot * step_size), y + (y_dot * step_size), z + (z_dot * step_size)
+
+def rk4Step(system, x, y, z, constants, step_size):
+
+    """
+    One step of the classic fourth order Runge-Kutta method.
+
+    """
+
+    h = step_size
+    k1 = system(x, y, z, *constants)
+    k2 = system(x + k1[0] * h/2, y + k1[1] * h/2, z + k1[2] * h/2, *constants)
+    k3 = system(x + k2[0] * h/2, y + k2[1] * h/2, z + k2[2] * h/2, *constants)
+    k4 = system(x + k3[0] * h, y + k3[1] * h, z + k3[2] * h, *constants)
+
+    return tuple(value + h/6 * (k1[i] + 2*k2[i] + 2*k3[i] + k4[i]) for i, value in enumerate((x, y, z)))
+
+# Dormand-Prince coefficients (5th order solution, no step size control)
+RK45_A = [
+    [],
+    [1/5],
+    [3/40, 9/40],
+    [44/45, -56/15, 32/9],
+    [19372/6561, -25360/2187, 64448/6561, -212/729],
+    [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656]
+]
+RK45_B = [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84]
+
+def rk45Step(system, x, y, z, constants, step_size):
+
+    """
+    One fixed-size step of the Dormand-Prince RK45 method, using its 5th order solution.
+
+    """
+
+    h = step_size
+    state = (x, y, z)
+    k = []
+
+    for a_row in RK45_A:
+        stage = [value + h * sum(a * k[j][i] for j, a in enumerate(a_row)) if a_row else value for i, value in enumerate(state)]
+        k.append(system(*stage, *constants))
+
+    return tuple(value + h * sum(b * k[j][i] for j, b in enumerate(RK45_B) if b != 0) for i, value in enumerate(state))
+
+INTEGRATORS = {
+    "euler": eulerStep,
+    "rk4": rk4Step,
+    "rk45": rk45Step
+}
+
+"""
+
+JIT Engine (numba, optional)
+-------------------------------------------------
+
+"""
+
+JIT_KERNELS = {}
+
+def jitKernel(system, method):
+
+    """
+    Compiles (once per system function and method) a loop integrating every trajectory of an ensemble over all steps.
+    Each step is written out like its numpy counterpart above, so that both give the same results.
+
+    """
+
+    if (system, method) in JIT_KERNELS:
+        return JIT_KERNELS[(system, method)]
+
+    rhs = numba.njit(system)
+
+    if method == "euler":
+        @numba.njit
+        def step(x, y, z, constants, h):
+            x_dot, y_dot, z_dot = rhs(x, y, z, *constants)
+            return x + (x_dot * h), y + (y_dot * h), z + (z_dot * h)
+
+    elif method == "rk4":
+        @numba.njit
+        def step(x, y, z, constants, h):
+            k1 = rhs(x, y, z, *constants)
+            k2 = rhs(x + k1[0] * h/2, y + k1[1] * h/2, z + k1[2] * h/2, *constants)
+            k3 = rhs(x + k2[0] * h/2, y + k2[1] * h/2, z + k2[2] * h/2, *constants)
+            k4 = rhs(x + k3[0] * h, y + k3[1] * h, z + k3[2] * h, *constants)
+            return (x + h/6 * (k1[0] + 2*k2[0] + 2*k3[0] + k4[0]),
+                    y + h/6 * (k1[1] + 2*k2[1] + 2*k3[1] + k4[1]),
+                    z + h/6 * (k1[2] + 2*k2[2] + 2*k3[2] + k4[2]))
+
+    else:
+        a_table = np.zeros((len(RK45_A), len(RK45_A)))
+        for i, a_row in enumerate(RK45_A):
+            a_table[i, :len(a_row)] = a_row
+        b_row = np.array(RK45_B)
+
+        @numba.njit
+        def step(x, y, z, constants, h):
+            k = np.empty((6, 3))
+            for i in range(6):
+                stage = [x, y, z]
+                if i > 0:
+                    for axis in range(3):
+                        total = 0.0
+                        for j in range(i):
+                            total += a_table[i, j] * k[j, axis]
+                        stage[axis] = stage[axis] + h * total
+                k[i, 0], k[i, 1], k[i, 2] = rhs(stage[0], stage[1], stage[2], *constants)
+
+            result = [x, y, z]
+            for axis in range(3):
+                total = 0.0
+                for j in range(6):
+                    if b_row[j] != 0:
+                        total += b_row[j] * k[j, axis]
+                result[axis] = result[axis] + h * total
+            return result[0], result[1], result[2]
+
+    @numba.njit
+    def integrate(trajectories, constants, steps, step_size, save_every):
+        for n in range(trajectories.shape[1]):
+            x, y, z = trajectories[0, n, 0], trajectories[0, n, 1], trajectories[0, n, 2]
+            for i in range(1, steps + 1):
+                x, y, z = step(x, y, z, constants, step_size)
+                if i % save_every == 0:
+                    trajectories[i // save_every, n, 0] = x
+                    trajectories[i // save_every, n, 1] = y
+                    trajectories[i // save_every, n, 2] = z
+
+    JIT_KERNELS[(system, method)] = integrate
+    return integrate
+
+
+"""
+
+Ensemble Calculation
+-------------------------------------------------
+
+"""
+
+def ensembleCalculation(system = rosslerSystem, start_values = None, parameters = None, steps = 10000, step_size = 0.01, method = "euler", save_every = 1, jit = None):
+
+    """
+    Integrates N trajectories at once. start_values (arg2) is an (N, 3) array of initial conditions, or a single [x, y, z] point.
+
+    System (arg1) is a right-hand-side function or the name of a registered one (see chaotic_systems.py).
+    Start values and parameters (arg3) not given fall back to the system's defaults.
+
+    Returns an array of shape (steps // save_every + 1, N, 3), containing every save_every'th (arg7) state.
+    A save_every > 1 keeps memory low for large ensembles.
+
+    Jit (arg8): True / False forces / avoids the numba engine; by default it is used if installed and the integration is long
+    enough (JIT_MIN_STEPS) to outweigh compiling.
+
+    """
+
+    if method not in INTEGRATORS:
+        raise ValueError(f"Unknown integration method '{method}'. Choose from {list(INTEGRATORS)}.")
+
+    if save_every < 1:
+        raise ValueError("save_every has to be a positive integer")
+
+    if start_values is None:
+        start_values = defaultStartValues(system)
+
+    step = INTEGRATORS[method]
+    system, constants = resolveSystem(system, parameters)
+
+    start = np.array(start_values, dtype=np.float64).reshape(-1, 3)
+    trajectories = np.empty((steps // save_every + 1, len(start), 3))
+    trajectories[0] = start
+
+    if jit is None:
+        jit = JIT_AVAILABLE and steps * len(start) >= JIT_MIN_STEPS
+    elif jit and not JIT_AVAILABLE:
+        raise ImportError("The JIT engine needs numba (pip install numba).")
+
+    if jit:
+        jitKernel(system, method)(trajectories, tuple(float(value) for value in constants), steps, step_size, save_every)
+        return trajectories
+
+    # A single trajectory is fastest as plain floats; avoids the per-call overhead of tiny arrays
+    if len(start) == 1:
+        x, y, z = (float(value) for value in start[0])
+        xx, yy, zz = (trajectories[:, 0, axis] for axis in range(3))
+    else:
+        x, y, z = (start[:, axis].copy() for axis in range(3))
+        xx, yy, zz = (trajectories[:, :, axis] for axis in range(3))
+
+    for i in range(1, steps + 1):
+        x, y, z = step(system, x, y, z, constants, step_size)
+
+        if i % save_every == 0:
+            xx[i // save_every] = x
+            yy[i // save_every] = y
+            zz[i // save_every] = z
+
+    return trajectories
@@ -0,0 +1,216 @@
+import numpy as np
+import itertools
+import json
+import multiprocessing
+import os
+import pathlib
+from integrators import ensembleCalculation, rosslerSystem
+from data_processing import normalizeDataChunked, tresholdCrossingIndices, gradientCrossingIndices
+
+
+DIR_PATH = pathlib.Path(__file__).parent.resolve()
+CONDITIONING_METHODS = {
+    "treshold": tresholdCrossingIndices,
+    "gradient": gradientCrossingIndices
+}
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Parameter sweep and bifurcation mapping of the Rössler Attractor sonification.
+
+Instead of rerunning rossler_attractor.py one parameter setting at a time, a grid or list of parameter dicts
+is computed on a process pool (one point per core at a time). For every point, the same steps as DataMain() and the chosen
+conditioning method are run, and a summary is returned:
+
+    - event counts per axis
+    - inter-onset interval statistics per axis (in seconds, based on steps_per_second)
+    - local maxima of Z (raw, after the transient), for bifurcation diagrams
+
+Workers only import the integrators and data_processing.py, no audio or GUI modules, so sweeps also run on headless machines.
+
+Results are streamed to a JSON-lines file as soon as a point finishes. Rerunning the same sweep with the same file
+skips every point already stored, so an interrupted sweep simply resumes.
+
+
+"""
+
+
+
+def parameterGrid(a_values, b_values, c_values):
+
+    """
+    Creates a list of parameter dicts from every combination of the given a, b and c values.
+
+    """
+
+    return [{'a': float(a), 'b': float(b), 'c': float(c)} for a, b, c in itertools.product(a_values, b_values, c_values)]
+
+def sweepKey(parameters, settings):
+
+    """
+    Unique, json-based identifier of a sweep point, used to detect already computed points when resuming.
+
+    """
+
+    return json.dumps({'parameters': parameters, **settings}, sort_keys=True)
+
+def localMaxima(axis):
+
+    """
+    Returns the values of all local maxima of an axis (arg1).
+
+    """
+
+    axis = np.asarray(axis)
+    is_maximum = (axis[1:-1] > axis[:-2]) & (axis[1:-1] >= axis[2:])
+    return axis[1:-1][is_maximum]
+
+def summarizeAxis(note_positions, steps_per_second):
+
+    """
+    Summarizes the note positions of one axis into its event count and inter-onset interval statistics (seconds).
+
+    """
+
+    onsets = np.asarray(note_positions) / steps_per_second
+    intervals = np.diff(onsets)
+
+    if len(intervals) == 0:
+        return {'events': len(onsets), 'ioi_mean': None, 'ioi_std': None, 'ioi_min': None, 'ioi_max': None}
+
+    return {
+        'events': len(onsets),
+        'ioi_mean': float(intervals.mean()),
+        'ioi_std': float(intervals.std()),
+        'ioi_min': float(intervals.min()),
+        'ioi_max': float(intervals.max())
+    }
+
+def sweepPoint(task):
+
+    """
+    Computes and summarizes a single point of the sweep. Runs in a worker process.
+
+    """
+
+    parameters, settings = task
+
+    # Same steps as DataMain(), keeping the raw Z axis for the bifurcation maxima
+    trajectory = ensembleCalculation(rosslerSystem, settings['start_values'], parameters, settings['steps'], settings['step_size'], settings['method'])[:, 0]
+    xx, yy, zz = normalizeDataChunked(trajectory.copy()).T
+
+    conditioning = CONDITIONING_METHODS[settings['conditioning']]
+    crossingIndices = conditioning([xx, yy, zz], settings['tresholds'])
+
+    transient = int(len(trajectory) * settings['transient'])
+    z_maxima = localMaxima(trajectory[transient:, 2])
+
+    return {
+        'key': sweepKey(parameters, settings),
+        'parameters': parameters,
+        'axes': {axis: summarizeAxis(crossingIndices[i], settings['steps_per_second']) for i, axis in enumerate("XYZ")},
+        'z_maxima': z_maxima.tolist()
+    }
+
+def loadSweepResults(results_path):
+
+    """
+    Reads all complete results from a JSON-lines results file. An incomplete last line (interrupted write) is ignored.
+
+    """
+
+    results = []
+    if not os.path.exists(results_path):
+        return results
+
+    with open(results_path, "r") as results_file:
+        for line in results_file:
+            try:
+                results.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+
+    return results
+
+def parameterSweep(parameter_list, results_path = f"{DIR_PATH}/sweep_results.jsonl", conditioning = "treshold", tresholds = [0.1, 0.1, 0.1],
+                   steps_per_second = 2000, start_values = [0.1,0.1,0.1], steps = 200000, step_size = 0.01, method = "euler",
+                   transient = 0.1, processes = None):
+
+    """
+    Runs DataMain() steps plus the conditioning method (arg3: "treshold" or "gradient") for every parameter dict in arg1,
+    spread across a process pool (default: all cores).
+
+    Every finished point is appended to results_path (arg2) right away; points already in that file are skipped.
+    Returns the summaries of all points of the sweep.
+
+    """
+
+    if conditioning not in CONDITIONING_METHODS:
+        raise ValueError(f"Unknown conditioning method '{conditioning}'. Choose from {list(CONDITIONING_METHODS)}.")
+
+    settings = {
+        'conditioning': conditioning,
+        'tresholds': list(tresholds),
+        'steps_per_second': steps_per_second,
+        'start_values': list(start_values),
+        'steps': steps,
+        'step_size': step_size,
+        'method': method,
+        'transient': transient
+    }
+
+    finished = {result['key']: result for result in loadSweepResults(results_path)}
+    tasks = [(parameters, settings) for parameters in parameter_list if sweepKey(parameters, settings) not in finished]
+
+    print(f"\nSweep: {len(parameter_list)} points, {len(parameter_list) - len(tasks)} already done, {len(tasks)} to compute.\n")
+
+    with multiprocessing.Pool(processes) as pool, open(results_path, "a+") as results_file:
+
+        # Terminate a line cut off by an interruption, so the next result starts on its own line
+        if results_file.tell() > 0:
+            results_file.seek(results_file.tell() - 1)
+            if results_file.read(1) != "\n":
+                results_file.write("\n")
+
+        for n, result in enumerate(pool.imap_unordered(sweepPoint, tasks)):
+            results_file.write(json.dumps(result) + "\n")
+            results_file.flush()
+            finished[result['key']] = result
+            print(f"Finished point {n+1:05} of {len(tasks):05}: {result['parameters']}")
+
+    return [finished[sweepKey(parameters, settings)] for parameters in parameter_list]
+
+def plotBifurcation(results, parameter = 'c'):
+
+    """
+    Plots the Z maxima of each sweep point against one varying parameter (arg2) as a bifurcation diagram.
+
+    """
+
+    # Only the plotting process needs matplotlib
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure("Bifurcation", figsize=(8, 6))
+    ax = fig.add_subplot(111)
+
+    for result in results:
+        z_maxima = result['z_maxima']
+        ax.plot([result['parameters'][parameter]] * len(z_maxima), z_maxima, ',', color='orange')
+
+    ax.set_xlabel(parameter)
+    ax.set_ylabel('Local maxima of Z')
+    plt.show()
+
+
+
+if __name__ == "__main__":
+
+    # "Vertigo" bifurcation range (see rossler_attractor.py)
+    parameter_list = parameterGrid([0.2], [0.3], np.linspace(18, 18.05, 101))
+
+    results = parameterSweep(parameter_list, conditioning = "treshold", tresholds = [0.1, 0.1, 0.1], steps = 100000)
+    plotBifurcation(results, parameter = 'c')
@@ -1,21 +1,35 @@
 import numpy as np
+import contextlib
 import matplotlib
 matplotlib.use('TkAgg')
-import matplotlib.animation as animation
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
-import simpleaudio as sa
 import pathlib
+import sys
 import time
+import threading
 import multiprocessing
+sys.path.append(str(pathlib.Path(__file__).parent.parent.resolve()))
+from audio_engine.offline_render import renderEvents
+from audio_engine.mixer import Mixer, MIXER_AVAILABLE
+from audio_engine.telemetry import LatencyRecorder
+from audio_engine.transport import Transport
+from audio_engine.sample_bank import SampleBank
+from audio_engine.voice_pool import VoicePool, playVoice, waitVoices, splitVoiceLimits
+from integrators import ensembleCalculation
+from trajectory_cache import cachedCalculation, trajectoryKey
+from stage_cache import stageKey, dataKey, memoizedStage, codeKey
+from chaotic_systems import defaultStartValues
+from data_processing import normalizeData, normalizeDataChunked, tresholdCrossingIndices, gradientCrossingIndices, crossingIndicesToTimestamps
+from stage_profiler import stageProfiler, DISABLED_PROFILER
 
 
 DIR_PATH = pathlib.Path(__file__).parent.resolve()
-SAMPLES_DICT = {
-   "X": sa.WaveObject.from_wave_file(f"{DIR_PATH}/samples/bleepC4.wav"),
-   "Y": sa.WaveObject.from_wave_file(f"{DIR_PATH}/samples/hihat.wav"),
-   "Z": sa.WaveObject.from_wave_file(f"{DIR_PATH}/samples/kick.wav")
-}
+SAMPLES_DICT = SampleBank(DIR_PATH / "samples", {"X": "bleepC4", "Y": "hihat", "Z": "kick"}, sample_rate = 48000)
+# Polyphony limits of playback (see audio_engine/voice_pool.py). Without the mixer, each axis process has its own pool, with an equal share of max_voices.
+# Code computing the cached stages (see stage_cache.py): a change to it invalidates their cached results
+STAGE_CODE = codeKey(__file__, DIR_PATH / "data_processing.py")
+VOICE_LIMITS = {'max_voices': 32, 'max_per_instrument': 8, 'stealing': "oldest"}
 
 
 """
@@ -24,10 +38,13 @@ DESCRIPTION
 ----------------
 
 Rhythmical sonification of Rössler Attractor based on Treshold and Gradient Conditioning.
+Other chaotic systems (Lorenz, Chua, Thomas, Halvorsen) are selected with DataMain(system = ...), see chaotic_systems.py.
 
 Behold the inquisitive normalization (for the sake of simplicity), altering the original shape of the attractor (especially compressing Z-Axis)
 
-Plotting realised with Matlab. (Animation work-in-progress; commented out for now)
+Plotting realised with Matplotlib. Long trajectories are drawn at a level of detail matching the view (min / max decimation,
+refined when zooming), and AudioMain(Animate = True) animates a playhead running along the trajectory during playback,
+on the same transport clock as the audio (blitted, so only the playhead is redrawn per frame).
 Credit to Leo Corte's visualization method https://thebrickinthesky.wordpress.com/2013/02/23/maths-with-python-2-rossler-system/
 
 Feel free to experiment with parameters and the twofold sonification methods in the __main__ function.
@@ -82,43 +99,74 @@ def calculation(rossler_function, start_values = [0.1,0.1,0.1], parameters = {'a
 
     return xx, yy, zz
 
-def normalizeData(xx, yy, zz):
-    
+def DataMain(start_values = None, parameters = None, steps= 10000, step_size = 0.01, method = "euler", cache = True, profile = None, system = "rossler"):
+
     """
-    Normalizes each axis according to its (!) individual (!) min and max value.
+    Initializes the the necessary steps for calculating and preparing the sonification data,
+    offering the crucial parameters as arguments.
+
+    System (arg8) selects the chaotic system by name: "rossler", "lorenz", "chua", "thomas" or "halvorsen" (see chaotic_systems.py).
+    Start values (arg1) and parameters (arg2) not given are the system's defaults.
+
+    Integration method (arg5): "euler" (original), "rk4" or "rk45" (see integrators.py).
+    With cache (arg6), trajectories calculated before are loaded from the user's cache directory (see trajectory_cache.py), and longer ones continue
+    from the last step of a shorter one. Their normalization is cached as well (see stage_cache.py).
+    Profile (arg7) switches per-stage profiling on or off (default: ROSSLER_PROFILE environment variable, see stage_profiler.py).
     
     """
 
-    data = [xx, yy, zz]
-    normalized_data = []
+    profiler = stageProfiler(profile)
 
-    # Normalize and scale each axis
-    for axis in data:
-        min_val = min(axis)
-        max_val = max(axis)
+    if start_values is None:
+        start_values = defaultStartValues(system)
 
-        if max_val != min_val:  # Check if max and min are not equal to avoid division by zero
-            scaled_axis = [((x - min_val) / (max_val - min_val)) for x in axis]
+    with profiler.stage("integration"):
+        if cache:
+            trajectory = cachedCalculation(start_values, parameters, steps, step_size, method, system = system)
+        else:
+            trajectory = ensembleCalculation(system, start_values, parameters, steps, step_size, method)[:, 0]
+
+    with profiler.stage("normalization"):
+        # Plain array view: element-wise access to a memory map is several times slower
+        trajectory = np.asarray(trajectory)
+        xx, yy, zz = trajectory[:, 0], trajectory[:, 1], trajectory[:, 2]
+        if cache:
+            # Stored as one array, which loads far faster than lists of floats
+            normalization_key = stageKey(trajectoryKey(start_values, parameters, step_size, method, system), steps)
+            xx_norm, yy_norm, zz_norm = memoizedStage("normalization", normalization_key, lambda: np.array(normalizeData(xx, yy, zz)), code = STAGE_CODE).tolist()
         else:
-            scaled_axis = [0] * len(axis)  # If max and min are equal, set all values to 0
-        normalized_data.append(scaled_axis)
+            xx_norm, yy_norm, zz_norm = normalizeData(xx, yy, zz)
+
+    # A profiler passed in collects further runs; print its summary there
+    if profiler is not profile:
+        profiler.printSummary("DataMain")
+
+    return xx_norm, yy_norm, zz_norm
 
-    print("\nFinished Normalizing\n")
-    return normalized_data[0], normalized_data[1], normalized_data[2]
 
-def DataMain(start_values = [0.1,0.1,0.1], parameters = {'a': 0.3, 'b': 0.21, 'c': 5}, steps= 10000, step_size = 0.01):
+def DataMainOutOfCore(filepath, start_values = None, parameters = None, steps= 10000, step_size = 0.01, method = "euler",
+                      dtype = np.float64, normalization = "axis", chunk_size = 1000000, system = "rossler"):
 
     """
-    Initializes the the necessary steps for calculating and preparing the sonification data,
-    offering the crucial parameters as arguments.
-    
+    Like DataMain(), but for very long trajectories: calculates the steps chunk by chunk straight into a memory-mapped .npy file (arg1)
+    and normalizes it in place with normalizeDataChunked(). Peak memory stays bounded, no matter how many steps.
+    System (arg10) selects the chaotic system, as in DataMain().
+
+    Returns the memory-mapped (steps + 1, 3) array; its columns are the X, Y and Z axis.
+
     """
 
-    xx, yy, zz = calculation(rossler_attractor, start_values, parameters, steps, step_size)
-    xx_norm, yy_norm, zz_norm = normalizeData(xx, yy, zz)
+    data = np.lib.format.open_memmap(filepath, mode='w+', dtype=dtype, shape=(steps + 1, 3))
+    state = start_values if start_values is not None else defaultStartValues(system)
 
-    return xx_norm, yy_norm, zz_norm
+    # Each chunk continues from the last state of the previous one (identical to integrating in one go)
+    for start in range(0, steps, chunk_size):
+        chunk_steps = min(chunk_size, steps - start)
+        chunk = ensembleCalculation(system, state, parameters, chunk_steps, step_size, method)[:, 0]
+        data[start:start + chunk_steps + 1] = chunk
+        state = chunk[-1]
 
+    return normalizeDataChunked(data, normalization, chunk_size)
 
 
 """
@@ -234,14 +282,26 @@ def BinaryNotesToTimestamps(AxisData, steps_per_second = 3000):
     
     return timestampsAxisList
 
-def timestampPlayback(timestampsAxis, samples_dict, AxisIndex = "X", DisplaySign = "+++"):
+SPARSE_CONDITIONING = {
+    DataTresholdConditioning: tresholdCrossingIndices,
+    DataGradientConditioning: gradientCrossingIndices
+}
+
+def timestampPlayback(timestampsAxis, samples_dict, AxisIndex = "X", DisplaySign = "+++", mixer = None, mixer_start = None, lookahead = 0.05, recorder = None, transport = None, voice_limits = VOICE_LIMITS):
 
     """
     Plays back timestamps of an individual axis using the sample (dict in arg2) assigned to the Axisindex (arg3).
 
     Minimalistic visualizazion in terminal using symbols of arg4.
 
-    Employed in multiprocessing below.
+    Employed in multiprocessing below. With a mixer (arg5), events are instead submitted to it lookahead (arg7) seconds early,
+    timed on the mixer clock from mixer_start (arg6) on, so that they start sample-accurately (see mixerPlayback()).
+
+    With a recorder (arg8, a LatencyRecorder), the timing of every event is recorded instead of printed.
+
+    Without a mixer, events are timed on the shared start of a Transport (arg9, see audio_engine/transport.py),
+    or on an own one starting right away, and played within the polyphony limits of voice_limits (arg10).
+    The drift of the played events (and, without a mixer, the voice counts) are reported at the end.
 
     """
 
@@ -252,61 +312,235 @@ def timestampPlayback(timestampsAxis, samples_dict, AxisIndex = "X", DisplaySign
     if AxisIndex == "Z":
         displayIndex = f"      {DisplaySign}"
 
-    sample = samples_dict.get(AxisIndex)
-    start_time = time.time()
     end_time = timestampsAxis.pop(-1)
 
+    if mixer is not None:
+        clock = mixer.time
+        start_time = mixer.time() if mixer_start is None else mixer_start
+    else:
+        if transport is None:
+            transport = Transport(lead_in = 0)
+        clock = time.perf_counter
+        lookahead = 0
+        pool = VoicePool(**voice_limits)
+        # A transport shared between processes only starts once every process has got here
+        transport.ready()
+        start_time = transport.start_time
+
+    last_drift = 0
+    max_drift = 0
+
     print(f"Playing Axis {AxisIndex}.   Events: {len(timestampsAxis)}")
 
     for n, timestamp in enumerate(timestampsAxis):
     
-        elapsed_time = time.time() - start_time
+        elapsed_time = clock() - start_time
         current_event = int(n+1)
 
         if elapsed_time < timestamp:
-            time.sleep(timestamp - elapsed_time)
-            elapsed_time = time.time() - start_time
-            print(f"Axis {AxisIndex} {displayIndex}        Playing Note {current_event:04} of {len(timestampsAxis):04}.       Elapsed time: {elapsed_time:.2f}       Latency: {(elapsed_time-timestamp)*1000:.2f} ms")
-            play_obj = sample.play()
+            if mixer is not None:
+                time.sleep(max(timestamp - elapsed_time - lookahead, 0))
+            else:
+                transport.waitUntil(timestamp)
+            elapsed_time = clock() - start_time
+
+            # A mixer event submitted in time starts exactly at its timestamp
+            last_drift = max(elapsed_time, timestamp) - timestamp if mixer is not None else elapsed_time - timestamp
+            max_drift = max(max_drift, abs(last_drift))
+
+            if recorder is not None:
+                recorder.record("XYZ".index(AxisIndex), timestamp, timestamp + last_drift)
+            else:
+                print(f"Axis {AxisIndex} {displayIndex}        Playing Note {current_event:04} of {len(timestampsAxis):04}.       Elapsed time: {elapsed_time:.2f}       Latency: {(elapsed_time-timestamp)*1000:.2f} ms")
+
+            if mixer is not None:
+                mixer.submit(AxisIndex, start_time + timestamp)
+            else:
+                playVoice(pool, samples_dict, AxisIndex, timestamp)
+
+        elif recorder is not None:
+            recorder.drop("XYZ".index(AxisIndex))
 
         if n+1 == len(timestampsAxis) and elapsed_time < end_time:
             time.sleep(end_time - elapsed_time)
-            play_obj.wait_done()
+            if mixer is None:
+                waitVoices(pool)
     
-    elapsed_time = time.time() - start_time
-    print(f"\nAxis {AxisIndex}:   Playback finished at {elapsed_time}.\n")
+    elapsed_time = clock() - start_time
+    print(f"\nAxis {AxisIndex}:   Playback finished at {elapsed_time}.   Drift at last event: {last_drift*1000:.3f} ms (max {max_drift*1000:.3f} ms).\n")
+    if mixer is None:
+        pool.printSummary()
                
-def multiprocessingPlayback(AxisData):
+def multiprocessingPlayback(AxisData, recorder = None, lead_in = 0.5, spin_window = 0.002, profiler = DISABLED_PROFILER, transport = None):
 
     """
     Initializes multiprocessEventHandler() processes based on the number of input sequences.
+    All processes share one Transport, starting lead_in (arg3) seconds after all of them are ready to play (so that no events are
+    lost to slow process startup, see audio_engine/transport.py), or the given transport (arg6).
+    Process startup and playback are profiled as separate stages of profiler (arg5, see stage_profiler.py).
   
     """
 
     processes = []
     axis_indexes = ["X", "Y", "Z"]
 
-    for i, axis in enumerate(AxisData):
-        process = multiprocessing.Process(target=timestampPlayback, args=(axis, SAMPLES_DICT, axis_indexes[i]))
-        processes.append(process)
+    with profiler.stage("process startup"):
+        if transport is None:
+            transport = Transport(lead_in, spin_window, parties = len(AxisData))
+
+        # Every process has its own voice pool: together, they stay within the overall limit
+        voice_limits = splitVoiceLimits(VOICE_LIMITS, len(AxisData))
 
-    print(f"\nMultiprocessing Playback started.\n")
+        for i, axis in enumerate(AxisData):
+            process = multiprocessing.Process(target=timestampPlayback, args=(axis, SAMPLES_DICT, axis_indexes[i]),
+                                              kwargs={'recorder': recorder, 'transport': transport, 'voice_limits': voice_limits})
+            processes.append(process)
 
-    for process in processes:
-        process.start()
+        print(f"\nMultiprocessing Playback started.\n")
 
-    for process in processes:
-        process.join()
+        for process in processes:
+            process.start()
+
+        transport.start()
+
+    with profiler.stage("playback"):
+        for process in processes:
+            process.join()
+
+def mixerPlayback(AxisData, recorder = None, profiler = DISABLED_PROFILER, transport = None):
+
+    """
+    Plays back all axes through one Mixer, owning a single output stream, instead of one process per axis.
+    Each axis runs timestampPlayback() in a thread, which only submits its events to the mixer.
+    Mixer startup and playback are profiled as separate stages of profiler (arg3, see stage_profiler.py).
+    With a transport (arg4), playback starts at its start time (e.g. shared with plotAnimatedData()). If the mixer is not started
+    in time for it, the transport's start is moved to the one actually used, so that everything following it stays in sync.
 
-def AudioMain(NoteConditioning, AxisData, Tresholds = [0.5,0.5,0.2], StepsPerSecond = 5000):
+    """
+
+    with profiler.stage("mixer startup"):
+        mixer = Mixer(SAMPLES_DICT, **VOICE_LIMITS)
+        mixer.start()
+
+        # Common start on the mixer clock, shortly ahead so that every axis can submit its first events in time
+        start_time = mixer.time() + 0.1
+        if transport is not None:
+            transport_start = mixer.time() - transport.now()
+            if transport_start < start_time:
+                # Startup outlasted the transport's lead-in: the transport (and the playhead following it) starts later instead
+                late = start_time - transport_start
+                print(f"\nWarning: mixer startup outlasted the lead-in, transport moved {late:.3f} s later to stay in sync.\n")
+                transport.start_time += late
+            else:
+                start_time = transport_start
+        axis_indexes = ["X", "Y", "Z"]
+        threads = []
+
+        for i, axis in enumerate(AxisData):
+            thread = threading.Thread(target=timestampPlayback, args=(axis, SAMPLES_DICT, axis_indexes[i]), kwargs={'mixer': mixer, 'mixer_start': start_time, 'recorder': recorder})
+            threads.append(thread)
+
+        print(f"\nMixer Playback started.\n")
+
+        for thread in threads:
+            thread.start()
+
+    with profiler.stage("playback"):
+        for thread in threads:
+            thread.join()
+
+        mixer.waitDone()
+        mixer.close()
+
+    mixer.pool.printSummary()
+
+def renderTimestamps(timestampsAxisData, samples_dict, filepath):
+
+    """
+    Renders the timestamps of all axes (arg1) offline into a WAV file (arg3), instead of playing them back.
+    Runs many times faster than realtime; the last timestamp of the axes sets the (minimum) duration.
+
+    """
+
+    axis_indexes = ["X", "Y", "Z"]
+    events = [(timestamp, axis_indexes[i]) for i, axis in enumerate(timestampsAxisData) for timestamp in axis[:-1]]
+    duration = max(axis[-1] for axis in timestampsAxisData)
+
+    length = renderEvents(events, samples_dict, filepath, duration=duration)
+    print(f"\nRendered {len(events)} events ({length:.2f} seconds) to {filepath}\n")
+
+def AudioMain(NoteConditioning, AxisData, Tresholds = [0.5,0.5,0.2], StepsPerSecond = 5000, RenderPath = None, Telemetry = False, Profile = None, Cache = True, Animate = False):
     """
     Initializes the necesarry functions and processes for multiprocessing playback based on timestamps derived from axis data from threshold conditioning method.
+    With a RenderPath (arg5), the sonification is rendered offline into that WAV file instead of being played back.
+    Playback goes through a single Mixer if sounddevice is installed, otherwise through one process per axis.
+    With Telemetry (arg6), event timing is recorded instead of printed, summarized at the end and returned as a LatencyRecorder.
+    With a port number as Telemetry, the live counters are also served on http://localhost:<port> during playback (see telemetry.py).
+    Profile (arg7) switches per-stage profiling on or off (default: ROSSLER_PROFILE environment variable, see stage_profiler.py).
+    With Cache (arg8), conditioning and timestamps are cached per axis data, tresholds and steps per second (see stage_cache.py),
+    so that only the stages downstream of a changed argument run again.
+    With Animate (arg9), playback runs in the background while plotAnimatedData() shows a playhead on the trajectory, on the same transport clock.
     
     """
-    binaryRhythmAxisData = NoteConditioning(AxisData, Tresholds)
-    timestampsAxisData = BinaryNotesToTimestamps(binaryRhythmAxisData, StepsPerSecond)
+    profiler = stageProfiler(Profile)
+    stage = (lambda name, key, function: memoizedStage(name, key, function, code = STAGE_CODE)) if Cache else (lambda name, key, function: function())
+
+    # Use the vectorized, sparse equivalent of the conditioning method where available
+    sparse = NoteConditioning in SPARSE_CONDITIONING
+
+    with profiler.stage("conditioning"):
+        # Keyed by the function's name only: its module is "__main__" when this file runs as a script, "rossler_attractor" when imported
+        conditioning_key = stageKey(dataKey(AxisData) if Cache else None, NoteConditioning.__qualname__, list(Tresholds), sparse)
+        if sparse:
+            crossingIndices = stage("conditioning", conditioning_key, lambda: SPARSE_CONDITIONING[NoteConditioning](AxisData, Tresholds))
+        else:
+            binaryRhythmAxisData = stage("conditioning", conditioning_key, lambda: NoteConditioning(AxisData, Tresholds))
+
+    with profiler.stage("timestamps"):
+        timestamps_key = stageKey(conditioning_key, StepsPerSecond)
+        if sparse:
+            timestampsAxisData = stage("timestamps", timestamps_key, lambda: [timestamps.tolist() for timestamps in crossingIndicesToTimestamps(crossingIndices, len(AxisData[0]), StepsPerSecond)])
+        else:
+            timestampsAxisData = stage("timestamps", timestamps_key, lambda: BinaryNotesToTimestamps(binaryRhythmAxisData, StepsPerSecond))
     print(timestampsAxisData)
-    multiprocessingPlayback(timestampsAxisData)
+
+    recorder = None
+
+    if RenderPath is not None:
+        with profiler.stage("render"):
+            renderTimestamps(timestampsAxisData, SAMPLES_DICT, RenderPath)
+    else:
+        telemetry_port = None
+        if Telemetry:
+            recorder = LatencyRecorder(["X", "Y", "Z"], capacity=max(len(axis) for axis in timestampsAxisData))
+            # True is an int as well, but means recording without serving
+            if isinstance(Telemetry, int) and not isinstance(Telemetry, bool):
+                telemetry_port = Telemetry
+
+        if MIXER_AVAILABLE:
+            playback = lambda transport: mixerPlayback(timestampsAxisData, recorder, profiler, transport)
+        else:
+            playback = lambda transport: multiprocessingPlayback(timestampsAxisData, recorder, profiler = profiler, transport = transport)
+
+        with recorder.serving(telemetry_port) if recorder is not None else contextlib.nullcontext():
+            if Animate:
+                # The GUI needs the main thread, so playback runs in the background
+                transport = Transport(lead_in = 0.5, parties = None if MIXER_AVAILABLE else len(timestampsAxisData))
+                playback_thread = threading.Thread(target=playback, args=(transport,))
+                playback_thread.start()
+                plotAnimatedData(*AxisData, transport = transport, steps_per_second = StepsPerSecond, until = playback_thread)
+                playback_thread.join()
+            else:
+                playback(None)
+
+        if recorder is not None:
+            recorder.printSummary()
+
+    # A profiler passed in collects further runs; print its summary there
+    if profiler is not Profile:
+        profiler.printSummary("AudioMain")
+
+    return recorder
 
 
 """
@@ -316,18 +550,96 @@ Section 3 - Plotting and Animation
 
 """
 
-def plotData(xx, yy, zz, plot_angle=30, min_display = 0, max_display = 1):
+def minMaxDecimation(data, max_points = 20000):
 
-    """"
-    Plots three-dimensional data (using MatLab.
-    
     """
+    Indices of at most max_points (arg2) points of data (arg1, (steps, 3) array) that keep its shape: the data is split into
+    equal buckets, and of each, the points holding the minimum and maximum of every axis are kept (plus the first and last point).
+    Unlike taking every n'th point, no peak of the trajectory gets lost.
+    Below 8 points (one bucket, plus first and last point), evenly spaced points are taken instead.
 
-    fig = plt.figure("Plot",figsize=(6, 6))
-    ax = fig.add_subplot(111, projection='3d')
-    plt.gca().patch.set_facecolor('grey')
+    """
+
+    num_points = len(data)
+    if num_points <= max_points:
+        return np.arange(num_points)
+
+    # Up to 2 points (min and max) of every axis per bucket
+    points_per_bucket = 2 * data.shape[1]
+    if max_points < points_per_bucket + 2:
+        return np.unique(np.rint(np.linspace(0, num_points - 1, max(max_points, 0))).astype(np.int64))
+
+    num_buckets = (max_points - 2) // points_per_bucket
+    bucket_size = -(-num_points // num_buckets)
+    padded = np.concatenate([data, np.repeat(data[-1:], num_buckets * bucket_size - num_points, axis=0)])
+    buckets = padded.reshape(num_buckets, bucket_size, data.shape[1])
+
+    offsets = np.arange(num_buckets)[:, np.newaxis] * bucket_size
+    extremes = np.hstack([buckets.argmin(axis=1) + offsets, buckets.argmax(axis=1) + offsets])
+
+    return np.unique(np.concatenate([[0, num_points - 1], np.minimum(extremes.ravel(), num_points - 1)]))
+
+def decimateView(data, limits = None, max_points = 20000):
+
+    """
+    Decimates data (arg1, (steps, 3) array) to the points inside limits (arg2, ((x_min, x_max), (y_min, y_max), (z_min, z_max)))
+    with minMaxDecimation(). Returns x, y and z arrays; where the trajectory leaves the view, a NaN breaks the line.
 
-    ax.plot(xx, yy, zz, '-', color='orange', lw=0.1)
+    """
+
+    if limits is None:
+        visible = np.arange(len(data))
+    else:
+        lower = np.array([min(limit) for limit in limits])
+        upper = np.array([max(limit) for limit in limits])
+        visible = np.flatnonzero(np.all((data >= lower) & (data <= upper), axis=1))
+
+    if len(visible) == 0:
+        return np.empty(0), np.empty(0), np.empty(0)
+
+    kept = visible[minMaxDecimation(data[visible], max_points)]
+    points = data[kept]
+
+    # Kept points of different visible stretches get a NaN point in between
+    stretch = np.cumsum(np.diff(visible, prepend=visible[0]) > 1)
+    kept_stretch = stretch[np.searchsorted(visible, kept)]
+    breaks = np.flatnonzero(np.diff(kept_stretch)) + 1
+    points = np.insert(points, breaks, np.nan, axis=0)
+
+    return points[:, 0], points[:, 1], points[:, 2]
+
+class LevelOfDetail:
+
+    """
+    Keeps a 3D line (arg1) at no more than max_points (arg3) points of data (arg2), however the view changes:
+    whenever the axis limits change (zooming), the points inside the new limits are decimated again, so zooming in reveals detail.
+
+    """
+
+    def __init__(self, line, data, max_points = 20000):
+        self.line = line
+        self.data = np.ascontiguousarray(data, dtype=np.float64)
+        self.max_points = max_points
+        self.limits = None
+
+        for event in ("xlim_changed", "ylim_changed", "zlim_changed"):
+            line.axes.callbacks.connect(event, self.update)
+        self.update(line.axes)
+
+    def update(self, ax):
+        limits = (tuple(ax.get_xlim()), tuple(ax.get_ylim()), tuple(ax.get_zlim()))
+        if limits == self.limits:
+            return
+
+        self.limits = limits
+        self.line.set_data_3d(*decimateView(self.data, limits, self.max_points))
+
+def setupAxes(ax, plot_angle = 30, min_display = 0, max_display = 1):
+
+    """
+    Axis labels, limits, ticks and panes shared by plotData() and plotAnimatedData().
+
+    """
 
     ax.set_xlabel('X Axis')
     ax.set_ylabel('Y Axis')
@@ -349,68 +661,152 @@ def plotData(xx, yy, zz, plot_angle=30, min_display = 0, max_display = 1):
     ax.grid(True)
 
     ax.view_init(azim=plot_angle)
+
+def plotData(xx, yy, zz, plot_angle=30, min_display = 0, max_display = 1, max_points = 20000):
+
+    """"
+    Plots three-dimensional data (using MatLab.
+
+    Only up to max_points (arg7) points are drawn, decimated without losing peaks and refined when zooming in (see LevelOfDetail),
+    which keeps rotating the plot smooth for any number of steps.
+    
+    """
+
+    fig = plt.figure("Plot",figsize=(6, 6))
+    ax = fig.add_subplot(111, projection='3d')
+    plt.gca().patch.set_facecolor('grey')
+
+    line, = ax.plot([], [], [], '-', color='orange', lw=0.1)
+
+    setupAxes(ax, plot_angle, min_display, max_display)
+
+    # Kept on the figure, so that its callbacks live as long as the plot
+    fig.level_of_detail = LevelOfDetail(line, np.column_stack([xx, yy, zz]), max_points)
+
     plt.ion()
     plt.show()
 
+    return fig
 
-"""
-#TODO Animation
 
-def plotAnimatedData(xx, yy, zz, plot_angle=30, min_display=0, max_display=1):
+class PlayheadAnimation:
 
+    """
+    Blitted playhead on a 3D plot (see plotAnimatedData()): the trajectory and axes are drawn once into a cached background,
+    every frame only restores it and draws the playhead and its trail (animated artists) on top.
+    The background is captured again after every full redraw (rotating, zooming, resizing).
 
-    fig = plt.figure("Animation", figsize=(8, 6))
-    ax = fig.add_subplot(111, projection='3d')
-    ax.patch.set_facecolor('grey')
+    The position follows the transport clock (arg4) at steps_per_second (arg5), the same clock the audio is played on:
+    a late frame just jumps ahead, so the picture never falls behind the sound.
 
-    line, = ax.plot([], [], [], '-', color='orange', lw=0.1)
+    """
 
-    ax.set_xlabel('X Axis')
-    ax.set_ylabel('Y Axis')
-    ax.set_zlabel('Z Axis')
+    def __init__(self, fig, data, artists, transport, steps_per_second, trail_seconds = 0.5, trail_points = 500):
+        self.fig = fig
+        self.data = data
+        self.point, self.trail = artists
+        self.transport = transport
+        self.steps_per_second = steps_per_second
+        self.trail_steps = int(trail_seconds * steps_per_second)
+        self.trail_points = trail_points
+        self.background = None
+        self.frame_times = []
 
-    ax.set_xlim(min_display, max_display)
-    ax.set_ylim(min_display, max_display)
-    ax.set_zlim(min_display, max_display)
+        for artist in artists:
+            artist.set_animated(True)
+        fig.canvas.mpl_connect("draw_event", self.onDraw)
 
-    ax.set_xticks(np.linspace(min_display, max_display, 5))
-    ax.set_yticks(np.linspace(min_display, max_display, 5))
-    ax.set_zticks(np.linspace(min_display, max_display, 5))
+    def onDraw(self, event):
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self.drawArtists()
 
-    ax.xaxis.pane.fill = False
-    ax.yaxis.pane.fill = False
-    ax.zaxis.pane.fill = False
-    ax.grid(True)
+    def drawArtists(self):
+        for artist in (self.trail, self.point):
+            self.fig.draw_artist(artist)
 
-    def update_point(num, line, point):
-        x = xx[num]
-        y = yy[num]
-        z = zz[num]
-        line.set_data(x, y)
-        line.set_3d_properties(z)
-        point.set_3d_properties(z)  # Update the Z position of the point
-        return line, point
+    def step(self):
 
-    ax.view_init(azim=plot_angle)
+        """
+        Current step of the trajectory on the transport clock (clipped to the data).
 
-    # Create the animated point (sphere) at the starting position
-    point, = ax.plot([xx[0]], [yy[0]], [zz[0]], 'ro', markersize=6)
+        """
 
-    # Set up the animation and store it in the "anim" variable
-    anim = animation.FuncAnimation(fig, update_point, frames=len(xx), fargs=(line, point),
-                                   interval=50, repeat=True)
+        # Before a shared transport has started, now() is -inf
+        return min(int(max(self.transport.now(), 0) * self.steps_per_second), len(self.data) - 1)
 
-    plt.show()  # Display the animation
+    def update(self):
 
-    return anim
+        """
+        Draws one frame.
 
-#Example of Animation Usage
-xx = np.linspace(0, 10, 100)
-yy = np.sin(xx)
-zz = np.cos(xx)
-anim = plotAnimatedData(xx, yy, zz)
+        """
 
-"""
+        start_time = time.perf_counter()
+        step = self.step()
+
+        trail = self.data[max(0, step - self.trail_steps):step + 1]
+        trail = trail[minMaxDecimation(trail, self.trail_points)]
+        self.trail.set_data_3d(trail[:, 0], trail[:, 1], trail[:, 2])
+        self.point.set_data_3d(self.data[step:step + 1, 0], self.data[step:step + 1, 1], self.data[step:step + 1, 2])
+
+        canvas = self.fig.canvas
+        if self.background is None:
+            canvas.draw()
+        else:
+            canvas.restore_region(self.background)
+            self.drawArtists()
+            canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+
+        self.frame_times.append(time.perf_counter() - start_time)
+
+def plotAnimatedData(xx, yy, zz, plot_angle = 30, min_display = 0, max_display = 1, transport = None, steps_per_second = 5000,
+                     fps = 60, max_points = 20000, until = None):
+
+    """
+    Plots the data like plotData() and animates a playhead running along it, in sync with audio playback on the same transport (arg7,
+    default: a new one, starting right away) at steps_per_second (arg8, the StepsPerSecond of AudioMain()).
+
+    Frames are blitted (see PlayheadAnimation) at fps (arg9). Runs until the playhead reaches the end of the data,
+    or as long as the thread until (arg11) is alive, e.g. the playback thread of AudioMain(). Returns the animation.
+
+    """
+
+    if transport is None:
+        transport = Transport(lead_in = 0)
+
+    fig = plotData(xx, yy, zz, plot_angle, min_display, max_display, max_points)
+    fig.canvas.manager.set_window_title("Animation")
+    ax = fig.axes[0]
+
+    data = fig.level_of_detail.data
+    trail, = ax.plot([], [], [], '-', color='red', lw=1)
+    point, = ax.plot(data[:1, 0], data[:1, 1], data[:1, 2], 'o', color='red', markersize=6)
+    anim = PlayheadAnimation(fig, data, (point, trail), transport, steps_per_second)
+
+    # One full draw for the background, then blitted frames on the frame clock
+    fig.canvas.draw()
+    frame_interval = 1 / fps
+    next_frame = time.perf_counter()
+    end_time = len(data) / steps_per_second
+
+    while plt.fignum_exists(fig.number):
+        if until is not None:
+            if not until.is_alive():
+                break
+        elif transport.now() > end_time:
+            break
+
+        anim.update()
+
+        # Frames stay on a fixed grid; if one was late, skip ahead instead of catching up.
+        # Waiting in the GUI event loop keeps the plot responsive to rotating and zooming.
+        next_frame += frame_interval
+        if next_frame < time.perf_counter():
+            next_frame = time.perf_counter() + frame_interval
+        fig.canvas.start_event_loop(max(next_frame - time.perf_counter(), 0.001))
+
+    return anim
 
 def viewInteractivePlot():
 
@@ -458,12 +854,21 @@ if __name__ == "__main__":
     
     AxisData = [X_Axis, Y_Axis, Z_Axis]
 
+    ###  Other chaotic systems: "lorenz", "chua", "thomas", "halvorsen" (default parameters, see chaotic_systems.py)
+    # X_Axis, Y_Axis, Z_Axis = DataMain(system = "lorenz", steps = 200000, step_size = 0.005)
+
     ###  Method 1 - Threshold Conditioning
     AudioMain(DataTresholdConditioning, AxisData, Tresholds = [0.1, 0.1, 0.1], StepsPerSecond = 2000)
 
     ###  Method 2 - Gradient Conditioning
     AudioMain(DataGradientConditioning, AxisData, Tresholds = [0, 0, 0], StepsPerSecond = 3000)
 
+    ###  Playback with an animated playhead on the trajectory (works with both methods)
+    # AudioMain(DataTresholdConditioning, AxisData, Tresholds = [0.1, 0.1, 0.1], StepsPerSecond = 2000, Animate = True)
+
+    ###  Offline rendering to a WAV file instead of playback (works with both methods)
+    # AudioMain(DataTresholdConditioning, AxisData, Tresholds = [0.1, 0.1, 0.1], StepsPerSecond = 2000, RenderPath = f"{DIR_PATH}/sonification.wav")
+
     viewInteractivePlot()
 
 
@@ -0,0 +1,110 @@
+import numpy as np
+import hashlib
+import json
+import os
+import pathlib
+import pickle
+from trajectory_cache import evictCache, userCacheDir
+
+
+STAGE_CACHE_DIR = userCacheDir("stage_cache")
+STAGE_CACHE_MAX_BYTES = 512 * 1024**2
+STAGE_CACHE_VERSION = 1     # Raise when the format of stored results changes
+
+
+"""
+
+DESCRIPTION
+----------------
+
+On-disk memoization of the single stages of the sonification pipeline (normalization, conditioning, timestamps).
+
+Every stage result is stored under a key made of the key of its input (the stage upstream of it) and its own parameters,
+so keys form a chain: trajectory -> normalization -> conditioning (+ method, tresholds) -> timestamps (+ steps per second).
+Changing a parameter only changes the keys of its own stage and the ones downstream; everything upstream is loaded.
+E.g. new tresholds in AudioMain() re-run the (vectorized) conditioning and timestamps only, in milliseconds.
+
+Axis data handed to AudioMain() is identified by a hash of its content, so it does not matter where it came from.
+
+Results are pickled, in the user's cache directory (see trajectory_cache.py). Each file starts with a JSON header holding
+the cache version, stage, key and a code key (a hash of the source files computing the stage, see codeKey()); it is checked
+before anything is unpickled, and entries of another version, stage, key or code are calculated again and replaced.
+So a change to the code invalidates its cached results, and a stale or foreign file is never unpickled.
+
+Like the trajectory cache, writes are atomic and the least recently used entries are evicted beyond STAGE_CACHE_MAX_BYTES.
+Don't modify stage results in place.
+
+
+"""
+
+
+
+def stageKey(*inputs):
+
+    """
+    Hash of the inputs (arg1, ...) of a stage: keys of upstream stages, parameters, names. Everything has to be JSON-serializable.
+
+    """
+
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=float).encode()).hexdigest()
+
+def dataKey(AxisData):
+
+    """
+    Hash of the content of axis data (lists or arrays).
+
+    """
+
+    digest = hashlib.blake2b(digest_size=32)
+    for axis in AxisData:
+        digest.update(np.ascontiguousarray(axis, dtype=np.float64).tobytes())
+        digest.update(b"|")
+    return digest.hexdigest()
+
+def codeKey(*paths):
+
+    """
+    Hash of the source files (arg1, ...) computing a stage, so that cached results of older code are not used.
+
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        digest.update(pathlib.Path(path).read_bytes())
+    return digest.hexdigest()
+
+def memoizedStage(stage, key, function, cache_dir = STAGE_CACHE_DIR, max_bytes = STAGE_CACHE_MAX_BYTES, code = None):
+
+    """
+    Returns the result of function() (arg3) for the stage named stage (arg1) with inputs hashed to key (arg2):
+    loaded from the cache if present and stored by the same code (arg6, see codeKey()), otherwise calculated and stored.
+
+    """
+
+    cache_dir = pathlib.Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / f"{stage}.{key}.pkl"
+    header = {'version': STAGE_CACHE_VERSION, 'stage': stage, 'key': key, 'code': code}
+
+    try:
+        with open(path, "rb") as cache_file:
+            # Only unpickled if the header matches
+            if json.loads(cache_file.readline()) == header:
+                result = pickle.load(cache_file)
+                os.utime(path)
+                return result
+    except (FileNotFoundError, EOFError, ValueError, pickle.UnpicklingError):
+        pass
+
+    result = function()
+
+    # Atomic write: other processes either see no entry or the complete one
+    temporary_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+    with open(temporary_path, "wb") as cache_file:
+        cache_file.write((json.dumps(header, sort_keys=True) + "\n").encode())
+        pickle.dump(result, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, path)
+
+    evictCache(cache_dir, max_bytes, keep=path, pattern="*.pkl")
+
+    return result
@@ -0,0 +1,142 @@
+import cProfile
+import contextlib
+import os
+import pathlib
+import time
+import tracemalloc
+
+
+PROFILE_ENV = "ROSSLER_PROFILE"
+PROFILE_ON = ("1", "true", "on", "yes")
+PROFILE_OFF = ("", "0", "false", "off", "no")
+PROFILE_DIR_PREFIX = "dir:"
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Opt-in per-stage profiling of the sonification pipeline (DataMain() and AudioMain()).
+
+Each stage (integration, normalization, conditioning, timestamps, process startup, playback, ...) runs inside
+profiler.stage(name), which records its wall time, CPU time (of this process) and peak traced memory (tracemalloc).
+Optionally, each stage is also run under cProfile and dumped to a .prof file (view with e.g. python -m pstats or snakeviz).
+At the end of a run, a summary table is printed.
+
+Enabled by the profile argument of DataMain() / AudioMain(), or by the environment variable ROSSLER_PROFILE:
+    ROSSLER_PROFILE=1                -> summary table (also true, on, yes; 0, false, off, no or unset switch it off)
+    ROSSLER_PROFILE=dir:<directory>  -> summary table and cProfile dumps in that directory
+
+When disabled, stage() returns one shared no-op context manager, so the hooks cost next to nothing.
+While enabled, tracemalloc slows the stages down; compare wall times of profiled runs with each other only.
+Stages don't nest.
+
+
+"""
+
+
+
+class StageProfiler:
+
+    """
+    Records wall time, CPU time and peak memory of every stage. With cprofile_dir (arg1), every stage is also dumped as a cProfile file.
+
+    """
+
+    def __init__(self, cprofile_dir = None):
+        self.cprofile_dir = pathlib.Path(cprofile_dir) if cprofile_dir is not None else None
+        self.records = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+
+        """
+        Context manager profiling the code inside it as stage name (arg1).
+
+        """
+
+        owns_tracing = not tracemalloc.is_tracing()
+        if owns_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+        profile = None
+        if self.cprofile_dir is not None:
+            profile = cProfile.Profile()
+            profile.enable()
+
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = time.process_time() - start_cpu
+
+            if profile is not None:
+                profile.disable()
+                self.cprofile_dir.mkdir(parents=True, exist_ok=True)
+                profile.dump_stats(self.cprofile_dir / f"{len(self.records):02}_{name.replace(' ', '_')}.prof")
+
+            _, peak = tracemalloc.get_traced_memory()
+            if owns_tracing:
+                tracemalloc.stop()
+
+            self.records.append({'stage': name, 'wall': wall, 'cpu': cpu, 'peak_bytes': peak})
+
+    def printSummary(self, title = "Stages"):
+        total_wall = sum(record['wall'] for record in self.records)
+
+        print(f"\n{title:<24}{'Wall s':>10}{'CPU s':>10}{'Share':>9}{'Peak MB':>11}")
+        for record in self.records:
+            share = record['wall'] / total_wall * 100 if total_wall > 0 else 0
+            print(f"{record['stage']:<24}{record['wall']:>10.3f}{record['cpu']:>10.3f}{share:>8.1f}%{record['peak_bytes']/1024**2:>11.2f}")
+        print(f"{'Total':<24}{total_wall:>10.3f}{sum(record['cpu'] for record in self.records):>10.3f}")
+
+        if self.cprofile_dir is not None:
+            print(f"cProfile dumps: {self.cprofile_dir}")
+        print()
+
+class DisabledProfiler:
+
+    """
+    Stand-in when profiling is off: every stage is the same no-op context manager.
+
+    """
+
+    no_stage = contextlib.nullcontext()
+    records = []
+
+    def stage(self, name):
+        return self.no_stage
+
+    def printSummary(self, title = "Stages"):
+        pass
+
+DISABLED_PROFILER = DisabledProfiler()
+
+def stageProfiler(profile = None):
+
+    """
+    Returns the profiler for a pipeline run, following profile (arg1):
+    a StageProfiler is used as it is (to collect several runs in one table), True / False switch profiling on / off,
+    and None follows the ROSSLER_PROFILE environment variable.
+
+    """
+
+    if isinstance(profile, StageProfiler):
+        return profile
+
+    if profile is None:
+        setting = os.environ.get(PROFILE_ENV, "").strip()
+        if setting.startswith(PROFILE_DIR_PREFIX):
+            return StageProfiler(setting[len(PROFILE_DIR_PREFIX):])
+        if setting.lower() in PROFILE_OFF:
+            return DISABLED_PROFILER
+        if setting.lower() in PROFILE_ON:
+            return StageProfiler()
+        raise ValueError(f"Invalid {PROFILE_ENV}='{setting}'. Use one of {list(PROFILE_ON + PROFILE_OFF[1:])} or '{PROFILE_DIR_PREFIX}<directory>'.")
+
+    return StageProfiler() if profile else DISABLED_PROFILER
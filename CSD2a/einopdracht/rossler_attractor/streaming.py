@@ -0,0 +1,339 @@
+import numpy as np
+import pathlib
+import queue
+import sys
+import threading
+import time
+sys.path.append(str(pathlib.Path(__file__).parent.parent.resolve()))
+from audio_engine.mixer import Mixer, MIXER_AVAILABLE
+from audio_engine.voice_pool import VoicePool, playVoice, waitVoices
+from integrators import ensembleCalculation, rosslerSystem
+from rossler_attractor import SAMPLES_DICT, VOICE_LIMITS
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Live streaming sonification of the Rössler Attractor.
+
+Instead of calculating all steps before playback, a producer thread integrates fixed-size blocks, normalizes and conditions them
+and hands the resulting events to the player through a bounded lookahead buffer. Playback starts almost instantly,
+runs endlessly (or for a given duration) with constant memory, and parameters / tresholds can be changed while playing.
+
+Differences to the offline pipeline (DataMain + AudioMain):
+    - Normalization uses a running min / max per axis (seeded by a short warm-up), as the full range is unknown in advance.
+    - The conditioners keep their last value (and gradient) from block to block, so crossings on block borders are not lost.
+
+Like AudioMain(), events are played through a Mixer if sounddevice is installed, otherwise with simpleaudio;
+either way within the polyphony limits of VOICE_LIMITS (see audio_engine/voice_pool.py).
+
+
+"""
+
+
+
+def integratorBlocks(sonification, start_values = [0.1,0.1,0.1], block_size = 2000, step_size = 0.01, method = "euler"):
+
+    """
+    Endlessly yields blocks of block_size (arg3) steps, each continuing from the last state of the previous block.
+    The parameters are read from the sonification (arg1) for every block, so changes apply from the next block on.
+
+    """
+
+    state = np.array(start_values, dtype=np.float64)
+
+    while True:
+        block = ensembleCalculation(rosslerSystem, state, sonification.parameters, block_size, step_size, method)[1:, 0]
+        state = block[-1]
+        yield block
+
+class StreamingNormalizer:
+
+    """
+    Normalizes blocks of (steps, 3) data with a running min and max value per axis. The range can only grow.
+
+    """
+
+    def __init__(self):
+        self.min_values = None
+        self.max_values = None
+
+    def update(self, block):
+        block_min = block.min(axis=0)
+        block_max = block.max(axis=0)
+
+        if self.min_values is None:
+            self.min_values, self.max_values = block_min, block_max
+        else:
+            self.min_values = np.minimum(self.min_values, block_min)
+            self.max_values = np.maximum(self.max_values, block_max)
+
+    def normalize(self, block):
+        span = self.max_values - self.min_values
+        # If max and min are equal, set the axis to 0 (like normalizeData())
+        return np.divide(block - self.min_values, span, out=np.zeros_like(block), where=span != 0)
+
+class TresholdConditioner:
+
+    """
+    Block-wise version of DataTresholdConditioning(): finds positive crossings of a treshold per axis,
+    keeping the last value of each axis from the previous block.
+
+    """
+
+    def __init__(self, tresholds = [0.5, 0.5, 0.2]):
+        self.tresholds = np.array(tresholds, dtype=np.float64)
+        self.last_values = None
+
+    def process(self, block):
+        if self.last_values is None:
+            self.last_values = block[0]
+
+        values = np.vstack([self.last_values, block])
+        self.last_values = block[-1]
+
+        crossings = (values[:-1] < self.tresholds) & (values[1:] >= self.tresholds)
+        return [np.flatnonzero(crossings[:, axis]) for axis in range(3)]
+
+class GradientConditioner:
+
+    """
+    Block-wise version of DataGradientConditioning(): finds positive crossings of an axis gradient per axis,
+    keeping the last value and gradient of each axis from the previous block.
+    The first block is seeded with its own first value (and a zero gradient), so its start is no crossing.
+
+    """
+
+    def __init__(self, gradient_tresholds = [0.0, 0.0, 0.0]):
+        self.tresholds = np.array(gradient_tresholds, dtype=np.float64)
+        self.last_values = None
+        self.last_gradients = None
+
+    def process(self, block):
+        if self.last_values is None:
+            self.last_values = block[0]
+            self.last_gradients = np.zeros(block.shape[1])
+
+        values = np.vstack([self.last_values, block])
+        gradients = np.vstack([self.last_gradients, np.diff(values, axis=0)])
+
+        self.last_values = block[-1]
+        self.last_gradients = gradients[-1]
+
+        crossings = (gradients[:-1] < self.tresholds) & (gradients[1:] >= self.tresholds)
+        return [np.flatnonzero(crossings[:, axis]) for axis in range(3)]
+
+CONDITIONERS = {
+    "treshold": TresholdConditioner,
+    "gradient": GradientConditioner
+}
+
+class StreamingSonification:
+
+    """
+    Producer / consumer streaming sonification.
+
+    start() launches the producer thread, play() consumes the events in the calling thread until stop() is called
+    (or the duration has passed). setParameters() and setTresholds() can be called at any time, also from another thread.
+
+    """
+
+    def __init__(self, start_values = [0.1,0.1,0.1], parameters = {'a': 0.3, 'b': 0.21, 'c': 5}, step_size = 0.01, method = "euler",
+                 conditioning = "treshold", tresholds = [0.5, 0.5, 0.2], steps_per_second = 2000, block_size = 2000,
+                 lookahead = 0.5, max_events = 1024, warmup_steps = 20000, samples_dict = SAMPLES_DICT, use_mixer = MIXER_AVAILABLE):
+
+        if conditioning not in CONDITIONERS:
+            raise ValueError(f"Unknown conditioning method '{conditioning}'. Choose from {list(CONDITIONERS)}.")
+
+        self.start_values = start_values
+        self.parameters = dict(parameters)
+        self.step_size = step_size
+        self.method = method
+        self.conditioner = CONDITIONERS[conditioning](tresholds)
+        self.steps_per_second = steps_per_second
+        self.block_size = block_size
+        self.lookahead = lookahead
+        self.warmup_steps = warmup_steps
+        self.samples_dict = samples_dict
+        self.use_mixer = use_mixer
+
+        self.normalizer = StreamingNormalizer()
+        self.events = queue.Queue(maxsize=max_events)
+        self.stop_event = threading.Event()
+        self.producer = threading.Thread(target=self.produce, daemon=True)
+        self.steps_done = 0
+        self.start_time = None
+
+    def setParameters(self, **parameters):
+
+        """
+        Changes one or more of the parameters a, b and c. Applies from the next integrated block on.
+
+        """
+
+        self.parameters = {**self.parameters, **parameters}
+
+    def setTresholds(self, tresholds):
+
+        """
+        Changes the (gradient) treshold of each axis. Applies from the next conditioned block on.
+
+        """
+
+        self.conditioner.tresholds = np.array(tresholds, dtype=np.float64)
+
+    def warmUp(self):
+
+        """
+        Integrates a short stretch of the attractor (not played), only to seed the running normalization range.
+
+        """
+
+        if self.warmup_steps > 0:
+            warmup = ensembleCalculation(rosslerSystem, self.start_values, self.parameters, self.warmup_steps, self.step_size, self.method)[:, 0]
+            self.normalizer.update(warmup)
+
+    def produce(self):
+
+        """
+        Producer thread: integrates, normalizes and conditions block after block, never more than lookahead seconds ahead of playback.
+
+        """
+
+        blocks = integratorBlocks(self, self.start_values, self.block_size, self.step_size, self.method)
+
+        while not self.stop_event.is_set():
+
+            # Bounded lookahead: wait until playback has caught up
+            block_start_time = self.steps_done / self.steps_per_second
+            ahead = block_start_time - (time.perf_counter() - self.start_time)
+            if ahead > self.lookahead:
+                self.stop_event.wait(ahead - self.lookahead)
+                continue
+
+            block = next(blocks)
+            self.normalizer.update(block)
+            crossings = self.conditioner.process(self.normalizer.normalize(block))
+
+            # Same timing as BinaryNotesToTimestamps(): step k sounds at (k + 1) / steps_per_second.
+            # The blocks leave out their start state, so index i of a block is step steps_done + i + 1
+            block_events = [((self.steps_done + i + 2) / self.steps_per_second, axis) for axis, indices in zip("XYZ", crossings) for i in indices]
+            block_events.sort()
+
+            for event in block_events:
+                while not self.stop_event.is_set():
+                    try:
+                        self.events.put(event, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+
+            self.steps_done += len(block)
+
+    def start(self):
+
+        """
+        Seeds the normalization and starts the producer thread. Playback time starts now.
+
+        """
+
+        self.warmUp()
+        self.start_time = time.perf_counter()
+        self.producer.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def play(self, duration = None, lookahead = 0.05):
+
+        """
+        Consumer: plays the events as they become due, until stop() is called or duration (arg1, seconds) has passed.
+        Like timestampPlayback(), events that are already late when they arrive are skipped.
+        Events are submitted to a Mixer lookahead (arg2) seconds early if use_mixer, else played with their sample's play();
+        either way, polyphony is bounded by VOICE_LIMITS.
+
+        """
+
+        if self.start_time is None:
+            self.start()
+
+        if self.use_mixer:
+            mixer = Mixer(self.samples_dict, **VOICE_LIMITS)
+            pool = mixer.pool
+            mixer.start()
+            # Playback time 0 on the mixer clock
+            mixer_start = mixer.time() - (time.perf_counter() - self.start_time)
+        else:
+            pool = VoicePool(**VOICE_LIMITS)
+            lookahead = 0
+
+        print(f"\nStreaming Playback started.\n")
+
+        while not self.stop_event.is_set():
+
+            if duration is not None and time.perf_counter() - self.start_time >= duration:
+                self.stop()
+                break
+
+            try:
+                timestamp, axis = self.events.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            if duration is not None and timestamp > duration:
+                self.stop()
+                break
+
+            elapsed_time = time.perf_counter() - self.start_time
+            if elapsed_time < timestamp:
+                self.stop_event.wait(max(timestamp - elapsed_time - lookahead, 0))
+                if self.stop_event.is_set():
+                    break
+                if self.use_mixer:
+                    mixer.submit(axis, mixer_start + timestamp)
+                else:
+                    playVoice(pool, self.samples_dict, axis, timestamp)
+
+        if self.use_mixer:
+            mixer.waitDone()
+            mixer.close()
+        else:
+            waitVoices(pool)
+
+        elapsed_time = time.perf_counter() - self.start_time
+        print(f"\nStreaming Playback finished at {elapsed_time:.2f}.\n")
+        pool.printSummary()
+
+def streamingPlayback(**kwargs):
+
+    """
+    Plays a StreamingSonification (arguments as in its constructor) in a background thread,
+    letting the user change parameter c in the terminal while it plays.
+
+    """
+
+    sonification = StreamingSonification(**kwargs)
+    sonification.start()
+    player = threading.Thread(target=sonification.play)
+    player.start()
+
+    while True:
+        c_input = input("\nEnter a new value for parameter c, or press Enter to stop:\n")
+        if c_input == "":
+            break
+        try:
+            sonification.setParameters(c=float(c_input))
+        except ValueError:
+            print("\nERROR: Invalid input. Please enter a valid number.\n")
+
+    sonification.stop()
+    player.join()
+
+
+
+if __name__ == "__main__":
+
+    streamingPlayback(start_values = [0.1,0.1,0.1], parameters = {'a': 0.29, 'b': 0.14, 'c': 18}, step_size = 0.01,
+                      conditioning = "treshold", tresholds = [0.1, 0.1, 0.1], steps_per_second = 2000)
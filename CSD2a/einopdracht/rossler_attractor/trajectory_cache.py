@@ -0,0 +1,196 @@
+import numpy as np
+import hashlib
+import json
+import os
+import pathlib
+import sys
+from integrators import ensembleCalculation
+from chaotic_systems import systemName, resolveSystem, parameterNames, defaultStartValues
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no file locking, writes are still atomic
+    fcntl = None
+
+
+CACHE_ENV = "ROSSLER_CACHE_DIR"
+CACHE_MAX_BYTES = 2 * 1024**3
+
+
+"""
+
+DESCRIPTION
+----------------
+
+Content-addressed on-disk cache of calculated trajectories.
+
+Each trajectory is stored as a .npy file, named after a hash of everything it depends on (start values, parameters,
+step size, integration method and chaotic system) and its number of steps. A cache hit is loaded memory-mapped, so no data is copied or read in advance.
+
+Trajectories of the same hash are prefixes of each other, and the last state saved is all the (fixed-step) integrators need to go on:
+asking for more steps than cached continues the longest cached trajectory from its last step (bit-identical to integrating in one go),
+and asking for fewer returns a prefix of a longer one. A continued trajectory replaces the shorter entry.
+
+Caches are kept in the user's cache directory (see userCacheDir()), not in the source tree; ROSSLER_CACHE_DIR moves them elsewhere.
+
+The cache is limited to a maximum size (CACHE_MAX_BYTES by default): after each new entry, the least recently used
+entries are evicted. Every hit refreshes the modification time of its file, which serves as the LRU timestamp.
+
+Several processes can use the cache at once: new entries are written to a temporary file and atomically renamed,
+and eviction is guarded by a lock file (where available).
+
+
+"""
+
+
+
+def userCacheDir(name):
+
+    """
+    Directory name (arg1) within the cache directory of this project: ROSSLER_CACHE_DIR if set, else the user's cache directory
+    (~/.cache/rossler_attractor or $XDG_CACHE_HOME on Linux, ~/Library/Caches/rossler_attractor on macOS,
+    %LOCALAPPDATA%\\rossler_attractor on Windows).
+
+    """
+
+    if os.environ.get(CACHE_ENV):
+        return pathlib.Path(os.environ[CACHE_ENV]) / name
+
+    if sys.platform == "win32":
+        root = pathlib.Path(os.environ.get("LOCALAPPDATA") or pathlib.Path.home() / "AppData" / "Local")
+    elif sys.platform == "darwin":
+        root = pathlib.Path.home() / "Library" / "Caches"
+    else:
+        root = pathlib.Path(os.environ.get("XDG_CACHE_HOME") or pathlib.Path.home() / ".cache")
+
+    return root / "rossler_attractor" / name
+
+CACHE_DIR = userCacheDir("trajectory_cache")
+
+def trajectoryKey(start_values, parameters, step_size, method, system = "rossler"):
+
+    """
+    Hash identifying a trajectory by all of its inputs but the number of steps. Only the parameters the system (arg5) uses count, defaults filled in.
+
+    """
+
+    function, constants = resolveSystem(system, parameters)
+    inputs = {
+        'system': systemName(system),
+        'start_values': [float(value) for value in start_values],
+        'parameters': {key: float(value) for key, value in zip(parameterNames(function), constants)},
+        'step_size': float(step_size),
+        'method': method
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+def evictCache(cache_dir = CACHE_DIR, max_bytes = CACHE_MAX_BYTES, keep = None, pattern = "*.npy"):
+
+    """
+    Deletes the least recently used entries (files matching pattern, arg4) until the cache is smaller than max_bytes (arg2).
+    The entry at keep (arg3) is never deleted.
+
+    """
+
+    with open(cache_dir / ".lock", "w") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+        entries = []
+        for path in cache_dir.glob(pattern):
+            try:
+                status = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((status.st_mtime, status.st_size, path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+
+        for _, size, path in sorted(entries):
+            if total_bytes <= max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                # Processes still using a deleted entry keep their memory map (POSIX)
+                path.unlink()
+                total_bytes -= size
+            except OSError:
+                continue
+
+def cachedSteps(cache_dir, key):
+
+    """
+    Step counts of the cached trajectories of a key (arg2), with their paths.
+
+    """
+
+    entries = {}
+    for path in cache_dir.glob(f"{key}.*.npy"):
+        try:
+            entries[int(path.name.split(".")[1])] = path
+        except ValueError:
+            continue
+    return entries
+
+def cachedCalculation(start_values = None, parameters = None, steps = 10000, step_size = 0.01, method = "euler",
+                      cache_dir = CACHE_DIR, max_bytes = CACHE_MAX_BYTES, system = "rossler"):
+
+    """
+    Returns the (steps + 1, 3) trajectory of the chaotic system (arg8, default: Rössler Attractor), memory-mapped (read-only) from the cache.
+    Calculates and stores it first, if it is not cached yet, continuing the longest shorter trajectory cached.
+    Start values and parameters default to the system's.
+
+    """
+
+    if start_values is None:
+        start_values = defaultStartValues(system)
+
+    cache_dir = pathlib.Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    key = trajectoryKey(start_values, parameters, step_size, method, system)
+    path = cache_dir / f"{key}.{steps}.npy"
+
+    entries = cachedSteps(cache_dir, key)
+    longer = [cached_steps for cached_steps in entries if cached_steps >= steps]
+    shorter = [cached_steps for cached_steps in entries if cached_steps < steps]
+
+    # Exact hit, or prefix of a longer trajectory
+    for cached_steps in sorted(longer):
+        try:
+            trajectory = np.load(entries[cached_steps], mmap_mode='r')
+            os.utime(entries[cached_steps])
+            return trajectory[:steps + 1]
+        except FileNotFoundError:
+            continue
+
+    trajectory = None
+    for cached_steps in sorted(shorter, reverse=True):
+        try:
+            prefix = np.load(entries[cached_steps], mmap_mode='r')
+        except FileNotFoundError:
+            continue
+        continuation = ensembleCalculation(system, prefix[-1], parameters, steps - cached_steps, step_size, method)[1:, 0]
+        trajectory = np.concatenate([prefix, continuation])
+        break
+
+    if trajectory is None:
+        trajectory = ensembleCalculation(system, start_values, parameters, steps, step_size, method)[:, 0]
+
+    # Atomic write: other processes either see no entry or the complete one
+    temporary_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+    with open(temporary_path, "wb") as cache_file:
+        np.save(cache_file, trajectory)
+    os.replace(temporary_path, path)
+
+    # Shorter entries are prefixes of the new one (processes still using them keep their memory map)
+    for cached_steps in shorter:
+        try:
+            entries[cached_steps].unlink()
+        except OSError:
+            continue
+
+    evictCache(cache_dir, max_bytes, keep=path)
+
+    return np.load(path, mmap_mode='r')
@@ -0,0 +1,9 @@
+import pathlib
+import sys
+
+DIR_PATH = pathlib.Path(__file__).parent.parent.resolve()
+sys.path += [str(DIR_PATH), str(DIR_PATH / "rossler_attractor"), str(DIR_PATH / "multi_sample_sequencer"), str(DIR_PATH / "benchmarks")]
+
+# Headless: the stub backend stands in for simpleaudio (see benchmarks/audio_stub.py)
+import audio_stub
+audio_stub.install()
@@ -0,0 +1,54 @@
+import numpy as np
+import audio_stub
+from audio_engine.events import Pattern
+from audio_engine.loop_buffers import LoopCache
+from audio_engine.mixer import Mixer
+from audio_engine.offline_render import mixEvents
+
+
+SAMPLE_RATE = 44100
+
+
+def samplesDict(seed = 0):
+
+    """
+    Three short stereo noise bursts of different lengths as stub WaveObjects, keyed 1 to 3.
+
+    """
+
+    rng = np.random.default_rng(seed)
+    samples = {}
+    for key, length in zip([1, 2, 3], [900, 2500, 6000]):
+        pcm = rng.integers(-2**14, 2**14, (length, 2)).astype('<i2')
+        samples[key] = audio_stub.WaveObject(pcm.tobytes(), 2, 2, SAMPLE_RATE)
+    return samples
+
+def test_loop_cache_incremental_matches_full_render():
+    samples = samplesDict()
+    original = Pattern([1, 0.5, 0.5, 2], [1, 2, 3, 1], loop_times = 4, bpm = 120)
+    edited = Pattern([1, 0.5, 0.5, 2], [1, 3, 3, 1], loop_times = 4, bpm = 120)
+
+    cache = LoopCache(samples)
+    cache.render([original])
+    full_frames = cache.rendered_frames
+    incremental = cache.render([edited])
+
+    # Only the span of the changed note was mixed again
+    assert 0 < cache.rendered_frames - full_frames < full_frames
+    np.testing.assert_array_equal(incremental, LoopCache(samples).render([edited]))
+
+def test_mixer_render_matches_mix_events():
+    samples = samplesDict()
+    mixer = Mixer(samples, gain = 1.0, max_voices = 64, max_per_instrument = None)
+
+    rng = np.random.default_rng(1)
+    times = np.sort(rng.uniform(0, 0.2, 40))
+    keys = rng.integers(1, 4, 40).tolist()
+    for key, at_time in zip(keys, times):
+        mixer.submit(key, at_time)
+
+    num_frames = 256 * 60
+    rendered = np.concatenate([mixer.render(256) for _ in range(num_frames // 256)])
+    frames = np.rint(times * SAMPLE_RATE).astype(np.int64)
+
+    np.testing.assert_allclose(rendered, mixEvents(frames, keys, mixer.samples, 0, num_frames), atol = 1e-6)
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+from integrators import ensembleCalculation, rosslerSystem
+from trajectory_cache import cachedCalculation
+
+
+PARAMETERS = {'a': 0.3, 'b': 0.21, 'c': 5}
+
+
+@pytest.mark.parametrize("method", ["euler", "rk4", "rk45"])
+def test_jit_matches_numpy(method):
+    pytest.importorskip("numba")
+    start_values = [[0.1, 0.1, 0.1], [1.0, -2.0, 0.5]]
+
+    jit = ensembleCalculation(rosslerSystem, start_values, PARAMETERS, 5000, 0.01, method, jit = True)
+    numpy = ensembleCalculation(rosslerSystem, start_values, PARAMETERS, 5000, 0.01, method, jit = False)
+
+    np.testing.assert_array_equal(jit, numpy)
+
+def test_cached_continuation_matches_full_run(tmp_path):
+    cachedCalculation([0.1, 0.1, 0.1], PARAMETERS, 3000, cache_dir = tmp_path)
+    continued = cachedCalculation([0.1, 0.1, 0.1], PARAMETERS, 10000, cache_dir = tmp_path)
+    full = ensembleCalculation(rosslerSystem, [0.1, 0.1, 0.1], PARAMETERS, 10000, 0.01)[:, 0]
+
+    np.testing.assert_array_equal(continued, full)
+    # The shorter entry was replaced by the longer one, whose prefix is served as well
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+    np.testing.assert_array_equal(cachedCalculation([0.1, 0.1, 0.1], PARAMETERS, 3000, cache_dir = tmp_path), full[:3001])
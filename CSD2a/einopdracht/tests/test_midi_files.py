@@ -0,0 +1,20 @@
+import numpy as np
+from audio_engine.events import Pattern
+from midi_files import writeMidiFile, readMidiFile
+
+
+def test_write_read_roundtrip(tmp_path):
+    patterns = [Pattern([1, 0.5, 0.5, 2], [1, 2, 3, 1], loop_times = 3, bpm = 120),
+                Pattern([0.25, 0.75], [2, 3], loop_times = 5, bpm = 120)]
+    filepath = tmp_path / "roundtrip.mid"
+
+    writeMidiFile(patterns, filepath)
+    tables, bpm = readMidiFile(filepath)
+
+    assert bpm == 120
+    assert len(tables) == len(patterns)
+    for table, pattern in zip(tables, patterns):
+        expected = pattern.expand()
+        np.testing.assert_allclose(table['timestamp'], expected['timestamp'], atol = 1e-9)
+        np.testing.assert_array_equal(table['instrument'], expected['instrument'])
+        np.testing.assert_array_equal(table['velocity'], expected['velocity'])
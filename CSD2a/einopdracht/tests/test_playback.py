@@ -0,0 +1,34 @@
+import multiprocessing
+import numpy as np
+import pytest
+from audio_engine.telemetry import LatencyRecorder
+
+
+@pytest.fixture
+def spawnContext(tmp_path, monkeypatch):
+
+    """
+    Spawned processes start from a fresh interpreter, without the stub in sys.modules:
+    a simpleaudio module on the path they inherit hands them the stub as well.
+
+    """
+
+    (tmp_path / "simpleaudio.py").write_text("from audio_stub import *\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    start_method = multiprocessing.get_start_method()
+    multiprocessing.set_start_method("spawn", force = True)
+    yield
+    multiprocessing.set_start_method(start_method, force = True)
+
+def test_multiprocessing_playback_drops_no_events(spawnContext):
+    import rossler_attractor
+
+    # 50 events per axis within the first second, followed by the end time
+    axis_data = [np.linspace(0.02, 1.0, 50).tolist() + [1.05] for _ in range(3)]
+    recorder = LatencyRecorder(["X", "Y", "Z"], capacity = 100)
+
+    rossler_attractor.multiprocessingPlayback(axis_data, recorder)
+
+    assert recorder.events.tolist() == [50, 50, 50]
+    assert recorder.dropped.tolist() == [0, 0, 0]
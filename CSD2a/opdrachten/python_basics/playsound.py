@@ -1,9 +1,24 @@
 import simpleaudio as sa
 
+MAX_BUFFER_SECONDS = 60    # Longest buffer of repetitions built in memory
+
 filepath = input("input path of .wav file")
 wave_obj = sa.WaveObject.from_wave_file(filepath)
+
 n_times = int(input("How often do you want the file to play (int)?"))
+while n_times < 1:
+    n_times = int(input("Please enter a number of at least 1:"))
+
+# Repetitions in one buffer play back to back without gaps. The buffer is capped at MAX_BUFFER_SECONDS,
+# so for many repetitions, it is played in a loop (only leaving a gap between buffers)
+frames = len(wave_obj.audio_data) // (wave_obj.num_channels * wave_obj.bytes_per_sample)
+per_buffer = max(1, min(n_times, int(MAX_BUFFER_SECONDS * wave_obj.sample_rate / max(frames, 1))))
+buffer = wave_obj.audio_data * per_buffer
+
+for x in range(n_times // per_buffer):
+    play_obj = sa.play_buffer(buffer, wave_obj.num_channels, wave_obj.bytes_per_sample, wave_obj.sample_rate)
+    play_obj.wait_done()
 
-for x in range(n_times):
-    play_obj = wave_obj.play()
-    play_obj.wait_done()
\ No newline at end of file
+if n_times % per_buffer:
+    play_obj = sa.play_buffer(wave_obj.audio_data * (n_times % per_buffer), wave_obj.num_channels, wave_obj.bytes_per_sample, wave_obj.sample_rate)
+    play_obj.wait_done()